@@ -5,6 +5,8 @@ from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 import asyncio
 from .database import connect_to_mongo, close_mongo_connection
+from .services.chatbot.inference_executor import inference_executor
+from .services.chatbot import chatbot_service, telemetry
 from .routes import (
     auth,
     chatbot_routes,
@@ -16,6 +18,59 @@ from .routes import (
     wallet,
 )
 
+CHATBOT_PRELOAD = chatbot_service.env_flag("CHATBOT_PRELOAD")
+
+# load the chatbot model/index at import, i.e. in the master process of
+# `gunicorn --preload`, so forked workers share the pages (see preload())
+CHATBOT_PRELOAD_BEFORE_FORK = chatbot_service.env_flag("CHATBOT_PRELOAD_BEFORE_FORK")
+if CHATBOT_PRELOAD_BEFORE_FORK:
+    chatbot_service.preload()
+
+
+# process executor: the pool workers hold the resources, not this process
+_workers_warm = False
+# broadcasts per warm-up attempt; a worker that got no call in one round
+# usually gets one in the next
+WARMUP_ROUNDS = 5
+WARMUP_MAX_DELAY = 60
+
+
+async def _warm_up_workers():
+    """Warm the process pool; ready only once every worker reported its pid."""
+    global _workers_warm
+    warmed = set()
+    for _ in range(WARMUP_ROUNDS):
+        results = await inference_executor.broadcast(chatbot_service.warm_up)
+        warmed.update(r["pid"] for r in results)
+        pids = inference_executor.worker_pids()
+        if len(pids) >= inference_executor.max_workers and pids <= warmed:
+            _workers_warm = True
+            return
+    raise RuntimeError(
+        f"{len(warmed & pids)} of {inference_executor.max_workers} chatbot "
+        "workers warmed up"
+    )
+
+
+async def _warm_up_chatbot():
+    # /ready stays 503 until this succeeds, so keep trying with backoff
+    delay = 1
+    attempt = 1
+    while True:
+        try:
+            if inference_executor.kind == "process":
+                await _warm_up_workers()
+            else:
+                await asyncio.to_thread(chatbot_service.warm_up)
+            return
+        except Exception:
+            logging.exception(
+                "Chatbot warm-up attempt %s failed; retrying in %ss", attempt, delay
+            )
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, WARMUP_MAX_DELAY)
+        attempt += 1
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -39,8 +94,24 @@ async def lifespan(app: FastAPI):
     if last_exc:
         # Let startup fail with the last exception so it's visible to the user
         raise last_exc
+
+    # pool workers record the chatbot metrics; share them through one
+    # directory, set up before the first worker starts
+    if inference_executor.kind == "process":
+        telemetry.setup_multiprocess()
+
+    # Preload the embedding model and FAISS index in the background so the
+    # first chat request does not pay for it; /ready reports 503 until done.
+    warmup_task = None
+    if CHATBOT_PRELOAD:
+        warmup_task = asyncio.create_task(_warm_up_chatbot())
+    app.state.chatbot_warmup = warmup_task
     yield
     # Shutdown
+    if warmup_task is not None:
+        warmup_task.cancel()
+    inference_executor.shutdown(wait=False)
+    telemetry.cleanup_multiprocess()
     await close_mongo_connection()
 
 
@@ -112,6 +183,20 @@ async def health_check():
     return {"status": "healthy"}
 
 
+@app.get("/ready")
+async def readiness_check():
+    # with preloading on, only route traffic here once the chatbot is warm
+    if inference_executor.kind == "process":
+        chatbot_ready = _workers_warm
+    else:
+        chatbot_ready = chatbot_service.is_ready()
+    if CHATBOT_PRELOAD and not chatbot_ready:
+        return JSONResponse(
+            status_code=503, content={"status": "warming_up", "chatbot": False}
+        )
+    return {"status": "ready", "chatbot": chatbot_ready}
+
+
 if __name__ == "__main__":
     import os
     import uvicorn
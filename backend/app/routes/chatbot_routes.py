@@ -1,41 +1,488 @@
-from fastapi import APIRouter, HTTPException
+import os
+import json
+import asyncio
+import time
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel
-from typing import Optional
+from typing import Any, Dict, List, Optional, Tuple
 
-from ..services.chatbot.chatbot_service import initialize, run_inference
+from ..services.chatbot.chatbot_service import (
+    initialize,
+    reload_resources,
+    run_inference,
+    prepare_inference,
+    iter_inference_batch,
+    inference_flights,
+    inference_key,
+    sessions,
+    SINGLE_FLIGHT,
+    run_inference_batch,
+    BATCH_MAX_ITEMS,
+    BATCH_LLM_CONCURRENCY,
+    astream_groq,
+    build_fallback_messages,
+    is_unknown_answer,
+    BasisStreamParser,
+    ANSWER_STRATEGIES,
+    hit_metadata,
+    FALLBACK_TEMPERATURE,
+    DEGRADED_ANSWER,
+    worker_stats,
+)
+from ..services.chatbot.conversation import Session
+from ..services.chatbot.metadata_filter import RetrievalFilter
+from ..services.chatbot.telemetry import CONTENT_TYPE_LATEST, render_metrics
+from ..services.chatbot.inference_executor import (
+    inference_executor,
+    InferenceQueueFull,
+)
 
 
 router = APIRouter(prefix="/chatbot", tags=["chatbot"])
 
+# shared secret for the chatbot admin endpoints; unset disables them
+_ADMIN_TOKEN = os.environ.get("CHATBOT_ADMIN_TOKEN")
+
+
+class ChatOptions(BaseModel):
+    """Retrieval and answer settings shared by the single and batch endpoints."""
 
-class ChatRequest(BaseModel):
-    message: str
-    context: Optional[str] = None  # Conversation context (not used for retrieval)
     top_k: Optional[int] = 6
     score_threshold: Optional[float] = 0.18
+    use_cache: Optional[bool] = True  # set False to bypass the semantic answer cache
+    # optional retrieval scope: act title (substring), section id, years passed
+    law_title: Optional[str] = None
+    section_id: Optional[str] = None
+    year_from: Optional[int] = None
+    year_to: Optional[int] = None
+    # cross-encoder rerank of over-fetched hits; None uses the server default
+    rerank: Optional[bool] = None
+    rerank_budget_ms: Optional[float] = None
+    # "two_call" or "single_call"; None uses the server default
+    strategy: Optional[str] = None
+    # per-stage latencies (ms) in the response's "timings" field; opt-in, as
+    # they bloat every batch item and are mostly for debugging/benchmarks
+    include_timings: Optional[bool] = False
+
+
+class ChatRequest(ChatOptions):
+    message: str
+    context: Optional[str] = None  # Conversation context (not used for retrieval)
+    # server-side conversation (POST /sessions); replaces context when set
+    session_id: Optional[str] = None
+
+
+class BatchItem(BaseModel):
+    message: str
+    context: Optional[str] = None
+
+
+class BatchChatRequest(ChatOptions):
+    items: List[BatchItem]
+    # concurrent LLM calls for this batch; None uses the server default
+    max_concurrency: Optional[int] = None
+
+
+def _strategy(req: ChatOptions) -> Optional[str]:
+    if req.strategy and req.strategy not in ANSWER_STRATEGIES:
+        raise HTTPException(
+            status_code=400, detail=f"strategy must be one of {ANSWER_STRATEGIES}"
+        )
+    return req.strategy
+
+
+def _filters(req: ChatOptions) -> RetrievalFilter:
+    if req.year_from and req.year_to and req.year_from > req.year_to:
+        raise HTTPException(status_code=400, detail="year_from is after year_to")
+    return RetrievalFilter(
+        law_title=req.law_title,
+        section_id=req.section_id,
+        year_from=req.year_from,
+        year_to=req.year_to,
+    )
+
+
+def _session_context(req: ChatRequest) -> Tuple[Optional[Session], Optional[str]]:
+    """The session named by the request and the prompt context to use."""
+    if not req.session_id:
+        return None, req.context
+    session = sessions.get(req.session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired session")
+    return session, sessions.context(session)
+
+
+def _record_turn(session: Optional[Session], question: str, result: Dict) -> None:
+    # a "service unavailable" reply is not part of the conversation
+    if session is not None and result.get("type") != "degraded":
+        sessions.add_turn(session, question, result["answer"])
 
 
 @router.post("/chat")
 async def chat_endpoint(req: ChatRequest):
     if not req.message or not req.message.strip():
         raise HTTPException(status_code=400, detail="Message is required")
+    filters = _filters(req)
+    strategy = _strategy(req)
+    session, context = _session_context(req)
+
+    # run_inference loads the resources on first use; like the inference
+    # itself that blocks, so it runs on the inference pool, not the event loop
+    kwargs: Dict[str, Any] = {
+        "context": context,
+        "top_k": req.top_k or 6,
+        "score_threshold": req.score_threshold or 0.18,
+        "use_cache": req.use_cache is not False,
+        "filters": filters,
+        "rerank": req.rerank,
+        "rerank_budget_ms": req.rerank_budget_ms,
+        "strategy": strategy,
+    }
+
+    def infer():
+        return inference_executor.run(run_inference, req.message, **kwargs)
 
-    # ensure resources are initialized (index, model, etc.)
     try:
-        initialize()
+        if SINGLE_FLIGHT:
+            # identical concurrent questions wait for one computation
+            result, shared = await inference_flights.do(
+                inference_key(req.message, **kwargs), infer
+            )
+        else:
+            result, shared = await infer(), False
+    except InferenceQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Inference error: {e}")
+
+    # the result object is shared between coalesced requests
+    result = dict(result)
+    if shared:
+        result["coalesced"] = True
+    _record_turn(session, req.message, result)
+    if session is not None:
+        result["session_id"] = session.id
+    if not req.include_timings:
+        result.pop("timings", None)
+    return result
+
+
+def _batch_args(req: BatchChatRequest) -> Dict[str, Any]:
+    if not req.items:
+        raise HTTPException(status_code=400, detail="items is required")
+    if len(req.items) > BATCH_MAX_ITEMS:
         raise HTTPException(
-            status_code=500, detail=f"Failed to initialize chatbot resources: {e}"
+            status_code=413, detail=f"At most {BATCH_MAX_ITEMS} items per batch"
+        )
+    if req.max_concurrency is not None and req.max_concurrency < 1:
+        raise HTTPException(status_code=400, detail="max_concurrency must be >= 1")
+    return {
+        "items": [(item.message, item.context) for item in req.items],
+        "top_k": req.top_k or 6,
+        "score_threshold": req.score_threshold or 0.18,
+        "use_cache": req.use_cache is not False,
+        "filters": _filters(req),
+        "rerank": req.rerank,
+        "rerank_budget_ms": req.rerank_budget_ms,
+        "strategy": _strategy(req),
+        "max_concurrency": req.max_concurrency,
+    }
+
+
+def _batch_result(out: Dict[str, Any], include_timings: bool) -> Dict[str, Any]:
+    """JSON-friendly batch item: hit metadata instead of full section texts."""
+    out = dict(out)
+    if "hits" in out:
+        out["hits"] = [hit_metadata(h) for h in out["hits"]]
+    if not include_timings:
+        out.pop("timings", None)
+    return out
+
+
+@router.post("/chat/batch")
+async def chat_batch_endpoint(req: BatchChatRequest):
+    """Answer many questions in one request; results are in item order.
+
+    Retrieval is batched (one embedding call, one FAISS search) and the LLM
+    calls run with bounded concurrency. Each result has a "status" of "ok"
+    or "error"; one failing item does not fail the batch.
+    """
+    args = _batch_args(req)
+    try:
+        batch = await inference_executor.run(run_inference_batch, **args)
+    except InferenceQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Inference error: {e}")
+
+    include_timings = bool(req.include_timings)
+    batch["results"] = [_batch_result(r, include_timings) for r in batch["results"]]
+    if not include_timings:
+        batch.pop("timings", None)
+    return batch
+
+
+@router.post("/chat/batch/stream")
+async def chat_batch_stream_endpoint(req: BatchChatRequest):
+    """Like /chat/batch, but streams one NDJSON line per item as it finishes.
+
+    Lines carry the item's "index" and arrive in completion order; the last
+    line is a summary with "done": true.
+    """
+    args = _batch_args(req)
+    include_timings = bool(req.include_timings)
+    if inference_executor.kind == "process":
+        return StreamingResponse(
+            _per_item_lines(args, include_timings),
+            media_type="application/x-ndjson",
         )
 
+    async def lines():
+        results = iter_inference_batch(**args)
+        try:
+            while True:
+                # each step blocks (retrieval, then waiting for an LLM call)
+                out = await inference_executor.run(next, results, None)
+                if out is None:
+                    return
+                yield json.dumps(_batch_result(out, include_timings)) + "\n"
+        except Exception as e:
+            # headers are sent already, so report the failure in-band
+            yield json.dumps({"done": True, "error": str(e)}) + "\n"
+        finally:
+            try:
+                results.close()
+            except ValueError:
+                pass  # still running on a worker (client went away mid-step)
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+async def _per_item_lines(args: Dict[str, Any], include_timings: bool):
+    """NDJSON batch lines for the process executor, one pool call per item.
+
+    A generator cannot be sent to a worker process, so instead of the shared
+    batch retrieval each item runs run_inference on the pool; at most
+    max_concurrency of them at a time, so a batch does not fill the queue.
+    """
+    items = args.pop("items")
+    limit = args.pop("max_concurrency") or BATCH_LLM_CONCURRENCY
+    slots = asyncio.Semaphore(max(1, limit))
+    t0 = time.perf_counter()
+
+    async def answer(i: int, question: str, context: Optional[str]) -> Dict:
+        if not question.strip():
+            return {"index": i, "status": "error", "error": "Message is required"}
+        async with slots:
+            try:
+                result = await inference_executor.run(
+                    run_inference, question.strip(), context=context, **args
+                )
+            except Exception as e:
+                return {"index": i, "status": "error", "error": str(e)}
+        return {"index": i, "status": "ok", **result}
+
+    tasks = [
+        asyncio.ensure_future(answer(i, q, ctx)) for i, (q, ctx) in enumerate(items)
+    ]
+    errors = 0
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            out = await next_done
+            errors += out["status"] == "error"
+            yield json.dumps(_batch_result(out, include_timings)) + "\n"
+        summary: Dict[str, Any] = {"done": True, "count": len(items), "errors": errors}
+        if include_timings:
+            summary["timings"] = {
+                "total_ms": round((time.perf_counter() - t0) * 1000, 2)
+            }
+        yield json.dumps(summary) + "\n"
+    finally:
+        # client went away: do not start the items still waiting for a slot
+        for task in tasks:
+            task.cancel()
+
+
+def _sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@router.post("/chat/stream")
+async def chat_stream_endpoint(req: ChatRequest):
+    """Stream the answer as Server-Sent Events.
+
+    Events, in order: `sources` (hit metadata, stage timings), any number of
+    `token`, an optional `fallback` (client should discard tokens received so
+    far), `done`.
+    """
+    if not req.message or not req.message.strip():
+        raise HTTPException(status_code=400, detail="Message is required")
+    filters = _filters(req)
+    strategy = _strategy(req)
+    session, context = _session_context(req)
+
     try:
-        result = run_inference(
+        prepared = await inference_executor.run(
+            prepare_inference,
             req.message,
-            context=req.context,
+            context=context,
             top_k=req.top_k or 6,
             score_threshold=req.score_threshold or 0.18,
+            filters=filters,
+            rerank=req.rerank,
+            rerank_budget_ms=req.rerank_budget_ms,
+            strategy=strategy,
         )
+    except InferenceQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Inference error: {e}")
 
-    return result
+    def finish(answer_type: str, answer: str) -> str:
+        if answer.strip() == DEGRADED_ANSWER:
+            answer_type = "degraded"
+        _record_turn(session, req.message, {"type": answer_type, "answer": answer})
+        done = {"type": answer_type}
+        if session is not None:
+            done["session_id"] = session.id
+        return _sse("done", done)
+
+    async def events():
+        answer_type = prepared["type"]
+        yield _sse(
+            "sources",
+            {
+                "type": answer_type,
+                "hits": [hit_metadata(h) for h in prepared["hits"]],
+                **({"timings": prepared["timings"]} if req.include_timings else {}),
+            },
+        )
+
+        if prepared.get("canned"):
+            # greeting: the reply is precomputed, no LLM call to stream
+            yield _sse("token", {"text": prepared["answer"]})
+            yield finish(answer_type, prepared["answer"])
+            return
+
+        if prepared.get("strategy") == "single_call":
+            # one round-trip: the reply's BASIS line says sourced vs fallback
+            parser = BasisStreamParser()
+            answer = ""
+            async for token in astream_groq(
+                prepared["messages"], temperature=prepared["temperature"]
+            ):
+                text = parser.feed(token)
+                if parser.answer_type == "fallback" and answer_type != "fallback":
+                    answer_type = "fallback"
+                    yield _sse(
+                        "fallback", {"reason": "answered from general knowledge"}
+                    )
+                if text:
+                    answer += text
+                    yield _sse("token", {"text": text})
+            text = parser.flush()
+            if parser.answer_type == "fallback" and answer_type != "fallback":
+                answer_type = "fallback"
+                yield _sse("fallback", {"reason": "answered from general knowledge"})
+            if text:
+                answer += text
+                yield _sse("token", {"text": text})
+            yield finish(answer_type, answer)
+            return
+
+        answer = ""
+        async for token in astream_groq(
+            prepared["messages"], temperature=prepared["temperature"]
+        ):
+            answer += token
+            yield _sse("token", {"text": token})
+
+        if answer_type == "sourced" and is_unknown_answer(answer):
+            answer_type = "fallback"
+            yield _sse("fallback", {"reason": "sources did not contain the answer"})
+            answer = ""
+            async for token in astream_groq(
+                build_fallback_messages(req.message, context),
+                temperature=FALLBACK_TEMPERATURE,
+            ):
+                answer += token
+                yield _sse("token", {"text": token})
+
+        yield finish(answer_type, answer)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/stats")
+async def chat_stats():
+    if inference_executor.kind == "process":
+        # the parent serves no inference; report one of the pool's workers
+        try:
+            worker = await inference_executor.run(worker_stats)
+        except InferenceQueueFull as e:
+            raise HTTPException(status_code=503, detail=str(e))
+    else:
+        worker = worker_stats()
+    return {
+        "executor": inference_executor.stats(),
+        **worker,
+        "sessions": sessions.stats(),
+    }
+
+
+@router.post("/sessions")
+async def create_session():
+    """Start a server-side conversation; pass its id as session_id to /chat."""
+    return {"session_id": sessions.create().id}
+
+
+@router.get("/sessions/{session_id}")
+async def get_session(session_id: str):
+    session = sessions.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired session")
+    return sessions.describe(session)
+
+
+@router.delete("/sessions/{session_id}")
+async def delete_session(session_id: str):
+    if not sessions.delete(session_id):
+        raise HTTPException(status_code=404, detail="Unknown or expired session")
+    return {"deleted": session_id}
+
+
+@router.get("/metrics")
+async def chat_metrics():
+    """Stage latency histograms in the Prometheus text format."""
+    body = render_metrics()
+    if body is None:
+        raise HTTPException(status_code=404, detail="prometheus_client not installed")
+    return Response(content=body, media_type=CONTENT_TYPE_LATEST)
+
+
+@router.post("/admin/reload")
+async def reload_index(x_admin_token: Optional[str] = Header(default=None)):
+    """Hot-swap the FAISS index and documents without restarting workers."""
+    if not _ADMIN_TOKEN or x_admin_token != _ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    if inference_executor.kind != "process":
+        try:
+            return await asyncio.to_thread(reload_resources)
+        except ValueError as e:
+            raise HTTPException(status_code=409, detail=f"Reload rejected: {e}")
+    # each pool worker holds its own copy: validate the new files in one of
+    # them, then replace the pool so every worker loads them
+    try:
+        result = await inference_executor.run(reload_resources)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=f"Reload rejected: {e}")
+    except InferenceQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    inference_executor.recycle()
+    await inference_executor.broadcast(initialize)
+    return {**result, "workers_recycled": True}
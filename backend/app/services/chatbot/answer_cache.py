@@ -0,0 +1,95 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+import numpy as np
+import faiss
+
+
+class SemanticAnswerCache:
+    """Cache of LLM answers keyed on the question embedding.
+
+    A lookup is a hit when a cached question lies within max_distance (cosine
+    distance, embeddings must be L2-normalized) of the new question AND both
+    were answered from the same set of retrieved sources. Cached questions are
+    kept in a small flat inner-product index; the oldest entry is evicted once
+    max_entries is reached.
+    """
+
+    def __init__(
+        self, dim: Optional[int] = None, max_entries: int = 1024, max_distance: float = 0.05
+    ):
+        self.max_entries = max(0, max_entries)
+        self.max_distance = max_distance
+        self._dim = dim
+        self._index: Optional[faiss.IndexIDMap2] = None
+        self._entries: "OrderedDict[int, Tuple[Tuple[int, ...], Dict[str, Any]]]" = (
+            OrderedDict()
+        )
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def source_key(doc_indices: Iterable[int]) -> Tuple[int, ...]:
+        return tuple(sorted(set(int(i) for i in doc_indices)))
+
+    def _ensure_index(self, dim: int) -> faiss.IndexIDMap2:
+        if self._index is None or self._dim != dim:
+            self._dim = dim
+            self._index = faiss.IndexIDMap2(faiss.IndexFlatIP(dim))
+            self._entries.clear()
+        return self._index
+
+    def lookup(
+        self, emb: np.ndarray, doc_indices: Iterable[int], k: int = 8
+    ) -> Optional[Dict[str, Any]]:
+        key = self.source_key(doc_indices)
+        with self._lock:
+            if self._index is None or self._index.ntotal == 0:
+                self.misses += 1
+                return None
+            D, I = self._index.search(emb.reshape(1, -1), min(k, self._index.ntotal))
+            for sim, eid in zip(D[0].tolist(), I[0].tolist()):
+                if eid < 0 or 1.0 - sim > self.max_distance:
+                    break
+                entry = self._entries.get(eid)
+                if entry is not None and entry[0] == key:
+                    self.hits += 1
+                    return entry[1]
+            self.misses += 1
+            return None
+
+    def store(
+        self, emb: np.ndarray, doc_indices: Iterable[int], result: Dict[str, Any]
+    ) -> None:
+        if self.max_entries == 0:
+            return
+        emb = np.ascontiguousarray(emb.reshape(1, -1), dtype="float32")
+        with self._lock:
+            index = self._ensure_index(emb.shape[1])
+            while len(self._entries) >= self.max_entries:
+                old_id, _ = self._entries.popitem(last=False)
+                index.remove_ids(np.array([old_id], dtype="int64"))
+            eid = self._next_id
+            self._next_id += 1
+            index.add_with_ids(emb, np.array([eid], dtype="int64"))
+            self._entries[eid] = (self.source_key(doc_indices), result)
+
+    def clear(self) -> None:
+        with self._lock:
+            if self._index is not None:
+                self._index.reset()
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "max_distance": self.max_distance,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / total) if total else 0.0,
+        }
@@ -0,0 +1,189 @@
+"""BM25 inverted index over the legal corpus, stored as memory-mapped arrays.
+
+Layout of an index directory:
+
+    vocab.json        term -> term id
+    term_offsets.npy  int64[n_terms + 1], postings of term t are [off[t], off[t+1])
+    post_docs.npy     uint32 doc row per posting (sorted by term, then doc)
+    post_tf.npy       uint16 term frequency per posting
+    doc_len.npy       uint32 token count per doc
+    bm25.json         n_docs, avgdl, k1, b
+
+Tokens are lowercase alphanumeric runs, so statute names, years and section
+numbers ("302", "1860") are matched exactly. Build from the backend directory:
+
+    python -m app.services.chatbot.bm25 build \\
+        --store app/services/chatbot/data/doc_store \\
+        --out app/services/chatbot/data/bm25
+
+or pass --bm25 to `index_builder build` to write it alongside the FAISS index.
+"""
+
+import argparse
+import json
+import os
+import re
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .doc_store import extract_meta, save_npy_atomic
+from .index_builder import doc_embed_text, load_corpus
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+META_NAME = "bm25.json"
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text.lower())
+
+
+def doc_lexical_text(doc: Dict) -> str:
+    meta = extract_meta(doc)
+    return " ".join(
+        [
+            meta["law_title"],
+            meta["section_name"],
+            meta["section_id"],
+            doc_embed_text(doc),
+        ]
+    )
+
+
+def build_bm25(
+    docs: Iterable[Dict], out_dir: Path, k1: float = 1.2, b: float = 0.75
+) -> "BM25Index":
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    vocab: Dict[str, int] = {}
+    postings: Dict[int, List[Tuple[int, int]]] = defaultdict(list)
+    doc_len: List[int] = []
+    for row, doc in enumerate(docs):
+        tokens = tokenize(doc_lexical_text(doc))
+        doc_len.append(len(tokens))
+        for term, tf in Counter(tokens).items():
+            tid = vocab.setdefault(term, len(vocab))
+            postings[tid].append((row, min(tf, 65535)))
+
+    offsets = np.zeros(len(vocab) + 1, dtype="int64")
+    for tid in range(len(vocab)):
+        offsets[tid + 1] = offsets[tid] + len(postings[tid])
+    post_docs = np.empty(int(offsets[-1]), dtype="uint32")
+    post_tf = np.empty(int(offsets[-1]), dtype="uint16")
+    for tid in range(len(vocab)):
+        plist = postings[tid]
+        start = int(offsets[tid])
+        post_docs[start : start + len(plist)] = [d for d, _ in plist]
+        post_tf[start : start + len(plist)] = [tf for _, tf in plist]
+
+    # servers may have the old arrays mmap'd: replace files, never overwrite
+    # them, and the meta file last
+    save_npy_atomic(out_dir / "term_offsets.npy", offsets)
+    save_npy_atomic(out_dir / "post_docs.npy", post_docs)
+    save_npy_atomic(out_dir / "post_tf.npy", post_tf)
+    save_npy_atomic(out_dir / "doc_len.npy", np.asarray(doc_len, dtype="uint32"))
+    _write_json_atomic(out_dir / "vocab.json", vocab)
+    meta = {
+        "n_docs": len(doc_len),
+        "avgdl": float(np.mean(doc_len)) if doc_len else 0.0,
+        "k1": k1,
+        "b": b,
+    }
+    _write_json_atomic(out_dir / META_NAME, meta)
+    return BM25Index(out_dir)
+
+
+def _write_json_atomic(path: Path, data: Dict) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    with tmp.open("w", encoding="utf-8") as fh:
+        json.dump(data, fh, indent=2 if path.name == META_NAME else None)
+    os.replace(tmp, path)
+
+
+class BM25Index:
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        with (self.path / META_NAME).open("r", encoding="utf-8") as fh:
+            meta = json.load(fh)
+        with (self.path / "vocab.json").open("r", encoding="utf-8") as fh:
+            self.vocab: Dict[str, int] = json.load(fh)
+        self.n_docs = int(meta["n_docs"])
+        self.avgdl = float(meta["avgdl"]) or 1.0
+        self.k1 = float(meta["k1"])
+        self.b = float(meta["b"])
+        self.offsets = np.load(self.path / "term_offsets.npy", mmap_mode="r")
+        self.post_docs = np.load(self.path / "post_docs.npy", mmap_mode="r")
+        self.post_tf = np.load(self.path / "post_tf.npy", mmap_mode="r")
+        self.doc_len = np.load(self.path / "doc_len.npy", mmap_mode="r")
+
+    @staticmethod
+    def exists(path: Path) -> bool:
+        return (Path(path) / META_NAME).exists()
+
+    def search(
+        self, query: str, top_k: int = 10, mask: Optional[np.ndarray] = None
+    ) -> List[Tuple[int, float]]:
+        """Return up to top_k (doc row, bm25 score) pairs, best first.
+
+        mask (one bool per doc row) limits the result to rows where it is True.
+        """
+        term_ids = {self.vocab[t] for t in tokenize(query) if t in self.vocab}
+        if not term_ids or self.n_docs == 0:
+            return []
+        scores = np.zeros(self.n_docs, dtype="float32")
+        for tid in term_ids:
+            start, end = int(self.offsets[tid]), int(self.offsets[tid + 1])
+            df = end - start
+            idf = np.log(1.0 + (self.n_docs - df + 0.5) / (df + 0.5))
+            rows = np.asarray(self.post_docs[start:end], dtype="int64")
+            tf = np.asarray(self.post_tf[start:end], dtype="float32")
+            dl = np.asarray(self.doc_len[rows], dtype="float32")
+            # a doc appears at most once per posting list, so plain += is safe
+            scores[rows] += (
+                idf
+                * tf
+                * (self.k1 + 1)
+                / (tf + self.k1 * (1 - self.b + self.b * dl / self.avgdl))
+            )
+        if mask is not None:
+            scores *= mask[: self.n_docs]
+        nonzero = np.flatnonzero(scores)
+        if len(nonzero) > top_k:
+            nonzero = nonzero[np.argpartition(-scores[nonzero], top_k)[:top_k]]
+        order = nonzero[np.argsort(-scores[nonzero])]
+        return [(int(i), float(scores[i])) for i in order]
+
+
+def reciprocal_rank_fusion(
+    rankings: Sequence[Sequence[int]], k: int = 60
+) -> List[Tuple[int, float]]:
+    """Fuse several ranked id lists: score(d) = sum 1 / (k + rank_i(d))."""
+    fused: Dict[int, float] = defaultdict(float)
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            fused[doc_id] += 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda kv: kv[1], reverse=True)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Build the BM25 lexical index")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    bp = sub.add_parser("build", help="build from a doc store or JSONL corpus")
+    bp.add_argument("--store", type=Path)
+    bp.add_argument("--jsonl", type=Path)
+    bp.add_argument("--out", type=Path, required=True)
+    bp.add_argument("--k1", type=float, default=1.2)
+    bp.add_argument("--b", type=float, default=0.75)
+    args = parser.parse_args(argv)
+
+    if args.cmd == "build":
+        docs = load_corpus(args.jsonl, args.store)
+        index = build_bm25(docs, args.out, k1=args.k1, b=args.b)
+        print(f"✓ Wrote BM25 index ({len(index.vocab)} terms) to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
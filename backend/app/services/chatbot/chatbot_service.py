@@ -1,37 +1,231 @@
 import os
 import json
+import gc
+import re
+import hashlib
 import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import List, Dict, Optional, Any, cast
+from typing import (
+    AsyncIterator,
+    Iterator,
+    List,
+    Dict,
+    Optional,
+    Any,
+    Tuple,
+    Union,
+    cast,
+)
 import numpy as np
 import faiss
-from sentence_transformers import SentenceTransformer
-from groq import Groq
 from dotenv import load_dotenv
 
+from .embedding_batcher import EmbeddingBatcher
+from .embedding_backends import load_backend
+from .embedding_sidecar import SidecarBackend, SidecarUnavailable
+from .query_cache import LRUTTLCache, normalize_query
+from .answer_cache import SemanticAnswerCache
+from .doc_store import DocStore, extract_meta
+from .index_builder import doc_embed_text, manifest_path, read_manifest, search_params
+from .snapshot import FileWatcher, RetrievalSnapshot, validate_snapshot
+from .bm25 import META_NAME as BM25_META_NAME, BM25Index, reciprocal_rank_fusion
+from .metadata_filter import MetadataColumns, RetrievalFilter, id_selector
+from .reranker import CrossEncoderReranker, rerank
+from .context_packer import pack_sources
+from .llm_gateway import LLMGateway, LLMUnavailable
+from .telemetry import annotate, count, observe, span, trace, watch_breaker
+from .token_count import get_encoding
+from .single_flight import SingleFlight
+from .conversation import ConversationStore, Turn, format_turns
+from .intent_router import CANNED_REPLIES, CAPABILITY, GREETING, LEGAL, IntentRouter
+
+logger = logging.getLogger(__name__)
+# DEBUG adds per-request retrieval and prompt details; below the configured
+# level the log calls return before formatting anything
+LOG_LEVEL = os.environ.get("CHATBOT_LOG_LEVEL", "INFO").upper()
+logging.getLogger(__package__).setLevel(LOG_LEVEL)
+
 # make sure environment vars are loaded before creating clients
 load_dotenv()
 
-# Groq client (may be None if API key missing)
+
+def env_flag(name: str, default: bool = False) -> bool:
+    """Boolean environment setting: "1", "true" or "yes" (any case) is on."""
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes")
+
+
+# Groq access: concurrency cap, timeouts, retries and circuit breaker.
+# LLM_BASE_URL points it at another OpenAI-compatible server (e.g. a stub).
 _GROQ_API_KEY = os.environ.get("groq_api_key")
-client = Groq(api_key=_GROQ_API_KEY) if _GROQ_API_KEY else None
+LLM_BASE_URL = os.environ.get("CHATBOT_LLM_BASE_URL") or None
+LLM_MAX_CONCURRENCY = int(os.environ.get("CHATBOT_LLM_MAX_CONCURRENCY", "8"))
+LLM_TIMEOUT = float(os.environ.get("CHATBOT_LLM_TIMEOUT", "30"))
+LLM_RETRIES = int(os.environ.get("CHATBOT_LLM_RETRIES", "2"))
+LLM_BREAKER_FAILURES = int(os.environ.get("CHATBOT_LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_RESET = float(os.environ.get("CHATBOT_LLM_BREAKER_RESET", "30"))
+# gateway (may be None if API key missing)
+llm = (
+    LLMGateway(
+        _GROQ_API_KEY,
+        base_url=LLM_BASE_URL,
+        max_concurrency=LLM_MAX_CONCURRENCY,
+        timeout=LLM_TIMEOUT,
+        max_retries=LLM_RETRIES,
+        failure_threshold=LLM_BREAKER_FAILURES,
+        reset_timeout=LLM_BREAKER_RESET,
+    )
+    if _GROQ_API_KEY
+    else None
+)
+if llm is not None:
+    watch_breaker(llm.breaker)
+# "two_call": RAG prompt, then a general-knowledge call if it says "I do not
+# know". "single_call": one prompt that may fall back to general knowledge
+# and says which it did in a leading BASIS line.
+ANSWER_STRATEGY = os.environ.get("CHATBOT_ANSWER_STRATEGY", "two_call").lower()
+ANSWER_STRATEGIES = ("two_call", "single_call")
+# served instead of a second (fallback) call when the LLM is failing
+DEGRADED_ANSWER = (
+    "The legal assistant is temporarily unavailable. The sources listed below "
+    "may still help; please try again in a minute."
+)
 
 # paths and model names (adjust paths as needed)
 INDEX_PATH = Path("app/services/chatbot/data/faiss_index.index")
 JSONL_PATH = Path("app/services/chatbot/data/processed_bd_law.jsonl")
+# built with `python -m app.services.chatbot.doc_store build`; preferred over JSONL
+DOC_STORE_PATH = Path("app/services/chatbot/data/doc_store")
+# built with `python -m app.services.chatbot.bm25 build` (or index_builder --bm25)
+BM25_PATH = Path("app/services/chatbot/data/bm25")
 EMBED_MODEL = "all-MiniLM-L6-v2"
 GROQ_MODEL = "llama-3.3-70b-versatile"
 
+# query embedding backend: "torch" (sentence-transformers), "onnx" or "onnx_int8"
+EMBED_BACKEND = os.environ.get("CHATBOT_EMBED_BACKEND", "torch").lower()
+ONNX_DIR = Path(os.environ.get("CHATBOT_ONNX_DIR", "app/services/chatbot/data/onnx"))
+# Unix socket of a shared embedding sidecar (see embedding_sidecar); unset or
+# unreachable means the model is loaded in this process
+EMBED_SIDECAR = os.environ.get("CHATBOT_EMBED_SIDECAR") or None
+EMBED_SIDECAR_TIMEOUT = float(os.environ.get("CHATBOT_EMBED_SIDECAR_TIMEOUT", "10"))
+# after a failed sidecar call it is tried again EMBED_SIDECAR_RETRY_S later;
+# only after EMBED_SIDECAR_MAX_FAILURES failures in a row is a model loaded
+# in-process, and it is released again once the sidecar answers
+EMBED_SIDECAR_RETRY_S = float(os.environ.get("CHATBOT_EMBED_SIDECAR_RETRY_S", "5"))
+EMBED_SIDECAR_MAX_FAILURES = int(
+    os.environ.get("CHATBOT_EMBED_SIDECAR_MAX_FAILURES", "3")
+)
+
+# cross-request micro-batching of query embeddings (batch size 1 disables it)
+EMBED_BATCH_SIZE = int(os.environ.get("CHATBOT_EMBED_BATCH_SIZE", "16"))
+EMBED_BATCH_WAIT_MS = float(os.environ.get("CHATBOT_EMBED_BATCH_WAIT_MS", "2"))
+
+# normalized-query caches in front of encode_query / retrieve_hits
+QUERY_CACHE_SIZE = int(os.environ.get("CHATBOT_QUERY_CACHE_SIZE", "2048"))
+QUERY_CACHE_TTL = float(os.environ.get("CHATBOT_QUERY_CACHE_TTL", "3600"))
+
+# semantic answer cache in front of the Groq call (0 entries disables it)
+ANSWER_CACHE_SIZE = int(os.environ.get("CHATBOT_ANSWER_CACHE_SIZE", "1024"))
+ANSWER_CACHE_MAX_DISTANCE = float(
+    os.environ.get("CHATBOT_ANSWER_CACHE_MAX_DISTANCE", "0.05")
+)
+
+# hybrid retrieval: fuse BM25 and FAISS rankings when a BM25 index is present
+HYBRID_RETRIEVAL = env_flag("CHATBOT_HYBRID", True)
+RRF_K = int(os.environ.get("CHATBOT_RRF_K", "60"))
+
+# filtered searches matching at most this many sections are scored exactly
+# over just those vectors instead of through the index
+FILTER_EXACT_MAX = int(os.environ.get("CHATBOT_FILTER_EXACT_MAX", "4096"))
+
+# optional cross-encoder rerank: over-fetch RERANK_CANDIDATES hits, keep top_k.
+# The budget covers retrieval + rerank; the rerank is skipped when its
+# estimated cost does not fit into what is left of it.
+RERANK_ENABLED = env_flag("CHATBOT_RERANK", False)
+RERANK_MODEL = os.environ.get(
+    "CHATBOT_RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2"
+)
+RERANK_CANDIDATES = int(os.environ.get("CHATBOT_RERANK_CANDIDATES", "24"))
+RERANK_BUDGET_MS = float(os.environ.get("CHATBOT_RERANK_BUDGET_MS", "300"))
+RERANK_PASSAGE_CHARS = 1500
+
+# token budget for the sources in the RAG prompt, split across hits by score;
+# hits that would get fewer than CONTEXT_MIN_TOKENS are left out
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("CHATBOT_CONTEXT_TOKENS", "3000"))
+CONTEXT_MIN_TOKENS = int(os.environ.get("CHATBOT_CONTEXT_MIN_TOKENS", "48"))
+
+# coalesce concurrent identical /chat requests into one inference (per process)
+SINGLE_FLIGHT = env_flag("CHATBOT_SINGLE_FLIGHT", True)
+
+# server-side conversation sessions: the prompt context is a rolling summary
+# plus the last SESSION_RECENT_TURNS turns, within SESSION_CONTEXT_TOKENS
+SESSION_RECENT_TURNS = int(os.environ.get("CHATBOT_SESSION_RECENT_TURNS", "3"))
+SESSION_CONTEXT_TOKENS = int(os.environ.get("CHATBOT_SESSION_CONTEXT_TOKENS", "600"))
+SESSION_MAX = int(os.environ.get("CHATBOT_SESSION_MAX", "10000"))
+SESSION_TTL = float(os.environ.get("CHATBOT_SESSION_TTL", "3600"))
+# turns kept per session while summaries fail; older ones are dropped
+SESSION_MAX_TURNS = int(os.environ.get("CHATBOT_SESSION_MAX_TURNS", "50"))
+
+# intent routing: questions no greeting/capability phrase settles are matched
+# against per-intent embedding centroids; a non-legal intent must reach
+# INTENT_MIN_SIM cosine and beat the runner-up by INTENT_MARGIN
+INTENT_CENTROIDS = env_flag("CHATBOT_INTENT_CENTROIDS", True)
+INTENT_MIN_SIM = float(os.environ.get("CHATBOT_INTENT_MIN_SIM", "0.5"))
+INTENT_MARGIN = float(os.environ.get("CHATBOT_INTENT_MARGIN", "0.05"))
+
+# /chat/batch: most questions per request, and concurrent LLM calls per batch
+# (kept below the gateway's limit so a batch cannot take every slot)
+BATCH_MAX_ITEMS = int(os.environ.get("CHATBOT_BATCH_MAX_ITEMS", "256"))
+BATCH_LLM_CONCURRENCY = int(os.environ.get("CHATBOT_BATCH_LLM_CONCURRENCY", "4"))
+
+# map the FAISS index file read-only instead of copying it onto the heap, so
+# worker processes share its pages through the page cache. The index file
+# must then only ever be replaced (os.replace), never rewritten in place.
+INDEX_MMAP = env_flag("CHATBOT_INDEX_MMAP", True)
+
+# poll index/doc-store files and hot-reload on change (0 disables the watcher)
+WATCH_INTERVAL = float(os.environ.get("CHATBOT_WATCH_INTERVAL", "0"))
+
 # Do not perform heavy I/O or model loading at import time. Load lazily.
-embed_model: Optional[SentenceTransformer] = None
-docs: List[Dict] = []
-index: Optional[faiss.Index] = None
+embed_model: Optional[Any] = None  # one of embedding_backends.*Backend
+embed_batcher: Optional[EmbeddingBatcher] = None
+_embed_lock = threading.Lock()
+# sidecar outage handling, see _encode_via_sidecar
+_sidecar_failures = 0
+_sidecar_retry_at = 0.0
+_sidecar_fallbacks = 0
+_local_embed_model: Optional[Any] = None
+reranker: Optional[CrossEncoderReranker] = None
+_reranker_lock = threading.Lock()
+_reranker_failed = False
+# index + docs + manifest, replaced atomically by reload_resources(); the
+# snapshot version is part of the retrieval cache key
+snapshot: Optional[RetrievalSnapshot] = None
+_snapshot_version = 0
+_reload_lock = threading.Lock()
+_watcher: Optional[FileWatcher] = None
+# set once warm_up() has loaded the model/index and run a search
+_warm = False
+WARMUP_QUERY = "what is the punishment for theft"
+embedding_cache = LRUTTLCache(max_size=QUERY_CACHE_SIZE, ttl=QUERY_CACHE_TTL)
+retrieval_cache = LRUTTLCache(max_size=QUERY_CACHE_SIZE, ttl=QUERY_CACHE_TTL)
+answer_cache = SemanticAnswerCache(
+    max_entries=ANSWER_CACHE_SIZE, max_distance=ANSWER_CACHE_MAX_DISTANCE
+)
+# concurrent identical /chat requests share one run_inference call
+inference_flights = SingleFlight("inference")
+intent_router = IntentRouter(min_similarity=INTENT_MIN_SIM, margin=INTENT_MARGIN)
 
 
 def load_jsonl_docs(path: Path) -> List[Dict]:
     docs = []
     if not path.exists():
-        print(f"⚠️  JSONL file not found: {path}")
+        logger.warning("⚠️  JSONL file not found: %s", path)
         return docs
     with path.open("r", encoding="utf-8") as fh:
         for line in fh:
@@ -41,262 +235,975 @@ def load_jsonl_docs(path: Path) -> List[Dict]:
     return docs
 
 
-def load_faiss_index(p: Path) -> faiss.Index:
+def load_docs(
+    store_path: Optional[Path] = None, jsonl_path: Optional[Path] = None
+) -> Union[List[Dict], DocStore]:
+    store_path = store_path or DOC_STORE_PATH
+    jsonl_path = jsonl_path or JSONL_PATH
+    if DocStore.exists(store_path):
+        store = DocStore(store_path)
+        logger.info("✓ Opened doc store with %s docs from %s", len(store), store_path)
+        return store
+    loaded = load_jsonl_docs(jsonl_path)
+    logger.info("✓ Loaded %s docs from %s", len(loaded), jsonl_path)
+    return loaded
+
+
+def _index_mmap_flags() -> int:
+    # IO_FLAG_MMAP_IFC maps flat, HNSW and IVF codes in place; older faiss
+    # builds only have IO_FLAG_MMAP, which maps IVF inverted lists
+    flag = getattr(faiss, "IO_FLAG_MMAP_IFC", None)
+    if flag is None:
+        flag = getattr(faiss, "IO_FLAG_MMAP", 0)
+    return flag | getattr(faiss, "IO_FLAG_READ_ONLY", 0) if flag else 0
+
+
+def load_faiss_index(p: Path, mmap: Optional[bool] = None) -> faiss.Index:
+    """Read the index, memory-mapped when mmap (default INDEX_MMAP) is set."""
     if not p.exists():
         raise FileNotFoundError(f"FAISS index not found: {p}")
+    flags = _index_mmap_flags() if (INDEX_MMAP if mmap is None else mmap) else 0
+    if flags:
+        try:
+            return faiss.read_index(str(p), flags)
+        except RuntimeError as e:
+            logger.warning("⚠️  Cannot mmap %s, reading it into memory: %s", p, e)
     return faiss.read_index(str(p))
 
 
-def initialize(resources_path: Path = Path("data")) -> None:
-    """Load docs, faiss index and embedding model. Safe to call multiple times."""
-    global docs, index, embed_model
-    if docs and index is not None and embed_model is not None:
-        print(
-            f"✓ Resources already initialized: {len(docs)} docs, index present, model loaded"
-        )
-        return
-
-    print("🔄 Initializing chatbot resources...")
-    jsonl = JSONL_PATH
-    idxp = INDEX_PATH
+def load_snapshot(
+    index_path: Optional[Path] = None,
+    store_path: Optional[Path] = None,
+    jsonl_path: Optional[Path] = None,
+) -> RetrievalSnapshot:
+    """Load docs, index and manifest into a new (not yet published) snapshot."""
+    global _snapshot_version
+    idxp = index_path or INDEX_PATH
 
-    # load docs if present
+    # load docs if present: mmap'd doc store first, full JSONL parse otherwise
     try:
-        docs = load_jsonl_docs(jsonl)
-        print(f"✓ Loaded {len(docs)} docs from {jsonl}")
+        loaded_docs = load_docs(store_path, jsonl_path)
     except Exception as e:
-        print(f"❌ Error loading JSONL docs from {jsonl}: {e}")
-        docs = []
+        logger.error("❌ Error loading docs: %s", e)
+        loaded_docs = []
 
     # load index if present
+    loaded_index = None
+    manifest: Dict[str, Any] = {}
     try:
-        index = load_faiss_index(idxp)
-        print(f"✓ Loaded FAISS index from {idxp}")
+        # index before manifest: writers replace the manifest first, so the
+        # manifest read here is never older than the index
+        loaded_index = load_faiss_index(idxp)
+        manifest = read_manifest(idxp)
+        logger.info(
+            "✓ Loaded FAISS index from %s (type %s)",
+            idxp,
+            manifest.get("index_type", "unknown"),
+        )
     except FileNotFoundError:
-        print(f"⚠️  FAISS index not found: {idxp}")
-        index = None
+        logger.warning("⚠️  FAISS index not found: %s", idxp)
     except Exception as e:
-        print(f"❌ Error loading FAISS index from {idxp}: {e}")
-        index = None
+        logger.error("❌ Error loading FAISS index from %s: %s", idxp, e)
 
-    # load embedding model
-    if embed_model is None:
+    bm25 = None
+    if BM25Index.exists(BM25_PATH):
         try:
-            embed_model = SentenceTransformer(EMBED_MODEL)
-            print(f"✓ Loaded embedding model: {EMBED_MODEL}")
+            bm25 = BM25Index(BM25_PATH)
+            logger.info(
+                "✓ Loaded BM25 index from %s (%s terms)", BM25_PATH, len(bm25.vocab)
+            )
         except Exception as e:
-            print(f"❌ Failed to load embedding model {EMBED_MODEL}: {e}")
-            embed_model = None
+            logger.error("❌ Error loading BM25 index from %s: %s", BM25_PATH, e)
+            bm25 = None
+    if bm25 is not None and bm25.n_docs < len(loaded_docs):
+        # rows added by index_updater without --bm25 have no postings
+        logger.warning(
+            "⚠️  BM25 index covers %s of %s docs; using dense retrieval only "
+            "until it is rebuilt",
+            bm25.n_docs,
+            len(loaded_docs),
+        )
+        bm25 = None
+    # fusion and small filtered searches score vectors by id
+    if loaded_index is not None:
+        _enable_reconstruct(loaded_index)
+
+    columns = None
+    if len(loaded_docs):
+        try:
+            columns = MetadataColumns.from_docs(loaded_docs)
+        except Exception as e:
+            logger.error("❌ Error building metadata columns: %s", e)
+
+    _snapshot_version += 1
+    return RetrievalSnapshot(
+        index=loaded_index,
+        docs=loaded_docs,
+        manifest=manifest,
+        tombstones=frozenset(manifest.get("tombstones", [])),
+        version=_snapshot_version,
+        bm25=bm25,
+        columns=columns,
+    )
+
+
+def _enable_reconstruct(idx: faiss.Index) -> None:
+    # IVF indexes need a direct map before reconstruct() works
+    try:
+        faiss.extract_index_ivf(idx).make_direct_map()
+    except Exception:
+        pass
+
+
+def _dense_scores(idx: faiss.Index, q: np.ndarray, ids: List[int]) -> Dict[int, float]:
+    """Exact inner-product scores for ids the dense search did not return."""
+    out: Dict[int, float] = {}
+    for i in ids:
+        try:
+            out[i] = float(np.dot(cast(Any, idx).reconstruct(int(i)), q[0]))
+        except Exception:
+            out[i] = 0.0
+    return out
+
+
+def _subset_search(
+    idx: faiss.Index, q: np.ndarray, ids: np.ndarray, k: int
+) -> Optional[List[List[tuple]]]:
+    """Exact top-k over a few ids for each row of q; None if the index cannot
+    reconstruct them."""
+    try:
+        vecs = cast(Any, idx).reconstruct_batch(ids)
+    except Exception:
+        return None
+    scores = q @ vecs.T
+    out = []
+    for row in scores:
+        order = np.argsort(-row)[:k]
+        out.append([(int(ids[i]), float(row[i])) for i in order])
+    return out
+
+
+def _publish_snapshot(snap: RetrievalSnapshot) -> None:
+    global snapshot
+    snapshot = snap
+    # cached hits and answers point into the previous index/docs, drop them
+    retrieval_cache.clear()
+    answer_cache.clear()
+
+
+def _load_embed_model(use_sidecar: bool = True) -> Optional[Any]:
+    if EMBED_SIDECAR and use_sidecar:
+        try:
+            model = SidecarBackend(Path(EMBED_SIDECAR), timeout=EMBED_SIDECAR_TIMEOUT)
+            logger.info(
+                "✓ Using embedding sidecar at %s (%s)", EMBED_SIDECAR, model.name
+            )
+            return model
+        except SidecarUnavailable as e:
+            logger.warning("⚠️  %s - loading the model in-process", e)
+    try:
+        model = load_backend(EMBED_BACKEND, EMBED_MODEL, ONNX_DIR)
+        logger.info("✓ Loaded embedding model: %s (%s)", EMBED_MODEL, EMBED_BACKEND)
+        return model
+    except Exception as e:
+        logger.error("❌ Failed to load embedding model %s: %s", EMBED_MODEL, e)
+        return None
+
+
+def _encode_via_sidecar(sidecar: SidecarBackend, texts: List[str]) -> np.ndarray:
+    """Encode through the sidecar, riding out restarts without a local model.
+
+    While the sidecar is down calls fail fast until the next retry; after
+    EMBED_SIDECAR_MAX_FAILURES failed retries an in-process model serves
+    them instead, and is dropped when a retry succeeds.
+    """
+    global _sidecar_failures, _sidecar_retry_at, _local_embed_model
+    error: Optional[Exception] = None
+    if time.monotonic() >= _sidecar_retry_at:
+        try:
+            emb = sidecar.encode(texts)
+        except SidecarUnavailable as e:
+            error = e
+            with _embed_lock:
+                _sidecar_failures += 1
+                _sidecar_retry_at = time.monotonic() + EMBED_SIDECAR_RETRY_S
+            logger.warning(
+                "⚠️  %s - retrying in %.0fs (failure %s)",
+                e,
+                EMBED_SIDECAR_RETRY_S,
+                _sidecar_failures,
+            )
+        else:
+            if _sidecar_failures:
+                with _embed_lock:
+                    _sidecar_failures = 0
+                    released, _local_embed_model = _local_embed_model, None
+                logger.info("✓ Embedding sidecar is reachable again")
+                if released is not None:
+                    del released
+                    gc.collect()
+            return emb
+    local = _local_embed_model
+    if local is None and _sidecar_failures >= EMBED_SIDECAR_MAX_FAILURES:
+        local = _load_local_fallback()
+    if local is None:
+        raise SidecarUnavailable(
+            f"embedding sidecar at {sidecar.socket_path} is unavailable"
+        ) from error
+    return local.encode(texts)
+
+
+def _load_local_fallback() -> Any:
+    global _local_embed_model, _sidecar_fallbacks
+    with _embed_lock:
+        if _local_embed_model is None:
+            logger.warning(
+                "⚠️  Embedding sidecar failed %s times - loading an in-process model "
+                "until it is back",
+                _sidecar_failures,
+            )
+            model = _load_embed_model(use_sidecar=False)
+            if model is None:
+                raise RuntimeError("Embedding model not available")
+            _local_embed_model = model
+            _sidecar_fallbacks += 1
+        return _local_embed_model
+
+
+def embedding_stats() -> Dict[str, Any]:
+    model = embed_model
+    return {
+        "backend": getattr(model, "name", None),
+        "sidecar": EMBED_SIDECAR,
+        "sidecar_failures": _sidecar_failures,
+        "sidecar_fallbacks": _sidecar_fallbacks,
+        "local_fallback_loaded": _local_embed_model is not None,
+        "batcher": embed_batcher.stats() if embed_batcher is not None else None,
+    }
+
+
+def _embed_dim() -> Optional[int]:
+    if embed_model is None:
+        return None
+    return embed_model.dim
+
+
+def initialize(resources_path: Path = Path("data"), watch: bool = True) -> None:
+    """Load docs, faiss index and embedding model. Safe to call multiple times.
+
+    watch=False does not start the file watcher (see preload()).
+    """
+    global embed_model
+    snap = snapshot
+    if snap is not None and snap.ready and embed_model is not None:
+        logger.debug(
+            "✓ Resources already initialized: %s docs, index present, model loaded",
+            len(snap.docs),
+        )
+        # after preload() the first call in each worker starts its watcher
+        if watch and WATCH_INTERVAL > 0:
+            start_watcher(WATCH_INTERVAL)
+        return
+
+    logger.info("🔄 Initializing chatbot resources...")
+
+    # load embedding model
+    if embed_model is None:
+        embed_model = _load_embed_model()
+    # tiktoken may download its encoding file; do it here, not in a request
+    get_encoding()
+
+    with _reload_lock:
+        if snapshot is None or not snapshot.ready:
+            new_snap = load_snapshot()
+            try:
+                validate_snapshot(new_snap, _embed_dim())
+            except ValueError as e:
+                # still serve what we have, as before, but make the problem visible
+                logger.warning("⚠️  Retrieval resources look inconsistent: %s", e)
+            _publish_snapshot(new_snap)
+
+    if watch and WATCH_INTERVAL > 0:
+        start_watcher(WATCH_INTERVAL)
+
+
+def preload() -> None:
+    """Load the model, index and docs in a server master process before it forks.
+
+    For `gunicorn --preload -k uvicorn.workers.UvicornWorker -w N app.main:app`
+    with CHATBOT_PRELOAD_BEFORE_FORK=1: the workers inherit everything loaded
+    here and share its pages copy-on-write instead of each loading a copy.
+    Nothing is run on the model or index and no thread is started, since the
+    OpenMP/torch thread pools and the file watcher do not survive a fork;
+    each worker's warm_up() (CHATBOT_PRELOAD=1) or first request does that.
+    """
+    t0 = time.perf_counter()
+    initialize(watch=False)
+    # keep the cyclic GC from writing to (and so un-sharing) the pages of
+    # every object loaded so far
+    gc.freeze()
+    logger.info(
+        "✓ Chatbot resources preloaded before fork in %.2fs",
+        time.perf_counter() - t0,
+    )
+
+
+def reload_resources() -> Dict[str, Any]:
+    """Load the index/doc store from disk again and atomically swap it in.
+
+    The new snapshot is validated first; on failure the current one keeps
+    serving and ValueError is raised. In-flight requests finish on the snapshot
+    they started with.
+    """
+    with _reload_lock:
+        logger.info("🔄 Reloading chatbot index and documents...")
+        new_snap = load_snapshot()
+        validate_snapshot(new_snap, _embed_dim())
+        old = snapshot
+        _publish_snapshot(new_snap)
+    logger.info("✓ Swapped in retrieval snapshot v%s", new_snap.version)
+    return {
+        "previous": old.describe() if old is not None else None,
+        "current": new_snap.describe(),
+    }
+
+
+def _reload_on_change() -> None:
+    try:
+        reload_resources()
+    except ValueError as e:
+        logger.warning("⚠️  Ignoring changed index files: %s", e)
+
+
+def start_watcher(interval: float) -> FileWatcher:
+    """Start (once) a background thread that hot-reloads on index file changes."""
+    global _watcher
+    if _watcher is None:
+        _watcher = FileWatcher(
+            [
+                INDEX_PATH,
+                manifest_path(INDEX_PATH),
+                DOC_STORE_PATH / "store.json",
+                # written last by build_bm25 and apply_update
+                BM25_PATH / BM25_META_NAME,
+            ],
+            _reload_on_change,
+            interval=interval,
+        )
+        _watcher.start()
+    return _watcher
+
+
+def warm_up() -> Dict[str, Any]:
+    """Load everything and run one encode + search so the first request is fast.
+
+    Goes around the query caches so the dummy query does not pollute them.
+    """
+    global _warm
+    t0 = time.perf_counter()
+    initialize()
+    snap = snapshot
+    if embed_model is None or snap is None or not snap.ready:
+        raise RuntimeError("Chatbot resources unavailable after initialize()")
+    emb = encode_texts([WARMUP_QUERY])
+    faiss.normalize_L2(emb)
+    cast(Any, snap.index).search(emb, 1)
+    if INTENT_CENTROIDS:
+        intent_router.fit(encode_texts)
+    if RERANK_ENABLED:
+        model = _get_reranker()
+        if model is not None:
+            # also seeds the per-pair cost estimate used for the rerank budget
+            model.score(WARMUP_QUERY, [WARMUP_QUERY])
+    _warm = True
+    took = time.perf_counter() - t0
+    logger.info("✓ Chatbot warm-up finished in %.2fs", took)
+    # the pid tells a process-pool caller which worker is now warm
+    return {"pid": os.getpid(), "seconds": round(took, 3), "snapshot": snap.describe()}
+
+
+def is_ready() -> bool:
+    return _warm
+
+
+def snapshot_info() -> Optional[Dict[str, Any]]:
+    snap = snapshot
+    return snap.describe() if snap is not None else None
+
+
+def worker_stats() -> Dict[str, Any]:
+    """Stats of the process serving inference (a pool worker in process mode)."""
+    return {
+        "pid": os.getpid(),
+        "cache": cache_stats(),
+        "embedding": embedding_stats(),
+        "snapshot": snapshot_info(),
+        "rerank": rerank_stats(),
+        "llm": llm_stats(),
+        "single_flight": flight_stats(),
+    }
+
+
+def encode_texts(texts: List[str]) -> np.ndarray:
+    """Encode a list of texts in a single model call (no normalization)."""
+    model = embed_model
+    if model is None:
+        raise RuntimeError("Embedding model not available")
+    if isinstance(model, SidecarBackend):
+        return _encode_via_sidecar(model, texts)
+    return model.encode(texts)
+
+
+def _get_batcher() -> Optional[EmbeddingBatcher]:
+    global embed_batcher
+    if EMBED_BATCH_SIZE <= 1:
+        return None
+    if embed_batcher is None:
+        embed_batcher = EmbeddingBatcher(
+            encode_texts,
+            max_batch_size=EMBED_BATCH_SIZE,
+            max_wait_ms=EMBED_BATCH_WAIT_MS,
+        )
+    return embed_batcher
 
 
 def encode_query(query: str, normalize: bool = True) -> np.ndarray:
     # ensure resources are initialized
     if embed_model is None:
-        print("🔄 Embedding model not loaded, initializing...")
+        logger.debug("🔄 Embedding model not loaded, initializing...")
         initialize()
     if embed_model is None:
         raise RuntimeError("Embedding model not available")
 
-    print(f"🔍 Encoding query (length={len(query)} chars, normalize={normalize})")
-    emb = embed_model.encode([query], convert_to_numpy=True).astype("float32")
+    cache_key = (normalize_query(query), normalize)
+    cached = embedding_cache.get(cache_key)
+    if cached is not None:
+        return cached.copy()
+
+    logger.debug(
+        "🔍 Encoding query (length=%s chars, normalize=%s)", len(query), normalize
+    )
+    batcher = _get_batcher()
+    if batcher is not None:
+        # concurrent callers share one encode() call; copy so normalize_L2
+        # does not touch a view into another caller's batch
+        emb = np.array(batcher.encode(query), dtype="float32")
+    else:
+        emb = encode_texts([query])
     if normalize:
         faiss.normalize_L2(emb)
-    print(f"✓ Query encoded to embedding shape: {emb.shape}")
+    embedding_cache.set(cache_key, emb.copy())
+    logger.debug("✓ Query encoded to embedding shape: %s", emb.shape)
     return emb
 
 
-def retrieve_hits(query: str, top_k: int = 8) -> List[Dict]:
+def encode_queries(queries: List[str], normalize: bool = True) -> np.ndarray:
+    """Embeddings of many queries, computing the uncached ones in one model call."""
+    if len(queries) == 1:
+        return encode_query(queries[0], normalize)
+    if embed_model is None:
+        logger.debug("🔄 Embedding model not loaded, initializing...")
+        initialize()
+    if embed_model is None:
+        raise RuntimeError("Embedding model not available")
+
+    keys = [(normalize_query(q), normalize) for q in queries]
+    rows: List[Optional[np.ndarray]] = [embedding_cache.get(k) for k in keys]
+    missing = list({k: i for i, k in enumerate(keys) if rows[i] is None}.items())
+    if missing:
+        logger.debug("🔍 Encoding %s queries in one batch", len(missing))
+        emb = np.array(encode_texts([queries[i] for _, i in missing]), dtype="float32")
+        if normalize:
+            faiss.normalize_L2(emb)
+        fresh = {k: emb[j : j + 1] for j, (k, _) in enumerate(missing)}
+        for k, row in fresh.items():
+            embedding_cache.set(k, row.copy())
+        rows = [row if row is not None else fresh[k] for row, k in zip(rows, keys)]
+    return np.vstack(cast(List[np.ndarray], rows))
+
+
+def retrieve_hits(
+    query: str,
+    top_k: int = 8,
+    nprobe: Optional[int] = None,
+    ef_search: Optional[int] = None,
+    hybrid: Optional[bool] = None,
+    filters: Optional[RetrievalFilter] = None,
+) -> List[Dict]:
+    """Top_k search over the corpus.
+
+    nprobe / ef_search override the index manifest defaults for IVF / HNSW
+    indexes and are ignored for flat indexes. With hybrid retrieval (default
+    when a BM25 index is loaded) the dense and BM25 rankings are fused with
+    reciprocal rank fusion; every hit keeps its dense cosine "score" so the
+    caller's score_threshold still means the same thing.
+
+    filters restricts both rankings to matching sections inside the search
+    (a faiss IDSelector), so all top_k hits come from the requested act/years.
+    """
+    return retrieve_hits_batch([query], top_k, nprobe, ef_search, hybrid, filters)[0]
+
+
+def retrieve_hits_batch(
+    queries: List[str],
+    top_k: int = 8,
+    nprobe: Optional[int] = None,
+    ef_search: Optional[int] = None,
+    hybrid: Optional[bool] = None,
+    filters: Optional[RetrievalFilter] = None,
+) -> List[List[Dict]]:
+    """retrieve_hits for many queries: one embedding call and one FAISS search
+    over the matrix of the queries that are not cached yet."""
     # ensure resources are initialized
-    if index is None or not docs:
-        print("🔄 Index or docs not loaded, initializing...")
+    if snapshot is None or not snapshot.ready:
+        logger.debug("🔄 Index or docs not loaded, initializing...")
         initialize()
-    if index is None or not docs:
+    # read the snapshot once; a concurrent reload must not change it under us
+    snap = snapshot
+    if snap is None or not snap.ready:
         # No index/docs available yet
-        print("⚠️  No FAISS index or docs available for retrieval")
-        return []
+        logger.warning("⚠️  No FAISS index or docs available for retrieval")
+        return [[] for _ in queries]
+    index, tombstones = snap.index, snap.tombstones
+
+    defaults = snap.manifest.get("search_defaults", {})
+    nprobe = nprobe or defaults.get("nprobe")
+    ef_search = ef_search or defaults.get("ef_search")
+
+    if hybrid is None:
+        hybrid = HYBRID_RETRIEVAL
+    hybrid = hybrid and snap.bm25 is not None
+
+    flt = filters if filters is not None and filters.active else None
+    keys = [
+        (normalize_query(q), top_k, snap.version, nprobe, ef_search, hybrid, flt)
+        for q in queries
+    ]
+    results: List[Optional[List[Dict]]] = []
+    for query, key in zip(queries, keys):
+        cached = retrieval_cache.get(key)
+        if cached is not None:
+            logger.debug("✓ Retrieval cache hit for query: %s", query[:100])
+            results.append([dict(h) for h in cached])
+        else:
+            results.append(None)
+    todo = [i for i, r in enumerate(results) if r is None]
+    if not todo:
+        return cast(List[List[Dict]], results)
+
+    mask = None
+    if flt is not None and snap.columns is not None:
+        with span("metadata_filter"):
+            mask = snap.columns.mask(flt)
+        if tombstones:
+            mask[list(tombstones)] = False
+        if not mask.any():
+            logger.info("⚠️  No sections match filter %s", flt)
+            for i in todo:
+                retrieval_cache.set(keys[i], [])
+            return [r if r is not None else [] for r in results]
+
+    logger.debug("🔍 Retrieving top_k=%s hits for %s queries", top_k, len(todo))
+    with span("embed"):
+        q = encode_queries([queries[i] for i in todo])
+    # over-fetch a little when some ids may come back tombstoned, and give
+    # fusion a deeper candidate list to work with
+    fetch_k = top_k + min(len(tombstones), top_k)
+    if hybrid:
+        fetch_k *= 2
+
+    with span("search"):
+        dense = None
+        if mask is not None and int(mask.sum()) <= FILTER_EXACT_MAX:
+            dense = _subset_search(index, q, np.flatnonzero(mask), fetch_k)
+        if dense is None:
+            sel, _sel_buf = id_selector(mask) if mask is not None else (None, None)
+            params = search_params(index, nprobe=nprobe, ef_search=ef_search, sel=sel)
+            if params is not None:
+                D, I = cast(Any, index).search(q, fetch_k, params=params)
+            else:
+                D, I = cast(Any, index).search(q, fetch_k)
+            dense = [
+                [
+                    (idx, float(score))
+                    for score, idx in zip(D[row].tolist(), I[row].tolist())
+                    if idx >= 0 and idx not in tombstones
+                ]
+                for row in range(len(todo))
+            ]
+
+    for row, i in enumerate(todo):
+        hits = _collect_hits(
+            snap, queries[i], q[row : row + 1], dense[row], top_k, fetch_k, hybrid, mask
+        )
+        retrieval_cache.set(keys[i], [dict(h) for h in hits])
+        if logger.isEnabledFor(logging.DEBUG):
+            scores_str = [f"{h['score']:.4f}" for h in hits[:5]]
+            logger.debug("✓ Retrieved %s hits with scores: %s", len(hits), scores_str)
+        results[i] = hits
+    return cast(List[List[Dict]], results)
+
+
+def _collect_hits(
+    snap: RetrievalSnapshot,
+    query: str,
+    q: np.ndarray,
+    dense: List[tuple],
+    top_k: int,
+    fetch_k: int,
+    hybrid: bool,
+    mask: Optional[np.ndarray],
+) -> List[Dict]:
+    """Fuse one query's dense ranking with BM25 and turn the top_k into hits."""
+    index, docs, tombstones = snap.index, snap.docs, snap.tombstones
+    dense_scores = dict(dense)
+    if hybrid:
+        with span("lexical"):
+            lexical = [
+                row
+                for row, _ in cast(BM25Index, snap.bm25).search(
+                    query, fetch_k, mask=mask
+                )
+                if row not in tombstones
+            ]
+            fused = reciprocal_rank_fusion([[i for i, _ in dense], lexical], k=RRF_K)
+            candidates = [i for i, _ in fused]
+            missing = [i for i in candidates[:top_k] if i not in dense_scores]
+            dense_scores.update(_dense_scores(index, q, missing))
+        lexical_set = set(lexical)
+    else:
+        candidates = [i for i, _ in dense]
+        lexical_set = set()
 
-    print(f"🔍 Retrieving top_k={top_k} hits for query: {query[:100]}")
-    q = encode_query(query)
-    D, I = cast(Any, index).search(q, top_k)
     hits = []
-    for score, idx in zip(D[0].tolist(), I[0].tolist()):
-        if idx < 0 or idx >= len(docs):
-            print(f"⚠️  Skipping invalid index: {idx}")
+    for idx in candidates:
+        if idx >= len(docs):
+            logger.warning("⚠️  Skipping invalid index: %s", idx)
             continue
-        # assume index ordering matches JSONL ordering used when index was built
+        # index ids are doc rows (JSONL order, or stable doc-store row ids)
         meta_obj = docs[idx]
-        hits.append({"score": float(score), "doc_index": idx, "doc": meta_obj})
-
-    scores_str = [f"{h['score']:.4f}" for h in hits[:5]]
-    print(f"✓ Retrieved {len(hits)} hits with scores: {scores_str}")
+        hit = {
+            "score": dense_scores[idx],
+            "doc_index": idx,
+            "doc": meta_obj,
+            # precomputed columns, so prompt/source formatting never re-parses docs
+            "meta": (
+                snap.columns.meta(idx)
+                if snap.columns is not None
+                else extract_meta(meta_obj)
+            ),
+        }
+        if snap.columns is not None and snap.columns.n_tokens is not None:
+            hit["n_tokens"] = snap.columns.tokens(idx)
+        if hybrid:
+            hit["lexical_match"] = idx in lexical_set
+        hits.append(hit)
+        if len(hits) >= top_k:
+            break
     return hits
 
 
-def build_sources_block(hits: List[Dict], max_chars: int = 2000) -> str:
-    blocks = []
-    for i, h in enumerate(hits):
-        doc = h["doc"]
-        # prefer structured meta inside 'meta' if present
-        meta = doc.get("meta") if isinstance(doc.get("meta"), dict) else doc
-        law_title = (meta.get("law_title") or meta.get("Law Title") or "").strip()
-        section_name = (
-            meta.get("section_name") or meta.get("Section Name") or ""
-        ).strip()
-        section_id = meta.get("section_id") or meta.get("Section ID") or ""
-        law_date = (
-            meta.get("law_pass_date") or meta.get("law_pass_date") or ""
-        ).strip()
-        text = doc.get("text") or doc.get("_text_for_embed") or ""
-        # fallback: combine header + clean_section_description
-        if not text:
-            header_parts = []
-            if law_title:
-                header_parts.append(f"Law Title: {law_title}")
-            if law_date:
-                header_parts.append(f"Law Date: {law_date}")
-            if section_id:
-                header_parts.append(f"Section ID: {section_id}")
-            if section_name:
-                header_parts.append(f"Section Name: {section_name}")
-            header = "\n".join(header_parts)
-            text = header + "\n\n" + (meta.get("clean_section_description") or "")
-        # truncate to limit prompt size
-        if len(text) > max_chars:
-            text = text[:max_chars] + "..."
-        header_label = f"title: {law_title}" if law_title else ""
-        header_label += f" | id: {section_id}" if section_id else ""
-        header_label += f" | date: {law_date}" if law_date else ""
-        label = header_label or f"doc_index: {h['doc_index']}"
-        blocks.append(f"[SOURCE {i}] {label}\n\n{text}")
-    return "\n\n".join(blocks)
+def _get_reranker() -> Optional[CrossEncoderReranker]:
+    global reranker, _reranker_failed
+    if reranker is None and not _reranker_failed:
+        with _reranker_lock:
+            if reranker is None and not _reranker_failed:
+                try:
+                    reranker = CrossEncoderReranker(RERANK_MODEL)
+                    logger.info("✓ Loaded rerank model: %s", RERANK_MODEL)
+                except Exception as e:
+                    # don't retry the download on every request
+                    logger.error(
+                        "❌ Failed to load rerank model %s: %s", RERANK_MODEL, e
+                    )
+                    _reranker_failed = True
+    return reranker
 
 
-def is_general_question(question: str) -> bool:
-    """Check if the question is a general greeting or basic query that doesn't require legal sources."""
-    question_lower = question.lower().strip()
-
-    # Greetings and basic interaction
-    greetings = ["hi", "hello", "hey", "good morning", "good afternoon", "good evening"]
-    if any(
-        question_lower == greeting or question_lower.startswith(greeting + " ")
-        for greeting in greetings
-    ):
-        return True
-
-    # Identity questions
-    identity_patterns = [
-        "who are you",
-        "what are you",
-        "what is your name",
-        "introduce yourself",
-        "what can you do",
-        "what do you do",
-        "how can you help",
-        "can you help",
-        "what is this",
-        "what is legalbot",
-        "tell me about yourself",
-    ]
-    if any(pattern in question_lower for pattern in identity_patterns):
-        return True
+def _ms_since(t0: float) -> float:
+    return round((time.perf_counter() - t0) * 1000, 2)
 
-    return False
 
+def rerank_hits(
+    question: str,
+    hits: List[Dict],
+    top_n: int,
+    budget_ms: Optional[float] = None,
+) -> List[Dict]:
+    """Cross-encoder rerank of hits trimmed to top_n.
+
+    Falls back to the retrieval order when the model is unavailable or the
+    rerank would not fit into budget_ms.
+    """
+    model = _get_reranker()
+    reranked = None
+    if model is not None and hits:
+        passages = [doc_embed_text(h["doc"])[:RERANK_PASSAGE_CHARS] for h in hits]
+        with span("rerank"):
+            reranked = rerank(model, question, hits, passages, top_n, budget_ms)
+        if reranked is None:
+            logger.debug(
+                "⏱️  Skipping rerank of %s hits, over %.0fms budget",
+                len(hits),
+                budget_ms,
+            )
+    annotate("reranked", reranked is not None)
+    return reranked if reranked is not None else hits[:top_n]
+
+
+def select_hits(
+    question: str,
+    top_k: int,
+    score_threshold: float,
+    filters: Optional[RetrievalFilter] = None,
+    use_rerank: Optional[bool] = None,
+    budget_ms: Optional[float] = None,
+) -> List[Dict]:
+    """Retrieve, drop hits under score_threshold and optionally rerank to top_k."""
+    return select_hits_batch(
+        [question], top_k, score_threshold, filters, use_rerank, budget_ms
+    )[0]
+
+
+def select_hits_batch(
+    questions: List[str],
+    top_k: int,
+    score_threshold: float,
+    filters: Optional[RetrievalFilter] = None,
+    use_rerank: Optional[bool] = None,
+    budget_ms: Optional[float] = None,
+) -> List[List[Dict]]:
+    """select_hits for many questions, retrieved in one batch.
+
+    The rerank budget of each question is budget_ms minus its share of the
+    batch's retrieval time.
+    """
+    if use_rerank is None:
+        use_rerank = RERANK_ENABLED
+    if budget_ms is None:
+        budget_ms = RERANK_BUDGET_MS
+    t0 = time.perf_counter()
+    fetch_k = max(top_k, RERANK_CANDIDATES) if use_rerank else top_k
+    with span("retrieve"):
+        batch = retrieve_hits_batch(questions, top_k=fetch_k, filters=filters)
+    retrieve_ms = _ms_since(t0) / max(1, len(questions))
+
+    selected = []
+    for question, hits in zip(questions, batch):
+        logger.debug("📊 Retrieved %s raw hits before threshold filtering", len(hits))
+        if hits and logger.isEnabledFor(logging.DEBUG):
+            top3_scores = [(h["doc_index"], f"{h['score']:.4f}") for h in hits[:3]]
+            logger.debug("🎯 Top 3 hit scores BEFORE filtering: %s", top3_scores)
+
+        # filter by threshold
+        hits_before_filter = len(hits)
+        with span("threshold"):
+            hits = [h for h in hits if h["score"] >= score_threshold]
+        logger.debug(
+            "🔍 After threshold %.4f filter: %s/%s hits remain",
+            score_threshold,
+            len(hits),
+            hits_before_filter,
+        )
+        if use_rerank:
+            hits = rerank_hits(question, hits, top_k, budget_ms=budget_ms - retrieve_ms)
+        selected.append(hits[:top_k])
+    return selected
 
-def ask_groq_general(
-    question: str, context: Optional[str] = None, model: str = GROQ_MODEL
-):
-    """Answer general questions without legal sources, but maintain legal assistant context."""
-    system = (
-        "You are LegalBot, an AI legal assistant specializing in Bangladesh law. "
-        "You help users understand legal concepts, laws, and their rights under Bangladesh legal system. "
-        "For general questions and greetings, respond in a friendly and professional manner. "
-        "Keep responses concise (2-3 sentences for greetings, 4-5 for capability questions). "
-        "Always remind users that for specific legal advice, they should consult sources or a qualified lawyer."
+
+def rerank_stats() -> Optional[Dict[str, Any]]:
+    return reranker.stats() if reranker is not None else None
+
+
+def llm_stats() -> Optional[Dict[str, Any]]:
+    return llm.stats() if llm is not None else None
+
+
+def inference_key(
+    question: str,
+    context: Optional[str] = None,
+    top_k: int = 6,
+    score_threshold: float = 0.15,
+    **options: Any,
+) -> Tuple:
+    """Requests with equal keys get the same run_inference result.
+
+    options are the remaining run_inference arguments (filters, strategy, ...),
+    which must be hashable.
+    """
+    context_hash = (
+        hashlib.sha1(context.strip().encode()).hexdigest()
+        if context and context.strip()
+        else None
+    )
+    return (
+        normalize_query(question),
+        context_hash,
+        top_k,
+        score_threshold,
+        tuple(sorted(options.items())),
     )
 
-    user_prompt = f"Question: {question}"
-    if context and context.strip():
-        user_prompt = f"Context: {context}\n\n{user_prompt}"
 
-    if client is None:
-        return "Hello! I'm LegalBot, your AI legal assistant. I'm currently unavailable due to configuration issues."
+def flight_stats() -> Dict[str, Any]:
+    return {"enabled": SINGLE_FLIGHT, **inference_flights.stats()}
 
-    try:
-        resp = client.chat.completions.create(
-            messages=[
-                {"role": "system", "content": system},
-                {"role": "user", "content": user_prompt},
-            ],
-            model=model,
-            temperature=0.7,  # Slightly higher for natural conversation
-        )
-        answer = (
-            getattr(resp.choices[0].message, "content", None)
-            or "I'm here to help with legal questions!"
-        )
-        print(f"✓ General response generated: {answer[:100]}...")
-        return answer
-    except Exception as e:
-        print(f"❌ Groq API call failed for general question: {e}")
-        return "Hello! I'm LegalBot, your AI legal assistant for Bangladesh law. How can I help you today?"
 
+def cache_stats() -> dict:
+    return {
+        "snapshot_version": snapshot.version if snapshot is not None else 0,
+        "embedding": embedding_cache.stats(),
+        "retrieval": retrieval_cache.stats(),
+        "answer": answer_cache.stats(),
+    }
 
-def ask_groq_fallback(
-    question: str, context: Optional[str] = None, model: str = GROQ_MODEL
-):
-    """Fallback to general legal knowledge when no sources found, focused on Bangladesh law."""
-    print(f"🔄 Using fallback (general knowledge) for question: {question[:100]}...")
-
-    system = (
-        "You are LegalBot, an AI legal assistant specializing in Bangladesh law. "
-        "The user asked a legal question, but no specific law sources were found in the database. "
-        "Provide a helpful response using your general knowledge of Bangladesh legal system and common legal principles. "
-        "IMPORTANT: Start with '⚠️ **Using general knowledge** (specific law sources not found)' "
-        "Focus on Bangladesh law context when applicable. "
-        "If you know relevant legal principles or common practices in Bangladesh, share them. "
-        "Keep responses informative but always suggest consulting a qualified lawyer for specific legal advice. "
-        "Format in markdown. Be concise but helpful (4-8 sentences)."
+
+def pack_prompt_sources(
+    hits: List[Dict], max_tokens: Optional[int] = None
+) -> Tuple[str, List[Dict]]:
+    """Numbered sources for the prompt, packed into max_tokens tokens, and the
+    hits they quote: [SOURCE i] is the i-th of those hits, so they are the
+    hits to return alongside the answer."""
+    with span("prompt"):
+        packed = pack_sources(
+            hits, max_tokens or CONTEXT_TOKEN_BUDGET, min_tokens=CONTEXT_MIN_TOKENS
+        )
+    block = "\n\n".join(
+        f"[SOURCE {i}] {p.label}\n\n{p.text}" for i, p in enumerate(packed)
     )
+    return block, [p.hit for p in packed]
 
-    user_prompt = f"Question: {question}\n\n" "Please provide a helpful response."
 
+def build_sources_block(hits: List[Dict], max_tokens: Optional[int] = None) -> str:
+    """Numbered sources for the prompt, packed into max_tokens tokens."""
+    return pack_prompt_sources(hits, max_tokens)[0]
+
+
+def classify_questions(questions: List[str]) -> List[Tuple[str, Optional[str]]]:
+    """(intent, canned reply key) per question: greeting, capability or legal.
+
+    Phrase patterns and legal hint words settle most questions in
+    microseconds. The rest are compared with the router's intent centroids
+    using their query embeddings (one batched encode; the embedding cache
+    hands the same vectors to retrieval right after).
+    """
+    with span("classify"):
+        routed = [intent_router.match(q) for q in questions]
+    pending = [i for i, (intent, _) in enumerate(routed) if intent is None]
+    if not pending:
+        return routed
+    if not INTENT_CENTROIDS or embed_model is None:
+        return [(LEGAL, None) if r[0] is None else r for r in routed]
+    if not intent_router.fitted:
+        intent_router.fit(encode_texts)
+    with span("embed"):
+        embs = encode_queries([questions[i] for i in pending])
+    with span("classify"):
+        for i, emb in zip(pending, embs):
+            routed[i] = intent_router.nearest(emb)
+    return routed
+
+
+def classify_question(question: str) -> Tuple[str, Optional[str]]:
+    return classify_questions([question])[0]
+
+
+def is_general_question(question: str) -> bool:
+    """Check if the question is a general greeting or basic query that doesn't require legal sources.
+
+    Phrase patterns only; the pipeline itself uses classify_question.
+    """
+    return intent_router.match(question)[0] in (GREETING, CAPABILITY)
+
+
+def canned_reply(key: Optional[str]) -> Dict[str, Any]:
+    """Precomputed greeting reply: no retrieval, no LLM call."""
+    count("canned_greeting")
+    return {
+        "answer": CANNED_REPLIES.get(key or "hello", CANNED_REPLIES["hello"]),
+        "hits": [],
+        "type": "general",
+        "canned": True,
+    }
+
+
+GENERAL_SYSTEM_PROMPT = (
+    "You are LegalBot, an AI legal assistant specializing in Bangladesh law. "
+    "You help users understand legal concepts, laws, and their rights under Bangladesh legal system. "
+    "For general questions and greetings, respond in a friendly and professional manner. "
+    "Keep responses concise (2-3 sentences for greetings, 4-5 for capability questions). "
+    "Always remind users that for specific legal advice, they should consult sources or a qualified lawyer."
+)
+
+FALLBACK_SYSTEM_PROMPT = (
+    "You are LegalBot, an AI legal assistant specializing in Bangladesh law. "
+    "The user asked a legal question, but no specific law sources were found in the database. "
+    "Provide a helpful response using your general knowledge of Bangladesh legal system and common legal principles. "
+    "IMPORTANT: Start with '⚠️ **Using general knowledge** (specific law sources not found)' "
+    "Focus on Bangladesh law context when applicable. "
+    "If you know relevant legal principles or common practices in Bangladesh, share them. "
+    "Keep responses informative but always suggest consulting a qualified lawyer for specific legal advice. "
+    "Format in markdown. Be concise but helpful (4-8 sentences)."
+)
+
+RAG_SYSTEM_PROMPT = (
+    "You are an assistant that MUST answer questions using ONLY the provided SOURCES. "
+    "If the answer is not explicit, but can be deduced using legal reasoning based on the principles in the sources, then do so. But mention that you are using reasoning. "
+    "Do NOT hallucinate or invent facts. If the answer is not contained in the sources, reply exactly: I do not know.\n"
+    "When you provide facts, cite the source label(s) you used in brackets e.g. [SOURCE 1]. Start source labels at [SOURCE 1]. "
+    "Include source metadata (law title, section name, section id, passing date) when referencing a source."
+)
+
+SINGLE_CALL_SYSTEM_PROMPT = (
+    "You are LegalBot, a legal assistant specializing in Bangladesh law. "
+    "Answer using the provided SOURCES whenever they contain the answer or it can be deduced from them using legal reasoning (say so when you reason). "
+    "Cite the source label(s) you used in brackets e.g. [SOURCE 1] and include source metadata (law title, section name, section id, passing date). "
+    "Only if the SOURCES do not contain the answer, answer from your general knowledge of Bangladesh law, without citing sources, and recommend consulting a qualified lawyer for specific cases. "
+    "Do NOT hallucinate or invent facts.\n"
+    "The FIRST line of your reply must be exactly `BASIS: SOURCES` or `BASIS: GENERAL`, "
+    "saying which of the two you used, followed by the answer in markdown format."
+)
+# the flag token plus the markdown models wrap around it, e.g. **BASIS: SOURCES**;
+# whatever follows on the same line is already answer text
+_BASIS_RE = re.compile(
+    r"^[\s*_`#]*BASIS:[\s*_`]*(SOURCES?|GENERAL)\b[*_`.:]*[ \t]*", re.IGNORECASE
+)
+
+SUMMARY_SYSTEM_PROMPT = (
+    "You maintain a running summary of a conversation between a user and LegalBot, "
+    "a legal assistant for Bangladesh law. Merge the new turns into the current summary. "
+    "Keep the facts the user gave about their situation, the questions they asked and "
+    "the laws and sections the answers relied on; drop greetings and repetition. "
+    "Reply with the updated summary only, at most 150 words."
+)
+
+GENERAL_TEMPERATURE = 0.7  # Slightly higher for natural conversation
+FALLBACK_TEMPERATURE = 0.7  # Slightly more creative for general knowledge
+
+
+def build_general_messages(question: str, context: Optional[str] = None) -> List[Dict]:
+    user_prompt = f"Question: {question}"
     if context and context.strip():
         user_prompt = f"Context: {context}\n\n{user_prompt}"
+    return [
+        {"role": "system", "content": GENERAL_SYSTEM_PROMPT},
+        {"role": "user", "content": user_prompt},
+    ]
 
-    if client is None:
-        return "I do not know"
-
-    try:
-        resp = client.chat.completions.create(
-            messages=[
-                {"role": "system", "content": system},
-                {"role": "user", "content": user_prompt},
-            ],
-            model=model,
-            temperature=0.7,  # Slightly more creative for general knowledge
-        )
-        answer = getattr(resp.choices[0].message, "content", None) or "I do not know"
-        print(
-            f"✓ Fallback response generated (using general knowledge): {answer[:100]}..."
-        )
-        return answer
-    except Exception as e:
-        print(f"❌ Groq API call failed for fallback: {e}")
-        return "I do not know"
 
+def build_fallback_messages(question: str, context: Optional[str] = None) -> List[Dict]:
+    user_prompt = f"Question: {question}\n\n" "Please provide a helpful response."
+    if context and context.strip():
+        user_prompt = f"Context: {context}\n\n{user_prompt}"
+    return [
+        {"role": "system", "content": FALLBACK_SYSTEM_PROMPT},
+        {"role": "user", "content": user_prompt},
+    ]
 
-def ask_groq(
-    question: str, sources: str, context: Optional[str] = None, model: str = GROQ_MODEL
-):
-    system = (
-        "You are an assistant that MUST answer questions using ONLY the provided SOURCES. "
-        "If the answer is not explicit, but can be deduced using legal reasoning based on the principles in the sources, then do so. But mention that you are using reasoning. "
-        "Do NOT hallucinate or invent facts. If the answer is not contained in the sources, reply exactly: I do not know.\n"
-        "When you provide facts, cite the source label(s) you used in brackets e.g. [SOURCE 1]. Start source labels at [SOURCE 1]. "
-        "Include source metadata (law title, section name, section id, passing date) when referencing a source."
-    )
 
+def build_rag_messages(
+    question: str, sources: str, context: Optional[str] = None
+) -> List[Dict]:
     # Build user prompt with optional context
     if context and context.strip():
         user_prompt = (
@@ -316,98 +1223,598 @@ def ask_groq(
             "If sources disagree, summarize the disagreement and cite the conflicting sources. "
             "Provide the response in markdown format."
         )
+    return [
+        {"role": "system", "content": RAG_SYSTEM_PROMPT},
+        {"role": "user", "content": user_prompt},
+    ]
+
+
+def build_single_call_messages(
+    question: str, sources: str, context: Optional[str] = None
+) -> List[Dict]:
+    user_prompt = f"QUESTION:\n{question}\n\nSOURCES:\n{sources}"
+    if context and context.strip():
+        user_prompt = (
+            f"CONVERSATION CONTEXT (for reference, not a source of facts):\n"
+            f"{context}\n\n{user_prompt}"
+        )
+    return [
+        {"role": "system", "content": SINGLE_CALL_SYSTEM_PROMPT},
+        {"role": "user", "content": user_prompt},
+    ]
+
+
+def _split_basis(text: str) -> Tuple[str, str]:
+    m = _BASIS_RE.match(text)
+    if m:
+        basis = m.group(1).upper()
+        return ("fallback" if basis == "GENERAL" else "sourced"), text[m.end() :]
+    return ("fallback" if is_unknown_answer(text) else "sourced"), text
+
+
+def parse_basis(text: str) -> Tuple[str, str]:
+    """Split a single-call reply into (answer type, answer without the BASIS flag).
+
+    Only the flag token is removed, so an answer that starts on the same line
+    survives. A reply without the flag is treated as sourced, unless it is
+    the RAG prompt's "I do not know".
+    """
+    answer_type, answer = _split_basis(text)
+    return answer_type, answer.strip()
+
+
+class BasisStreamParser:
+    """Hold back streamed tokens until the leading BASIS line has been seen."""
+
+    def __init__(self, max_header_chars: int = 64):
+        self.max_header_chars = max_header_chars
+        self.answer_type: Optional[str] = None
+        self._buf = ""
+
+    def feed(self, token: str) -> str:
+        """Return the text that can be forwarded to the client now."""
+        if self.answer_type is not None:
+            return token
+        self._buf += token
+        # a leading blank line is not the end of the BASIS line
+        if "\n" not in self._buf.lstrip() and len(self._buf) < self.max_header_chars:
+            return ""
+        return self.flush()
+
+    def flush(self) -> str:
+        if self.answer_type is not None:
+            return ""
+        # keep trailing whitespace, the next token continues the same text
+        self.answer_type, rest = _split_basis(self._buf)
+        self._buf = ""
+        return rest.lstrip()
+
+
+def ask_groq_single(
+    question: str, sources: str, context: Optional[str] = None, model: str = GROQ_MODEL
+) -> Tuple[str, str]:
+    """One round-trip answer: (answer type, answer)."""
+    if llm is None:
+        logger.warning("⚠️  Groq client not configured (groq_api_key missing)")
+        return "fallback", "I do not know"
+    with span("llm_single"):
+        answer = llm.complete(
+            build_single_call_messages(question, sources, context), model=model
+        )
+    answer_type, answer = parse_basis(answer or "")
+    logger.debug("✓ Single-call answer (%s), length=%s chars", answer_type, len(answer))
+    return answer_type, answer or "I do not know"
+
+
+def summarize_turns(summary: str, turns: List[Turn], model: str = GROQ_MODEL) -> str:
+    """Fold turns into the running conversation summary."""
+    if llm is None:
+        raise LLMUnavailable("Groq client not configured")
+    messages = [
+        {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
+        {
+            "role": "user",
+            "content": f"CURRENT SUMMARY:\n{summary or '(none)'}\n\n"
+            f"NEW TURNS:\n{format_turns(turns)}",
+        },
+    ]
+    with span("llm_summary"):
+        return llm.complete(messages, model=model, temperature=0.2).strip()
+
+
+sessions = ConversationStore(
+    summarize_turns,
+    recent_turns=SESSION_RECENT_TURNS,
+    context_tokens=SESSION_CONTEXT_TOKENS,
+    max_sessions=SESSION_MAX,
+    ttl=SESSION_TTL,
+    max_turns=SESSION_MAX_TURNS,
+)
+
+
+def ask_groq_general(
+    question: str, context: Optional[str] = None, model: str = GROQ_MODEL
+):
+    """Answer general questions without legal sources, but maintain legal assistant context."""
+    if llm is None:
+        return "Hello! I'm LegalBot, your AI legal assistant. I'm currently unavailable due to configuration issues."
+
+    try:
+        with span("llm_general"):
+            answer = (
+                llm.complete(
+                    build_general_messages(question, context),
+                    model=model,
+                    temperature=GENERAL_TEMPERATURE,
+                )
+                or "I'm here to help with legal questions!"
+            )
+        logger.debug("✓ General response generated: %s...", answer[:100])
+        return answer
+    except Exception as e:
+        logger.error("❌ Groq API call failed for general question: %s", e)
+        return "Hello! I'm LegalBot, your AI legal assistant for Bangladesh law. How can I help you today?"
+
+
+def ask_groq_fallback(
+    question: str, context: Optional[str] = None, model: str = GROQ_MODEL
+):
+    """Fallback to general legal knowledge when no sources found, focused on Bangladesh law."""
+    logger.debug(
+        "🔄 Using fallback (general knowledge) for question: %s...", question[:100]
+    )
+
+    if llm is None:
+        return "I do not know"
+
+    try:
+        with span("llm_fallback"):
+            answer = (
+                llm.complete(
+                    build_fallback_messages(question, context),
+                    model=model,
+                    temperature=FALLBACK_TEMPERATURE,
+                )
+                or "I do not know"
+            )
+        logger.debug(
+            "✓ Fallback response generated (using general knowledge): %s...",
+            answer[:100],
+        )
+        return answer
+    except LLMUnavailable:
+        raise
+    except Exception as e:
+        logger.error("❌ Groq API call failed for fallback: %s", e)
+        return "I do not know"
+
+
+def ask_groq(
+    question: str, sources: str, context: Optional[str] = None, model: str = GROQ_MODEL
+):
     # guard if Groq client not configured
-    if client is None:
-        print("⚠️  Groq client not configured (groq_api_key missing)")
+    if llm is None:
+        logger.warning("⚠️  Groq client not configured (groq_api_key missing)")
         return "I do not know"
 
-    print(
-        f"🤖 Calling Groq API with model={model}, sources length={len(sources)} chars"
+    logger.debug(
+        "🤖 Calling Groq API with model=%s, sources length=%s chars",
+        model,
+        len(sources),
     )
-    print(f"📄 Sources preview: {sources[:500]}...")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("📄 Sources preview: %s...", sources[:500])
 
     try:
-        resp = client.chat.completions.create(
-            messages=[
-                {"role": "system", "content": system},
-                {"role": "user", "content": user_prompt},
-            ],
-            model=model,
+        with span("llm_rag"):
+            answer = (
+                llm.complete(
+                    build_rag_messages(question, sources, context), model=model
+                )
+                or "I do not know"
+            )
+        logger.debug(
+            "✓ Groq API response received, answer length=%s chars", len(answer)
         )
-        answer = getattr(resp.choices[0].message, "content", None) or "I do not know"
-        print(f"✓ Groq API response received, answer length={len(answer)} chars")
-        print(f"💬 Answer preview: {answer[:200]}...")
+        logger.debug("💬 Answer preview: %s...", answer[:200])
         return answer
+    except LLMUnavailable:
+        raise
     except Exception as e:
-        print(f"❌ Groq API call failed: {e}")
+        logger.error("❌ Groq API call failed: %s", e)
         return "I do not know"
 
 
+async def astream_groq(
+    messages: List[Dict],
+    model: str = GROQ_MODEL,
+    temperature: Optional[float] = None,
+    failure_text: str = "I do not know",
+) -> AsyncIterator[str]:
+    """Stream completion tokens through the LLM gateway.
+
+    Yields failure_text once if the client is not configured, and
+    DEGRADED_ANSWER if the gateway gives up before any token was produced
+    (so callers do not follow up with a fallback call).
+    """
+    if llm is None:
+        logger.warning("⚠️  Groq client not configured (groq_api_key missing)")
+        yield failure_text
+        return
+
+    produced = False
+    t0 = time.perf_counter()
+    try:
+        async for delta in llm.astream(messages, model=model, temperature=temperature):
+            if not produced:
+                observe("llm_stream_first_token", time.perf_counter() - t0)
+            produced = True
+            yield delta
+    except LLMUnavailable as e:
+        logger.error("❌ Groq streaming call failed: %s", e)
+        if not produced:
+            yield DEGRADED_ANSWER
+    finally:
+        observe("llm_stream", time.perf_counter() - t0)
+
+
+def is_unknown_answer(answer: str) -> bool:
+    """True when the RAG answer is the model's 'I do not know' refusal."""
+    answer_lower = answer.strip().lower()
+    return (
+        "i do not know" in answer_lower
+        or "i don't know" in answer_lower
+        or answer_lower == "i do not know."
+        or answer_lower == "i don't know."
+    )
+
+
+def prepare_inference(
+    question: str,
+    context: Optional[str] = None,
+    top_k: int = 6,
+    score_threshold: float = 0.15,
+    filters: Optional[RetrievalFilter] = None,
+    rerank: Optional[bool] = None,
+    rerank_budget_ms: Optional[float] = None,
+    strategy: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Run every step of run_inference that precedes the LLM call.
+
+    Returns the answer type ("general", "fallback" or "sourced"), the filtered
+    hits, the chat messages to send and per-stage timings, so callers can
+    stream the completion. With the single_call strategy the type of a
+    "sourced" result is only known once the reply's BASIS line has been
+    parsed (see BasisStreamParser).
+    """
+    # loads on first use; routes call this on the pool, so the check shares
+    # the inference task instead of queueing a task of its own
+    initialize()
+    with trace() as timings:
+        prepared = _prepare(
+            question,
+            context,
+            top_k,
+            score_threshold,
+            filters,
+            rerank,
+            rerank_budget_ms,
+            strategy,
+        )
+    return {**prepared, "timings": timings}
+
+
+def _prepare(
+    question: str,
+    context: Optional[str],
+    top_k: int,
+    score_threshold: float,
+    filters: Optional[RetrievalFilter],
+    rerank: Optional[bool],
+    rerank_budget_ms: Optional[float],
+    strategy: Optional[str],
+) -> Dict[str, Any]:
+    intent, canned = classify_question(question)
+    if intent == GREETING:
+        return {**canned_reply(canned), "messages": None, "temperature": None}
+    if intent == CAPABILITY:
+        return {
+            "type": "general",
+            "hits": [],
+            "messages": build_general_messages(question, context),
+            "temperature": GENERAL_TEMPERATURE,
+        }
+
+    hits = select_hits(
+        question,
+        top_k,
+        score_threshold,
+        filters=filters,
+        use_rerank=rerank,
+        budget_ms=rerank_budget_ms,
+    )
+    if not hits:
+        return {
+            "type": "fallback",
+            "hits": [],
+            "messages": build_fallback_messages(question, context),
+            "temperature": FALLBACK_TEMPERATURE,
+        }
+
+    sources, hits = pack_prompt_sources(hits)
+    strategy = strategy or ANSWER_STRATEGY
+    return {
+        "type": "sourced",
+        "hits": hits,
+        "messages": (
+            build_single_call_messages(question, sources, context)
+            if strategy == "single_call"
+            else build_rag_messages(question, sources, context)
+        ),
+        "temperature": None,
+        "strategy": strategy,
+    }
+
+
+def hit_metadata(hit: Dict) -> Dict[str, Any]:
+    """Small, JSON-friendly description of a hit (no full section text)."""
+    out = {
+        "score": hit["score"],
+        "doc_index": hit["doc_index"],
+        **(hit.get("meta") or extract_meta(hit["doc"])),
+    }
+    if "rerank_score" in hit:
+        out["rerank_score"] = hit["rerank_score"]
+    return out
+
+
 def run_inference(
     question: str,
     context: Optional[str] = None,
     top_k: int = 6,
     score_threshold: float = 0.15,
+    use_cache: bool = True,
+    filters: Optional[RetrievalFilter] = None,
+    rerank: Optional[bool] = None,
+    rerank_budget_ms: Optional[float] = None,
+    strategy: Optional[str] = None,
 ):
-    print("\n" + "=" * 80)
-    print(f"🚀 INFERENCE START - Question: {question}")
+    """Answer question; the result carries per-stage "timings" (milliseconds)."""
+    initialize()
+    with trace() as timings:
+        result = _run(
+            question,
+            context,
+            top_k,
+            score_threshold,
+            use_cache,
+            filters,
+            rerank,
+            rerank_budget_ms,
+            strategy,
+        )
+    return {**result, "timings": timings}
+
+
+def _run(
+    question: str,
+    context: Optional[str],
+    top_k: int,
+    score_threshold: float,
+    use_cache: bool,
+    filters: Optional[RetrievalFilter],
+    rerank: Optional[bool],
+    rerank_budget_ms: Optional[float],
+    strategy: Optional[str],
+) -> Dict[str, Any]:
+    logger.debug("🚀 INFERENCE START - Question: %s", question)
     if context:
-        print(f"📝 Context provided: {context[:200]}...")
-    print(f"⚙️  Parameters: top_k={top_k}, score_threshold={score_threshold:.4f}")
+        logger.debug("📝 Context provided: %s...", context[:200])
+    logger.debug(
+        "⚙️  Parameters: top_k=%s, score_threshold=%.4f", top_k, score_threshold
+    )
 
-    # Check if it's a general question (greeting, identity, etc.)
-    if is_general_question(question):
-        print("💬 Detected general question - responding without legal sources")
-        answer = ask_groq_general(question, context=context)
-        print("🏁 INFERENCE END (general response)")
-        print("=" * 80 + "\n")
-        return {"answer": answer, "hits": [], "type": "general"}
+    # Greetings get a canned reply, capability questions a general answer
+    intent, canned = classify_question(question)
+    if intent == GREETING:
+        logger.debug("👋 Greeting - canned reply, no LLM call")
+        return canned_reply(canned)
+    if intent == CAPABILITY:
+        return _answer_general(question, context)
 
     # Use ONLY the question for retrieval (not context)
-    hits = retrieve_hits(question, top_k=top_k)
-    print(f"📊 Retrieved {len(hits)} raw hits before threshold filtering")
-
-    if hits:
-        top3_scores = [(h["doc_index"], f"{h['score']:.4f}") for h in hits[:3]]
-        print(f"🎯 Top 3 hit scores BEFORE filtering: {top3_scores}")
-
-    # filter by threshold
-    hits_before_filter = len(hits)
-    hits = [h for h in hits if h["score"] >= score_threshold]
-    print(
-        f"🔍 After threshold {score_threshold:.4f} filter: {len(hits)}/{hits_before_filter} hits remain"
+    hits = select_hits(
+        question,
+        top_k,
+        score_threshold,
+        filters=filters,
+        use_rerank=rerank,
+        budget_ms=rerank_budget_ms,
     )
+    return _answer(question, context, hits, use_cache, strategy)
+
+
+def _answer_general(question: str, context: Optional[str]) -> Dict[str, Any]:
+    logger.debug("💬 Detected general question - responding without legal sources")
+    with span("llm"):
+        answer = ask_groq_general(question, context=context)
+    logger.debug("🏁 INFERENCE END (general response)")
+    return {"answer": answer, "hits": [], "type": "general"}
+
+
+def _answer(
+    question: str,
+    context: Optional[str],
+    hits: List[Dict],
+    use_cache: bool,
+    strategy: Optional[str],
+) -> Dict[str, Any]:
+    """Everything after retrieval: answer cache lookup, LLM call(s), cache store."""
+    # answers depend on the conversation, so only context-free questions are cached
+    cache_emb = None
+    if use_cache and not (context and context.strip()) and answer_cache.max_entries:
+        with span("answer_cache"):
+            cache_emb = encode_query(question)
+            cached = answer_cache.lookup(cache_emb, [h["doc_index"] for h in hits])
+        if cached is not None:
+            logger.debug("✓ Semantic answer cache hit - skipping Groq call")
+            logger.debug("🏁 INFERENCE END (cached)")
+            return {**cached, "cached": True}
+
+    # prompt build plus every LLM round-trip; each call also has its own span
+    with span("llm"):
+        result = _answer_from_hits(question, hits, context, strategy)
+    # never cache the canned failure answers returned when Groq is unavailable
+    if (
+        cache_emb is not None
+        and result["type"] != "degraded"
+        and result["answer"].strip() != "I do not know"
+    ):
+        answer_cache.store(cache_emb, [h["doc_index"] for h in hits], result)
+    return result
+
+
+def iter_inference_batch(
+    items: List[Tuple[str, Optional[str]]],
+    top_k: int = 6,
+    score_threshold: float = 0.15,
+    use_cache: bool = True,
+    filters: Optional[RetrievalFilter] = None,
+    rerank: Optional[bool] = None,
+    rerank_budget_ms: Optional[float] = None,
+    strategy: Optional[str] = None,
+    max_concurrency: Optional[int] = None,
+) -> Iterator[Dict[str, Any]]:
+    """Answer many (question, context) items, yielding each result as it is done.
+
+    Retrieval runs once for the whole batch (one embedding call, one FAISS
+    search over all query vectors); the LLM calls then run on at most
+    max_concurrency threads. Every item result carries its "index" into items
+    and a "status" of "ok" or "error"; the last yielded dict is a summary
+    with "done": True and the batch-stage timings.
+    """
+    initialize()
+    with trace() as timings:
+        questions = [q.strip() for q, _ in items]
+        asked = [i for i, q in enumerate(questions) if q]
+        intents: Dict[int, Tuple[str, Optional[str]]] = dict(
+            zip(asked, classify_questions([questions[i] for i in asked]))
+        )
+        legal = [i for i in asked if intents[i][0] == LEGAL]
+        selected = select_hits_batch(
+            [questions[i] for i in legal],
+            top_k,
+            score_threshold,
+            filters=filters,
+            use_rerank=rerank,
+            budget_ms=rerank_budget_ms,
+        )
+    hits: Dict[int, List[Dict]] = dict(zip(legal, selected))
+
+    def answer_item(i: int) -> Dict[str, Any]:
+        question, context = questions[i], items[i][1]
+        try:
+            with trace() as item_timings:
+                intent, canned = intents[i]
+                if intent == GREETING:
+                    result = canned_reply(canned)
+                elif intent == CAPABILITY:
+                    result = _answer_general(question, context)
+                else:
+                    result = _answer(question, context, hits[i], use_cache, strategy)
+        except Exception as e:
+            logger.error("❌ Batch item %s failed: %s", i, e)
+            return {"index": i, "status": "error", "error": str(e)}
+        return {"index": i, "status": "ok", **result, "timings": item_timings}
+
+    errors = 0
+    workers = max(1, min(max_concurrency or BATCH_LLM_CONCURRENCY, len(items)))
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="chatbot-batch")
+    try:
+        futures = []
+        for i, question in enumerate(questions):
+            if question:
+                futures.append(pool.submit(answer_item, i))
+            else:
+                errors += 1
+                yield {"index": i, "status": "error", "error": "Message is required"}
+        for future in as_completed(futures):
+            result = future.result()
+            errors += result["status"] != "ok"
+            yield result
+    finally:
+        # the consumer may stop early (client went away); drop queued items
+        pool.shutdown(wait=False, cancel_futures=True)
+    yield {"done": True, "count": len(items), "errors": errors, "timings": timings}
+
+
+def run_inference_batch(
+    items: List[Tuple[str, Optional[str]]], **kwargs: Any
+) -> Dict[str, Any]:
+    """iter_inference_batch collected into {"results": [...in item order], ...}."""
+    results: List[Dict[str, Any]] = [{} for _ in items]
+    summary: Dict[str, Any] = {}
+    for out in iter_inference_batch(items, **kwargs):
+        if out.get("done"):
+            summary = out
+        else:
+            results[out["index"]] = out
+    return {
+        "results": results,
+        "errors": summary.get("errors", 0),
+        "timings": summary.get("timings", {}),
+    }
+
+
+def _answer_from_hits(
+    question: str,
+    hits: List[Dict],
+    context: Optional[str],
+    strategy: Optional[str] = None,
+):
+    try:
+        return _ask_for_hits(question, hits, context, strategy or ANSWER_STRATEGY)
+    except LLMUnavailable as e:
+        logger.warning("⚠️  LLM unavailable (%s) - serving degraded answer", e)
+        logger.debug("🏁 INFERENCE END (degraded)")
+        return {"answer": DEGRADED_ANSWER, "hits": hits, "type": "degraded"}
 
+
+def _ask_for_hits(
+    question: str, hits: List[Dict], context: Optional[str], strategy: str
+):
     if not hits:
-        print("⚠️  No hits passed threshold filter - using general knowledge fallback")
+        logger.info(
+            "⚠️  No hits passed threshold filter - using general knowledge fallback"
+        )
         answer = ask_groq_fallback(question, context=context)
-        print("🏁 INFERENCE END (fallback response)")
-        print("=" * 80 + "\n")
+        logger.debug("🏁 INFERENCE END (fallback response)")
         return {"answer": answer, "hits": [], "type": "fallback"}
 
-    print(f"📝 Building sources block from {len(hits)} filtered hits")
-    sources = build_sources_block(hits)
-    print(f"✓ Sources block length: {len(sources)} chars")
+    logger.debug("📝 Building sources block from %s filtered hits", len(hits))
+    # the response returns the hits the [SOURCE i] labels refer to
+    sources, hits = pack_prompt_sources(hits)
+    logger.debug("✓ Sources block length: %s chars", len(sources))
+
+    if strategy == "single_call":
+        # the model picks sources vs general knowledge itself, no second call
+        answer_type, answer = ask_groq_single(question, sources, context=context)
+        logger.debug("🏁 INFERENCE END (%s, single call)", answer_type)
+        return {"answer": answer, "hits": hits, "type": answer_type}
 
     answer = ask_groq(question, sources, context=context)
 
     # If RAG returns "I do not know" or similar variations, try fallback
-    answer_lower = answer.strip().lower()
-    if (
-        "i do not know" in answer_lower
-        or "i don't know" in answer_lower
-        or answer_lower == "i do not know."
-        or answer_lower == "i don't know."
-    ):
-        print("⚠️  RAG returned 'I do not know' - trying general knowledge fallback")
+    if is_unknown_answer(answer):
+        logger.info(
+            "⚠️  RAG returned 'I do not know' - trying general knowledge fallback"
+        )
         answer = ask_groq_fallback(question, context=context)
-        print("🏁 INFERENCE END (fallback after RAG failure)")
-        print("=" * 80 + "\n")
+        logger.debug("🏁 INFERENCE END (fallback after RAG failure)")
         return {"answer": answer, "hits": hits, "type": "fallback"}
 
-    print(f"✅ Final answer: {answer[:100] if len(answer) > 100 else answer}...")
-    print("🏁 INFERENCE END")
-    print("=" * 80 + "\n")
+    logger.debug("✅ Final answer: %s...", answer[:100])
+    logger.debug("🏁 INFERENCE END")
 
     return {"answer": answer, "hits": hits, "type": "sourced"}
 
@@ -421,11 +1828,11 @@ def format_user_friendly_answer(
     cited_map = []
     for i, h in enumerate(shown, start=1):
         doc = h["doc"]
-        meta = doc.get("meta") if isinstance(doc.get("meta"), dict) else doc
-        title = (meta.get("law_title") or meta.get("Law Title") or "").strip()
-        section = (meta.get("section_name") or meta.get("Section Name") or "").strip()
-        sid = (meta.get("section_id") or meta.get("Section ID") or "").strip()
-        date = (meta.get("law_pass_date") or meta.get("law_date") or "").strip()
+        meta = h.get("meta") or extract_meta(doc)
+        title = meta["law_title"]
+        section = meta["section_name"]
+        sid = meta["section_id"]
+        date = meta["law_pass_date"]
         text = (
             (doc.get("text") or doc.get("_text_for_embed") or "")
             .replace("\n", " ")
@@ -458,6 +1865,12 @@ def format_user_friendly_answer(
 
 __all__ = [
     "initialize",
+    "reload_resources",
+    "warm_up",
+    "is_ready",
     "run_inference",
+    "prepare_inference",
+    "astream_groq",
+    "cache_stats",
     "format_user_friendly_answer",
 ]
@@ -0,0 +1,146 @@
+"""Fit retrieved sources into a fixed prompt token budget.
+
+Hits are deduplicated (a hit whose text is contained in, or mostly overlaps,
+a better-ranked hit of the same law is dropped, e.g. overlapping chunks or a
+repeated copy of a section), then the budget is split
+across the remaining hits in proportion to their retrieval score: a hit that
+needs less than its share gets exactly what it needs and the rest is
+redistributed among the others. Hits whose share would be too small to be
+useful are dropped, lowest-scored first.
+"""
+
+import hashlib
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Set, Tuple
+
+from .doc_store import extract_meta, source_text
+from .token_count import count_tokens, truncate_tokens
+
+
+@dataclass
+class PackedSource:
+    hit: Dict
+    label: str
+    text: str
+    tokens: int  # tokens allotted to text
+
+
+def source_label(hit: Dict, meta: Dict[str, str]) -> str:
+    label = f"title: {meta['law_title']}" if meta["law_title"] else ""
+    label += f" | id: {meta['section_id']}" if meta["section_id"] else ""
+    label += f" | date: {meta['law_pass_date']}" if meta["law_pass_date"] else ""
+    return label or f"doc_index: {hit['doc_index']}"
+
+
+# word n-grams compared between hits, and the share of a hit's n-grams found
+# in a kept hit of the same law above which it counts as a repeat
+SHINGLE_WORDS = 8
+OVERLAP_THRESHOLD = 0.8
+
+
+def _shingles(words: List[str]) -> Set[Tuple[str, ...]]:
+    if len(words) <= SHINGLE_WORDS:
+        return {tuple(words)}
+    return {
+        tuple(words[i : i + SHINGLE_WORDS])
+        for i in range(len(words) - SHINGLE_WORDS + 1)
+    }
+
+
+def dedupe_hits(hits: List[Dict]) -> List[Dict]:
+    """Drop hits that repeat text of a better-ranked hit from the same law.
+
+    A hit is a repeat when its text is identical (whitespace-insensitive) to
+    a kept hit's, or when OVERLAP_THRESHOLD of its word 8-grams occur in one
+    kept hit of the same law title: overlapping chunks of one section, or a
+    section quoted inside another record. Records of one section that say
+    different things are all kept. hits are in rank order, so the copy kept
+    is the best-ranked one.
+    """
+    seen = set()
+    kept: Dict[str, List[Set[Tuple[str, ...]]]] = {}
+    out = []
+    for h in hits:
+        words = source_text(h["doc"]).lower().split()
+        digest = hashlib.sha1(" ".join(words).encode()).digest()
+        if digest in seen:
+            continue
+        meta = h.get("meta") or extract_meta(h["doc"])
+        law = meta["law_title"].lower()
+        grams = _shingles(words)
+        if law and any(
+            len(grams & other) >= OVERLAP_THRESHOLD * len(grams)
+            for other in kept.get(law, ())
+        ):
+            continue
+        seen.add(digest)
+        if law:
+            kept.setdefault(law, []).append(grams)
+        out.append(h)
+    return out
+
+
+def allocate(needs: List[int], weights: List[float], budget: int) -> List[int]:
+    """Split budget over items, proportionally to weights, capped at each need."""
+    alloc = [0] * len(needs)
+    open_items = [i for i, n in enumerate(needs) if n > 0]
+    remaining = budget
+    while open_items and remaining > 0:
+        total_w = sum(weights[i] for i in open_items)
+        shares = {i: remaining * weights[i] / total_w for i in open_items}
+        satisfied = [i for i in open_items if needs[i] <= shares[i]]
+        if not satisfied:
+            for i in open_items:
+                alloc[i] = int(shares[i])
+            break
+        for i in satisfied:
+            alloc[i] = needs[i]
+            remaining -= needs[i]
+        open_items = [i for i in open_items if i not in satisfied]
+    return alloc
+
+
+def pack_sources(
+    hits: List[Dict], budget_tokens: int, min_tokens: int = 48
+) -> List[PackedSource]:
+    """Choose and truncate sources so labels + texts fit into budget_tokens.
+
+    The result is in rank order; hits missing from it were dropped as
+    duplicates or for lack of budget.
+    """
+    hits = dedupe_hits(hits)
+    labels = [source_label(h, h.get("meta") or extract_meta(h["doc"])) for h in hits]
+    # "[SOURCE i] " prefix and blank lines cost a few tokens per source
+    overheads = [count_tokens(label) + 8 for label in labels]
+    needs = [_hit_tokens(h) for h in hits]
+    weights = [max(float(h["score"]), 1e-3) for h in hits]
+
+    keep = list(range(len(hits)))
+    while keep:
+        budget = budget_tokens - sum(overheads[i] for i in keep)
+        alloc = allocate(
+            [needs[i] for i in keep], [weights[i] for i in keep], max(0, budget)
+        )
+        # a few dozen tokens of a statute mostly cuts mid-sentence; drop the
+        # weakest hit and give its share to the others instead
+        starved = any(a < min(min_tokens, needs[i]) for a, i in zip(alloc, keep))
+        if starved and len(keep) > 1:
+            keep.remove(min(keep, key=lambda i: weights[i]))
+            continue
+        return [
+            PackedSource(
+                hit=hits[i],
+                label=labels[i],
+                text=truncate_tokens(source_text(hits[i]["doc"]), n),
+                tokens=n,
+            )
+            for i, n in zip(keep, alloc)
+        ]
+    return []
+
+
+def _hit_tokens(hit: Dict) -> int:
+    n: Optional[int] = hit.get("n_tokens")
+    if n is None:
+        n = count_tokens(source_text(hit["doc"]))
+    return n
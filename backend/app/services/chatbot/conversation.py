@@ -0,0 +1,203 @@
+"""Server-side conversation sessions with a rolling summary.
+
+A session keeps the (question, answer) turns of one conversation. Turns that
+fall out of the last `recent_turns` are folded into a running summary by
+`summarize_fn`, in the background after an answer, so no request waits for
+it. The prompt context of the next question is that summary plus the turns
+not summarized yet, cut to a token budget, instead of the whole transcript.
+Folded turns are dropped from memory; if summaries keep failing, the oldest
+pending turns are dropped past `max_turns` so a session stays bounded.
+
+Sessions live in process memory (LRU + idle TTL); with several workers the
+client must stick to one of them.
+"""
+
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .token_count import count_tokens, truncate_tokens
+
+logger = logging.getLogger(__name__)
+
+Turn = Tuple[str, str]  # (question, answer)
+# summarize_fn(previous summary, turns to fold in) -> new summary
+SummarizeFn = Callable[[str, List[Turn]], str]
+
+
+@dataclass
+class Session:
+    id: str
+    # turns still held; turns[i] is turn number dropped + i of the conversation
+    turns: List[Turn] = field(default_factory=list)
+    summary: str = ""
+    summarized: int = 0  # the first `summarized` turns are covered by summary
+    dropped: int = 0  # turns no longer held (summarized, or cut by max_turns)
+    summarizing: bool = False
+    last_used: float = field(default_factory=time.monotonic)
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+
+def format_turns(turns: List[Turn]) -> str:
+    return "\n".join(f"User: {q}\nAssistant: {a}" for q, a in turns)
+
+
+def _pending(session: Session) -> List[Turn]:
+    """Held turns the summary does not cover yet."""
+    return session.turns[max(session.summarized - session.dropped, 0) :]
+
+
+class ConversationStore:
+    def __init__(
+        self,
+        summarize_fn: SummarizeFn,
+        recent_turns: int = 3,
+        context_tokens: int = 600,
+        max_sessions: int = 10000,
+        ttl: float = 3600.0,
+        max_turns: int = 50,
+    ):
+        self.summarize_fn = summarize_fn
+        self.recent_turns = max(0, recent_turns)
+        self.context_tokens = context_tokens
+        self.max_sessions = max(1, max_sessions)
+        self.ttl = ttl
+        self.max_turns = max(self.recent_turns, max_turns, 1)
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self._lock = threading.Lock()
+        # one worker: summaries are cheap background work, never urgent
+        self._pool = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="chatbot-summary"
+        )
+        self.summaries = 0
+        self.summary_failures = 0
+        self.evictions = 0
+        self.unsummarized_dropped = 0
+
+    def create(self) -> Session:
+        session = Session(id=uuid.uuid4().hex)
+        with self._lock:
+            self._sessions[session.id] = session
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self.evictions += 1
+        return session
+
+    def get(self, session_id: str) -> Optional[Session]:
+        now = time.monotonic()
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return None
+            if self.ttl > 0 and now - session.last_used > self.ttl:
+                del self._sessions[session_id]
+                self.evictions += 1
+                return None
+            session.last_used = now
+            self._sessions.move_to_end(session_id)
+            return session
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def context(self, session: Session) -> Optional[str]:
+        """Summary + unsummarized turns (newest kept first) within the budget."""
+        with session.lock:
+            summary = session.summary
+            pending = _pending(session)
+        if not summary and not pending:
+            return None
+        budget = self.context_tokens
+        parts = []
+        if summary:
+            summary = truncate_tokens(summary, budget // 2)
+            parts.append(f"Summary of the earlier conversation:\n{summary}")
+            budget -= count_tokens(parts[0])
+        recent: List[str] = []
+        for turn in reversed(pending):
+            text = format_turns([turn])
+            n = count_tokens(text)
+            if n > budget:
+                if not recent:
+                    # always keep (the start of) the latest turn
+                    recent.append(truncate_tokens(text, max(budget, 0)))
+                break
+            recent.append(text)
+            budget -= n
+        if recent:
+            parts.append("Recent turns:\n" + "\n".join(reversed(recent)))
+        return "\n\n".join(parts)
+
+    def add_turn(self, session: Session, question: str, answer: str) -> None:
+        """Record a finished turn and summarize older turns in the background."""
+        with session.lock:
+            session.turns.append((question, answer))
+            session.last_used = time.monotonic()
+            excess = len(session.turns) - self.max_turns
+            if excess > 0:
+                # summaries are failing; these would never fit the context anyway
+                del session.turns[:excess]
+                session.dropped += excess
+                self.unsummarized_dropped += excess
+        self._maybe_summarize(session)
+
+    def _maybe_summarize(self, session: Session) -> None:
+        with session.lock:
+            target = session.dropped + len(session.turns) - self.recent_turns
+            if session.summarizing or target <= max(
+                session.summarized, session.dropped
+            ):
+                return
+            session.summarizing = True
+            previous = session.summary
+            start = max(session.summarized, session.dropped)
+            turns = _pending(session)[: target - start]
+        self._pool.submit(self._summarize, session, previous, turns, target)
+
+    def _summarize(
+        self, session: Session, previous: str, turns: List[Turn], target: int
+    ) -> None:
+        try:
+            summary = self.summarize_fn(previous, turns)
+        except Exception as e:
+            logger.warning("⚠️  Conversation summary failed: %s", e)
+            self.summary_failures += 1
+            summary = None
+        with session.lock:
+            session.summarizing = False
+            if summary:
+                session.summary = summary
+                session.summarized = target
+                # folded into the summary, no need to keep them
+                del session.turns[: max(target - session.dropped, 0)]
+                session.dropped = max(session.dropped, target)
+                self.summaries += 1
+        if summary:
+            # more turns may have finished while this one was running
+            self._maybe_summarize(session)
+
+    def describe(self, session: Session) -> Dict[str, Any]:
+        with session.lock:
+            return {
+                "session_id": session.id,
+                "turns": session.dropped + len(session.turns),
+                "summarized_turns": session.summarized,
+                "summary": session.summary,
+                "recent": [{"question": q, "answer": a} for q, a in _pending(session)],
+            }
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "sessions": len(self._sessions),
+            "max_sessions": self.max_sessions,
+            "summaries": self.summaries,
+            "summary_failures": self.summary_failures,
+            "evictions": self.evictions,
+            "unsummarized_turns_dropped": self.unsummarized_dropped,
+        }
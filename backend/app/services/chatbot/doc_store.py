@@ -0,0 +1,324 @@
+"""Offset-indexed, memory-mapped store for the legal corpus.
+
+The JSONL corpus is converted once into:
+
+    payload.bin        every document as UTF-8 JSON, back to back
+    offsets.npy        uint64[n + 1] byte offsets into payload.bin
+    col_<name>.npy     pre-extracted metadata columns (META_COLUMNS, NUMERIC_COLUMNS)
+                       and their lowercased filter forms (FILTER_COLUMNS)
+    store.json         manifest (count, columns, source file)
+
+Opening a store only maps these files, so startup cost does not depend on the
+corpus size, a lookup only parses the documents it needs, and several uvicorn
+workers share the same pages through the OS cache.
+
+Build from the backend directory:
+
+    python -m app.services.chatbot.doc_store build \\
+        --jsonl app/services/chatbot/data/processed_bd_law.jsonl \\
+        --out app/services/chatbot/data/doc_store
+"""
+
+import argparse
+import json
+import mmap
+import os
+import re
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+
+from .token_count import count_tokens, encoding_label
+
+MANIFEST_NAME = "store.json"
+PAYLOAD_NAME = "payload.bin"
+OFFSETS_NAME = "offsets.npy"
+META_COLUMNS = ["law_title", "section_name", "section_id", "law_pass_date"]
+# numeric columns: law_year for filtering (0 = unknown), n_tokens of the
+# source text for prompt packing
+NUMERIC_COLUMNS = {"law_year": "int16", "n_tokens": "int32"}
+# what metadata filters compare against, normalized once here instead of by
+# every worker at startup: the sorted distinct lowercased titles (not one
+# entry per document), each row's code into them, and lowercased section ids
+FILTER_COLUMNS = ["title_vocab", "title_code", "section_id_norm"]
+
+_YEAR_RE = re.compile(r"\b(1[6-9]\d\d|20\d\d)\b")
+
+
+def extract_meta(doc: Dict) -> Dict[str, str]:
+    """Pull the display metadata out of a corpus record (flat or nested under 'meta')."""
+    meta = doc.get("meta") if isinstance(doc.get("meta"), dict) else doc
+    return {
+        "law_title": str(meta.get("law_title") or meta.get("Law Title") or "").strip(),
+        "section_name": str(
+            meta.get("section_name") or meta.get("Section Name") or ""
+        ).strip(),
+        "section_id": str(meta.get("section_id") or meta.get("Section ID") or "").strip(),
+        "law_pass_date": str(
+            meta.get("law_pass_date") or meta.get("law_date") or ""
+        ).strip(),
+    }
+
+
+def law_year(meta: Dict[str, str]) -> int:
+    """Year the law was passed, from the pass date or else the title ("... 1860")."""
+    for value in (meta.get("law_pass_date", ""), meta.get("law_title", "")):
+        m = _YEAR_RE.search(value or "")
+        if m:
+            return int(m.group(1))
+    return 0
+
+
+def source_text(doc: Dict) -> str:
+    """Text of a record as it is quoted to the LLM."""
+    text = doc.get("text") or doc.get("_text_for_embed") or ""
+    if text:
+        return text
+    # fallback: combine header + clean_section_description
+    meta = extract_meta(doc)
+    header_parts = []
+    if meta["law_title"]:
+        header_parts.append(f"Law Title: {meta['law_title']}")
+    if meta["law_pass_date"]:
+        header_parts.append(f"Law Date: {meta['law_pass_date']}")
+    if meta["section_id"]:
+        header_parts.append(f"Section ID: {meta['section_id']}")
+    if meta["section_name"]:
+        header_parts.append(f"Section Name: {meta['section_name']}")
+    inner = doc.get("meta") if isinstance(doc.get("meta"), dict) else doc
+    return (
+        "\n".join(header_parts)
+        + "\n\n"
+        + (inner.get("clean_section_description") or "")
+    )
+
+
+def numeric_meta(doc: Dict, meta: Dict[str, str]) -> Dict[str, int]:
+    return {"law_year": law_year(meta), "n_tokens": count_tokens(source_text(doc))}
+
+
+def filter_columns(
+    titles: np.ndarray, section_ids: np.ndarray
+) -> Dict[str, np.ndarray]:
+    """FILTER_COLUMNS computed from the law_title and section_id columns."""
+    vocab, codes = np.unique(np.char.lower(titles.astype(str)), return_inverse=True)
+    return {
+        "title_vocab": vocab,
+        "title_code": codes.astype("int32"),
+        "section_id_norm": np.char.lower(section_ids.astype(str)),
+    }
+
+
+def iter_jsonl(path: Path) -> Iterator[Dict]:
+    with path.open("r", encoding="utf-8") as fh:
+        for line in fh:
+            if not line.strip():
+                continue
+            yield json.loads(line)
+
+
+class DocStore:
+    """Read-only, list-like view over a built store (len(), [i], iteration)."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        with (self.path / MANIFEST_NAME).open("r", encoding="utf-8") as fh:
+            self.manifest: Dict[str, Any] = json.load(fh)
+        self._offsets = np.load(self.path / OFFSETS_NAME, mmap_mode="r")
+        self._fh = (self.path / PAYLOAD_NAME).open("rb")
+        size = int(self._offsets[-1]) if len(self._offsets) else 0
+        self._mm: Optional[mmap.mmap] = (
+            mmap.mmap(self._fh.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+        )
+        self._columns: Dict[str, np.ndarray] = {}
+
+    @staticmethod
+    def exists(path: Path) -> bool:
+        return (Path(path) / MANIFEST_NAME).exists()
+
+    def __len__(self) -> int:
+        return max(0, len(self._offsets) - 1)
+
+    def raw(self, i: int) -> bytes:
+        if i < 0 or i >= len(self):
+            raise IndexError(i)
+        start, end = int(self._offsets[i]), int(self._offsets[i + 1])
+        assert self._mm is not None
+        return self._mm[start:end]
+
+    def __getitem__(self, i: int) -> Dict:
+        return json.loads(self.raw(i))
+
+    def __iter__(self) -> Iterator[Dict]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def column(self, name: str) -> np.ndarray:
+        """Memory-mapped metadata column (one entry per document)."""
+        if name not in self._columns:
+            self._columns[name] = np.load(self.path / f"col_{name}.npy", mmap_mode="r")
+        return self._columns[name]
+
+    def meta(self, i: int) -> Dict[str, str]:
+        return {name: str(self.column(name)[i]) for name in self.manifest["columns"]}
+
+    def close(self) -> None:
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+        self._fh.close()
+
+
+def save_npy_atomic(path: Path, arr: np.ndarray) -> None:
+    # readers may have the old file mmap'd; replace it instead of overwriting
+    tmp = path.with_name(path.name + ".tmp")
+    with tmp.open("wb") as fh:
+        np.save(fh, arr)
+    os.replace(tmp, path)
+
+
+def _encode_doc(doc: Dict) -> bytes:
+    return json.dumps(doc, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _write_manifest_atomic(store_dir: Path, manifest: Dict[str, Any]) -> None:
+    tmp = store_dir / (MANIFEST_NAME + ".tmp")
+    with tmp.open("w", encoding="utf-8") as fh:
+        json.dump(manifest, fh, indent=2)
+    os.replace(tmp, store_dir / MANIFEST_NAME)
+
+
+def build_doc_store(jsonl_path: Path, out_dir: Path) -> DocStore:
+    """Convert a JSONL corpus into a DocStore directory and open it.
+
+    Rebuilding over a store that servers have open is safe: every file is
+    written next to the old one and swapped in with os.replace, manifest
+    last, so mapped pages of the old files stay valid until readers reopen.
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    offsets: List[int] = [0]
+    columns: Dict[str, List[str]] = {name: [] for name in META_COLUMNS}
+    numeric: Dict[str, List[int]] = {name: [] for name in NUMERIC_COLUMNS}
+    payload_tmp = out_dir / (PAYLOAD_NAME + ".tmp")
+    with payload_tmp.open("wb") as payload:
+        for doc in iter_jsonl(Path(jsonl_path)):
+            data = _encode_doc(doc)
+            payload.write(data)
+            offsets.append(offsets[-1] + len(data))
+            meta = extract_meta(doc)
+            for name in META_COLUMNS:
+                columns[name].append(meta[name])
+            for name, value in numeric_meta(doc, meta).items():
+                numeric[name].append(value)
+    os.replace(payload_tmp, out_dir / PAYLOAD_NAME)
+
+    save_npy_atomic(out_dir / OFFSETS_NAME, np.asarray(offsets, dtype="uint64"))
+    arrays = {name: np.asarray(values, dtype=str) for name, values in columns.items()}
+    arrays.update(filter_columns(arrays["law_title"], arrays["section_id"]))
+    for name, arr in arrays.items():
+        save_npy_atomic(out_dir / f"col_{name}.npy", arr)
+    for name, values in numeric.items():
+        save_npy_atomic(
+            out_dir / f"col_{name}.npy", np.asarray(values, dtype=NUMERIC_COLUMNS[name])
+        )
+
+    manifest = {
+        "count": len(offsets) - 1,
+        "columns": META_COLUMNS,
+        "numeric_columns": list(NUMERIC_COLUMNS),
+        "filter_columns": FILTER_COLUMNS,
+        "token_encoding": encoding_label(),
+        "source": str(jsonl_path),
+    }
+    _write_manifest_atomic(out_dir, manifest)
+    return DocStore(out_dir)
+
+
+def append_docs(store_dir: Path, new_docs: List[Dict]) -> range:
+    """Append documents to an existing store; returns the row ids they received.
+
+    Existing rows never move, so their ids stay valid as FAISS ids. Readers that
+    already opened the store keep seeing the old row count until they reopen it.
+    """
+    store_dir = Path(store_dir)
+    with (store_dir / MANIFEST_NAME).open("r", encoding="utf-8") as fh:
+        manifest = json.load(fh)
+    old_offsets = np.load(store_dir / OFFSETS_NAME)
+    first = len(old_offsets) - 1
+    label = encoding_label()
+    # counts of the existing rows made with another tokenizer: recount them
+    # too, so the column is consistent with the manifest's token_encoding
+    recount = (
+        DocStore(store_dir)
+        if "n_tokens" in manifest.get("numeric_columns", [])
+        and manifest.get("token_encoding") != label
+        else None
+    )
+
+    offsets: List[int] = [int(old_offsets[-1])]
+    columns: Dict[str, List[str]] = {name: [] for name in manifest["columns"]}
+    numeric: Dict[str, List[int]] = {
+        name: [] for name in manifest.get("numeric_columns", [])
+    }
+    with (store_dir / PAYLOAD_NAME).open("ab") as payload:
+        for doc in new_docs:
+            data = _encode_doc(doc)
+            payload.write(data)
+            offsets.append(offsets[-1] + len(data))
+            meta = extract_meta(doc)
+            for name in columns:
+                columns[name].append(meta.get(name, ""))
+            values = numeric_meta(doc, meta)
+            for name in numeric:
+                numeric[name].append(values[name])
+
+    new_offsets = np.asarray(offsets[1:], dtype="uint64")
+    save_npy_atomic(
+        store_dir / OFFSETS_NAME, np.concatenate([old_offsets, new_offsets])
+    )
+    arrays = {}
+    for name, values in columns.items():
+        old = np.load(store_dir / f"col_{name}.npy")
+        arrays[name] = np.concatenate([old.astype(str), np.asarray(values, dtype=str)])
+    # new titles shift the codes of later ones, so renormalize the whole column
+    arrays.update(filter_columns(arrays["law_title"], arrays["section_id"]))
+    for name, arr in arrays.items():
+        save_npy_atomic(store_dir / f"col_{name}.npy", arr)
+    for name, nvalues in numeric.items():
+        col_path = store_dir / f"col_{name}.npy"
+        old = np.load(col_path)
+        if name == "n_tokens" and recount is not None:
+            old = np.asarray(
+                [count_tokens(source_text(d)) for d in recount], dtype=old.dtype
+            )
+        save_npy_atomic(
+            col_path, np.concatenate([old, np.asarray(nvalues, dtype=old.dtype)])
+        )
+
+    if recount is not None:
+        recount.close()
+    manifest["count"] = first + len(new_docs)
+    manifest["filter_columns"] = FILTER_COLUMNS
+    manifest["token_encoding"] = label
+    _write_manifest_atomic(store_dir, manifest)
+    return range(first, first + len(new_docs))
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Build the chatbot document store")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("build", help="convert a JSONL corpus into a doc store")
+    b.add_argument("--jsonl", type=Path, required=True)
+    b.add_argument("--out", type=Path, required=True)
+    args = parser.parse_args(argv)
+
+    if args.cmd == "build":
+        store = build_doc_store(args.jsonl, args.out)
+        print(f"✓ Wrote {len(store)} docs to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""Selectable query-embedding backends.
+
+* torch      - sentence-transformers on PyTorch (default)
+* onnx       - the same model exported to ONNX, run with onnxruntime
+* onnx_int8  - the ONNX export with dynamically int8-quantized weights
+
+The ONNX backends only need onnxruntime + tokenizers at serving time, so a
+CPU-only server does not have to import torch. Export once from the backend
+directory (needs torch + onnxruntime):
+
+    python -m app.services.chatbot.embedding_backends export \\
+        --out app/services/chatbot/data/onnx --quantize
+"""
+
+import argparse
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+
+BACKENDS = ("torch", "onnx", "onnx_int8")
+ONNX_MODEL_NAME = "model.onnx"
+ONNX_INT8_MODEL_NAME = "model_int8.onnx"
+TOKENIZER_NAME = "tokenizer.json"
+MAX_SEQ_LENGTH = 256
+
+
+class TorchBackend:
+    name = "torch"
+
+    def __init__(self, model_name: str):
+        from sentence_transformers import SentenceTransformer
+
+        self.model = SentenceTransformer(model_name)
+        self.dim = int(self.model.get_sentence_embedding_dimension())
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        return self.model.encode(texts, convert_to_numpy=True).astype("float32")
+
+
+class OnnxBackend:
+    """Transformer in onnxruntime + mean pooling, matching sentence-transformers."""
+
+    def __init__(self, model_dir: Path, quantized: bool = False, threads: int = 0):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        model_dir = Path(model_dir)
+        model_file = model_dir / (
+            ONNX_INT8_MODEL_NAME if quantized else ONNX_MODEL_NAME
+        )
+        if not model_file.exists():
+            raise FileNotFoundError(
+                f"{model_file} not found; run `python -m "
+                "app.services.chatbot.embedding_backends export` first"
+            )
+        self.name = "onnx_int8" if quantized else "onnx"
+
+        opts = ort.SessionOptions()
+        if threads:
+            opts.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(
+            str(model_file), opts, providers=["CPUExecutionProvider"]
+        )
+        self._input_names = {i.name for i in self.session.get_inputs()}
+        self.dim = int(self.session.get_outputs()[0].shape[-1])
+
+        self.tokenizer = Tokenizer.from_file(str(model_dir / TOKENIZER_NAME))
+        self.tokenizer.enable_truncation(MAX_SEQ_LENGTH)
+        self.tokenizer.enable_padding()
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        enc = self.tokenizer.encode_batch(texts)
+        input_ids = np.asarray([e.ids for e in enc], dtype="int64")
+        mask = np.asarray([e.attention_mask for e in enc], dtype="int64")
+        feeds = {"input_ids": input_ids, "attention_mask": mask}
+        if "token_type_ids" in self._input_names:
+            feeds["token_type_ids"] = np.asarray(
+                [e.type_ids for e in enc], dtype="int64"
+            )
+        hidden = self.session.run(None, feeds)[0]
+        # mean pooling over real tokens, then L2 normalize (model's Normalize layer)
+        m = mask[..., None].astype("float32")
+        emb = (hidden * m).sum(axis=1) / np.clip(m.sum(axis=1), 1e-9, None)
+        emb /= np.clip(np.linalg.norm(emb, axis=1, keepdims=True), 1e-12, None)
+        return emb.astype("float32")
+
+
+def load_backend(kind: str, model_name: str, onnx_dir: Optional[Path] = None):
+    if kind not in BACKENDS:
+        raise ValueError(
+            f"Unknown embedding backend {kind!r}, expected one of {BACKENDS}"
+        )
+    if kind == "torch":
+        return TorchBackend(model_name)
+    if onnx_dir is None:
+        raise ValueError("onnx_dir is required for ONNX backends")
+    return OnnxBackend(onnx_dir, quantized=(kind == "onnx_int8"))
+
+
+def export_onnx(model_name: str, out_dir: Path, quantize: bool = True) -> None:
+    """Export the transformer of a sentence-transformers model to ONNX."""
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    st = SentenceTransformer(model_name, device="cpu")
+    hf_model = st[0].auto_model.eval()
+    tokenizer = st.tokenizer
+
+    sample = tokenizer(["export sample"], return_tensors="pt")
+    input_names = [
+        n for n in ("input_ids", "attention_mask", "token_type_ids") if n in sample
+    ]
+    dynamic = {n: {0: "batch", 1: "seq"} for n in input_names}
+    dynamic["last_hidden_state"] = {0: "batch", 1: "seq"}
+    with torch.no_grad():
+        torch.onnx.export(
+            hf_model,
+            tuple(sample[n] for n in input_names),
+            str(out_dir / ONNX_MODEL_NAME),
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic,
+            opset_version=14,
+        )
+    tokenizer.backend_tokenizer.save(str(out_dir / TOKENIZER_NAME))
+    print(f"✓ Exported {model_name} to {out_dir / ONNX_MODEL_NAME}")
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        quantize_dynamic(
+            str(out_dir / ONNX_MODEL_NAME),
+            str(out_dir / ONNX_INT8_MODEL_NAME),
+            weight_type=QuantType.QInt8,
+        )
+        print(f"✓ Wrote int8 model to {out_dir / ONNX_INT8_MODEL_NAME}")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    from .chatbot_service import EMBED_MODEL
+
+    parser = argparse.ArgumentParser(description="Manage embedding backends")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    e = sub.add_parser("export", help="export the embedding model to ONNX")
+    e.add_argument("--model", default=EMBED_MODEL)
+    e.add_argument("--out", type=Path, required=True)
+    e.add_argument("--quantize", action="store_true", help="also write an int8 model")
+    args = parser.parse_args(argv)
+
+    if args.cmd == "export":
+        export_onnx(args.model, args.out, quantize=args.quantize)
+
+
+if __name__ == "__main__":
+    main()
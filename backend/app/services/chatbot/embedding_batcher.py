@@ -0,0 +1,119 @@
+import threading
+import queue
+import time
+from concurrent.futures import Future
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+
+# encode_fn takes a list of strings and returns a (n, dim) float32 array
+EncodeFn = Callable[[List[str]], np.ndarray]
+# put on the queue by stop() to wake the batching thread
+_STOP = None
+
+
+class EmbeddingBatcher:
+    """Collect queries from concurrent callers and encode them in one call.
+
+    Callers block in encode() until their row of the batch is ready. A batch is
+    flushed when it reaches max_batch_size or when the oldest queued query has
+    waited max_wait_ms, whichever comes first.
+    """
+
+    def __init__(
+        self, encode_fn: EncodeFn, max_batch_size: int = 16, max_wait_ms: float = 5.0
+    ):
+        self.encode_fn = encode_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self._queue: "queue.Queue[Optional[Tuple[str, Future]]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._stopped = False
+        self.batches = 0
+        self.queries = 0
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._loop, name="embedding-batcher", daemon=True
+                )
+                self._thread.start()
+
+    def encode(self, query: str) -> np.ndarray:
+        """Return the (1, dim) embedding for query."""
+        if self._stopped:
+            raise RuntimeError("Embedding batcher is stopped")
+        self._ensure_started()
+        fut: Future = Future()
+        self._queue.put((query, fut))
+        if self._stopped:
+            # stop() ran after the check above; the loop may be gone already
+            self._fail_pending()
+        return fut.result()
+
+    def _collect(self) -> List[Tuple[str, Future]]:
+        first = self._queue.get()
+        if first is _STOP:
+            return []
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is _STOP:
+                break
+            batch.append(item)
+        return batch
+
+    def _loop(self) -> None:
+        try:
+            while not self._stopped:
+                batch = self._collect()
+                batch = [(q, f) for q, f in batch if f.set_running_or_notify_cancel()]
+                if not batch:
+                    continue
+                try:
+                    embs = self.encode_fn([q for q, _ in batch])
+                except Exception as e:
+                    for _, fut in batch:
+                        fut.set_exception(e)
+                    continue
+                self.batches += 1
+                self.queries += len(batch)
+                for i, (_, fut) in enumerate(batch):
+                    fut.set_result(embs[i : i + 1])
+        finally:
+            self._fail_pending()
+
+    def _fail_pending(self) -> None:
+        """Fail every query still queued, so no caller waits forever."""
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if item is not _STOP and item[1].set_running_or_notify_cancel():
+                item[1].set_exception(RuntimeError("Embedding batcher is stopped"))
+
+    def stats(self) -> dict:
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "batches": self.batches,
+            "queries": self.queries,
+            "avg_batch_size": (self.queries / self.batches) if self.batches else 0.0,
+        }
+
+    def stop(self) -> None:
+        """Stop the batching thread; queued queries fail with RuntimeError."""
+        self._stopped = True
+        self._queue.put(_STOP)
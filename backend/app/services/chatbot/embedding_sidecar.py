@@ -0,0 +1,265 @@
+"""Query-embedding sidecar shared by several API worker processes.
+
+With `uvicorn --workers N` every worker would otherwise load its own copy of
+the embedding model. The sidecar loads it once and serves encode requests
+over a Unix domain socket; single-query requests from all workers are
+micro-batched into one model call by an EmbeddingBatcher. Start it next to
+the API, from the backend directory:
+
+    python -m app.services.chatbot.embedding_sidecar serve \\
+        --socket /tmp/casemate-embed.sock --backend torch
+
+and point the workers at it with CHATBOT_EMBED_SIDECAR=/tmp/casemate-embed.sock.
+
+Wire format, both directions: a 4-byte big-endian length, a JSON header of
+that length, then for responses carrying embeddings the float32 rows
+(shape given by the header). Requests are {"op": "encode", "texts": [...]}
+or {"op": "info"}.
+"""
+
+import argparse
+import json
+import logging
+import os
+import socket
+import socketserver
+import struct
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .embedding_backends import BACKENDS, load_backend
+from .embedding_batcher import EmbeddingBatcher
+
+logger = logging.getLogger(__name__)
+
+_LEN = struct.Struct(">I")
+# a header or text batch this large is a protocol error, not a request
+_MAX_HEADER_BYTES = 16 * 1024 * 1024
+
+
+class SidecarUnavailable(ConnectionError):
+    """The sidecar could not be reached (not started, crashed, timed out)."""
+
+
+def _recv_exact(sock: socket.socket, n: int) -> bytearray:
+    buf = bytearray(n)
+    view = memoryview(buf)
+    got = 0
+    while got < n:
+        chunk = sock.recv_into(view[got:], n - got)
+        if not chunk:
+            raise ConnectionError("connection closed")
+        got += chunk
+    return buf
+
+
+def send_message(
+    sock: socket.socket, header: Dict[str, Any], payload: bytes = b""
+) -> None:
+    data = json.dumps(header).encode("utf-8")
+    sock.sendall(_LEN.pack(len(data)) + data + payload)
+
+
+def recv_header(sock: socket.socket) -> Dict[str, Any]:
+    (n,) = _LEN.unpack(_recv_exact(sock, _LEN.size))
+    if n > _MAX_HEADER_BYTES:
+        raise ConnectionError(f"header of {n} bytes exceeds the limit")
+    return json.loads(_recv_exact(sock, n))
+
+
+def recv_array(sock: socket.socket, shape: List[int]) -> np.ndarray:
+    rows, dim = shape
+    # a bytearray, so the rows are writable (callers normalize in place)
+    data = _recv_exact(sock, rows * dim * 4)
+    return np.frombuffer(data, dtype="float32").reshape(rows, dim)
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    server: "EmbeddingSidecar"
+
+    def handle(self) -> None:
+        # one connection per client thread, kept open for many requests
+        while True:
+            try:
+                request = recv_header(self.request)
+            except (ConnectionError, OSError, ValueError):
+                return
+            try:
+                header, payload = self.server.dispatch(request)
+            except Exception as e:
+                logger.error("❌ Sidecar request failed: %s", e)
+                header, payload = {"ok": False, "error": str(e)}, b""
+            try:
+                send_message(self.request, header, payload)
+            except OSError:
+                return
+
+
+class EmbeddingSidecar(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(
+        self,
+        socket_path: Path,
+        backend: Any,
+        max_batch_size: int = 32,
+        max_wait_ms: float = 2.0,
+    ):
+        self.socket_path = Path(socket_path)
+        if self.socket_path.exists():
+            self.socket_path.unlink()  # stale socket from a previous run
+        self.backend = backend
+        # one model call at a time, whether from the batcher or a multi-text
+        # request (those are batches already and skip the batcher)
+        self._encode_lock = threading.Lock()
+        self.batcher = EmbeddingBatcher(
+            self._encode, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms
+        )
+        self.requests = 0
+        self.texts = 0
+        self.started = time.time()
+        super().__init__(str(self.socket_path), _Handler)
+
+    def dispatch(self, request: Dict[str, Any]) -> Tuple[Dict[str, Any], bytes]:
+        op = request.get("op")
+        if op == "info":
+            return {"ok": True, **self.info()}, b""
+        if op != "encode":
+            raise ValueError(f"unknown op {op!r}")
+        texts = request.get("texts") or []
+        if len(texts) == 1:
+            emb = self.batcher.encode(texts[0])
+        else:
+            emb = self._encode(texts)
+        emb = np.ascontiguousarray(emb, dtype="float32")
+        self.requests += 1
+        self.texts += len(texts)
+        return {"ok": True, "shape": list(emb.shape)}, emb.tobytes()
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        with self._encode_lock:
+            return self.backend.encode(texts)
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "pid": os.getpid(),
+            "backend": getattr(self.backend, "name", type(self.backend).__name__),
+            "dim": int(self.backend.dim),
+            "requests": self.requests,
+            "texts": self.texts,
+            "uptime_s": round(time.time() - self.started, 1),
+            "batcher": self.batcher.stats(),
+        }
+
+    def server_close(self) -> None:
+        super().server_close()
+        self.batcher.stop()
+        try:
+            self.socket_path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+class SidecarBackend:
+    """Embedding backend that forwards encode() to a running sidecar.
+
+    Has the same interface as the in-process backends (name, dim, encode).
+    Each thread keeps its own connection (reopened after a fork); a broken
+    one is reopened once before SidecarUnavailable is raised.
+    """
+
+    def __init__(self, socket_path: Path, timeout: float = 10.0):
+        self.socket_path = Path(socket_path)
+        self.timeout = timeout
+        self._local = threading.local()
+        # a forked child must not talk over its parent's connections
+        os.register_at_fork(after_in_child=self._drop_connections)
+        info = self.info()
+        self.dim = int(info["dim"])
+        self.name = f"sidecar:{info['backend']}"
+
+    def _drop_connections(self) -> None:
+        self._local = threading.local()
+
+    def _connect(self) -> socket.socket:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(str(self.socket_path))
+        except OSError:
+            sock.close()
+            raise
+        return sock
+
+    def _call(self, request: Dict[str, Any]) -> Tuple[Dict[str, Any], Any]:
+        for attempt in (0, 1):
+            sock: Optional[socket.socket] = getattr(self._local, "sock", None)
+            try:
+                if sock is None:
+                    sock = self._local.sock = self._connect()
+                send_message(sock, request)
+                header = recv_header(sock)
+                payload = (
+                    recv_array(sock, header["shape"]) if "shape" in header else None
+                )
+            except (OSError, ValueError) as e:
+                if sock is not None:
+                    sock.close()
+                self._local.sock = None
+                if attempt:
+                    raise SidecarUnavailable(
+                        f"embedding sidecar at {self.socket_path}: {e}"
+                    ) from e
+                continue
+            if not header.get("ok"):
+                # reachable but the request failed: not a reason to fall back
+                raise RuntimeError(f"embedding sidecar: {header.get('error')}")
+            return header, payload
+        raise AssertionError("unreachable")
+
+    def info(self) -> Dict[str, Any]:
+        return self._call({"op": "info"})[0]
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        return self._call({"op": "encode", "texts": list(texts)})[1]
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    s = sub.add_parser("serve", help="load the model and serve the socket")
+    s.add_argument("--socket", type=Path, default=Path("/tmp/casemate-embed.sock"))
+    s.add_argument("--backend", choices=BACKENDS, default="torch")
+    s.add_argument("--model", default="all-MiniLM-L6-v2")
+    s.add_argument(
+        "--onnx-dir", type=Path, default=Path("app/services/chatbot/data/onnx")
+    )
+    s.add_argument("--batch-size", type=int, default=32)
+    s.add_argument("--wait-ms", type=float, default=2.0)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    backend = load_backend(args.backend, args.model, args.onnx_dir)
+    server = EmbeddingSidecar(
+        args.socket, backend, max_batch_size=args.batch_size, max_wait_ms=args.wait_ms
+    )
+    logger.info(
+        "✓ Embedding sidecar (%s, dim %s) listening on %s",
+        args.backend,
+        backend.dim,
+        args.socket,
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+"""Offline builder for the legal-corpus FAISS index.
+
+Produces a flat (exhaustive), IVF-Flat, IVF-PQ or HNSW index from the corpus
+and writes a sidecar manifest (<index>.json) recording how it was built and the
+default query-time parameters (nprobe / efSearch). Run from the backend dir:
+
+    python -m app.services.chatbot.index_builder build --type hnsw \\
+        --jsonl app/services/chatbot/data/processed_bd_law.jsonl \\
+        --out app/services/chatbot/data/faiss_index.index
+"""
+
+import argparse
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+import faiss
+
+from .doc_store import DocStore, extract_meta, iter_jsonl
+
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+MANIFEST_SUFFIX = ".json"
+
+
+def manifest_path(index_path: Path) -> Path:
+    return Path(str(index_path) + MANIFEST_SUFFIX)
+
+
+def read_manifest(index_path: Path) -> Dict[str, Any]:
+    p = manifest_path(index_path)
+    if not p.exists():
+        return {}
+    with p.open("r", encoding="utf-8") as fh:
+        return json.load(fh)
+
+
+def write_manifest(index_path: Path, manifest: Dict[str, Any]) -> None:
+    """Atomically replace the manifest, so readers never see a partial file.
+
+    Write it before replacing the index it describes: its "count" must match
+    the index, and validate_snapshot rejects an index paired with a manifest
+    written for another one.
+    """
+    p = manifest_path(index_path)
+    tmp = p.with_name(p.name + ".tmp")
+    with tmp.open("w", encoding="utf-8") as fh:
+        json.dump(manifest, fh, indent=2)
+    os.replace(tmp, p)
+
+
+def doc_embed_text(doc: Dict) -> str:
+    """Text that represents a corpus record in the embedding space."""
+    text = doc.get("_text_for_embed") or doc.get("text")
+    if text:
+        return text
+    meta = extract_meta(doc)
+    inner = doc.get("meta") if isinstance(doc.get("meta"), dict) else doc
+    header = " | ".join(v for v in meta.values() if v)
+    return f"{header}\n\n{inner.get('clean_section_description') or ''}"
+
+
+def embed_texts(
+    model, texts: List[str], batch_size: int = 64, show_progress: bool = True
+) -> np.ndarray:
+    emb = model.encode(
+        texts,
+        batch_size=batch_size,
+        convert_to_numpy=True,
+        show_progress_bar=show_progress,
+    ).astype("float32")
+    faiss.normalize_L2(emb)
+    return emb
+
+
+def embed_corpus(
+    docs: Iterable[Dict], model_name: str, batch_size: int = 64
+) -> np.ndarray:
+    from sentence_transformers import SentenceTransformer
+
+    model = SentenceTransformer(model_name)
+    return embed_texts(model, [doc_embed_text(d) for d in docs], batch_size=batch_size)
+
+
+def build_index(
+    emb: np.ndarray,
+    index_type: str = "flat",
+    nlist: int = 256,
+    pq_m: int = 32,
+    pq_nbits: int = 8,
+    hnsw_m: int = 32,
+    ef_construction: int = 200,
+) -> tuple:
+    """Build an inner-product index over L2-normalized embeddings.
+
+    Returns (index, params) where params are the effective build parameters.
+    """
+    if index_type not in INDEX_TYPES:
+        raise ValueError(
+            f"Unknown index type {index_type!r}, expected one of {INDEX_TYPES}"
+        )
+    n, d = emb.shape
+    params: Dict[str, Any] = {}
+    metric = faiss.METRIC_INNER_PRODUCT
+
+    if index_type == "flat":
+        index = faiss.IndexFlatIP(d)
+    elif index_type in ("ivf_flat", "ivf_pq"):
+        # faiss wants ~39 training points per centroid, both for the coarse
+        # quantizer (nlist centroids) and each PQ sub-quantizer (2**nbits)
+        max_centroids = max(1, n // 39)
+        nlist = max(1, min(nlist, max_centroids))
+        quantizer = faiss.IndexFlatIP(d)
+        if index_type == "ivf_flat":
+            index = faiss.IndexIVFFlat(quantizer, d, nlist, metric)
+        else:
+            if d % pq_m != 0:
+                raise ValueError(f"pq_m={pq_m} must divide embedding dim {d}")
+            pq_nbits = max(1, min(pq_nbits, int(np.log2(max_centroids))))
+            index = faiss.IndexIVFPQ(quantizer, d, nlist, pq_m, pq_nbits, metric)
+            params.update(pq_m=pq_m, pq_nbits=pq_nbits)
+        index.train(emb)
+        params["nlist"] = nlist
+    else:
+        index = faiss.IndexHNSWFlat(d, hnsw_m, metric)
+        index.hnsw.efConstruction = ef_construction
+        params.update(hnsw_m=hnsw_m, ef_construction=ef_construction)
+
+    index.add(emb)
+    return index, params
+
+
+def search_params(
+    index: faiss.Index,
+    nprobe: Optional[int] = None,
+    ef_search: Optional[int] = None,
+    sel: Optional[faiss.IDSelector] = None,
+) -> Optional[faiss.SearchParameters]:
+    """Per-query search parameters for the index type, or None if not applicable.
+
+    sel restricts the search to the selected ids (doc rows); IndexIDMap
+    translates it to its internal ids itself.
+    """
+    base = index
+    if isinstance(base, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+        base = faiss.downcast_index(base.index)
+    extra: Dict[str, Any] = {"sel": sel} if sel is not None else {}
+    # parameter objects carry their own defaults, so fall back to the index's
+    if isinstance(base, faiss.IndexIVF) and (nprobe or sel is not None):
+        extra["nprobe"] = int(nprobe or base.nprobe)
+        return faiss.SearchParametersIVF(**extra)
+    if isinstance(base, faiss.IndexHNSW) and (ef_search or sel is not None):
+        extra["efSearch"] = int(ef_search or base.hnsw.efSearch)
+        return faiss.SearchParametersHNSW(**extra)
+    if sel is not None:
+        return faiss.SearchParameters(sel=sel)
+    return None
+
+
+def build_manifest(
+    index: faiss.Index,
+    index_type: str,
+    params: Dict[str, Any],
+    model_name: str,
+    source: str,
+    nprobe: int,
+    ef_search: int,
+) -> Dict[str, Any]:
+    manifest: Dict[str, Any] = {
+        "index_type": index_type,
+        "dim": index.d,
+        "count": int(index.ntotal),
+        "metric": "inner_product",
+        "normalized": True,
+        "embed_model": model_name,
+        "source": source,
+        "build_params": params,
+        "built_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "search_defaults": {},
+    }
+    if index_type.startswith("ivf"):
+        manifest["search_defaults"]["nprobe"] = min(nprobe, params["nlist"])
+    elif index_type == "hnsw":
+        manifest["search_defaults"]["ef_search"] = ef_search
+    return manifest
+
+
+def load_corpus(jsonl: Optional[Path], store: Optional[Path]) -> List[Dict]:
+    if store is not None:
+        return list(DocStore(store))
+    if jsonl is None:
+        raise SystemExit("either --jsonl or --store is required")
+    return list(iter_jsonl(jsonl))
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    from .chatbot_service import EMBED_MODEL
+
+    parser = argparse.ArgumentParser(description="Build the chatbot FAISS index")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("build", help="embed the corpus and build an index")
+    b.add_argument("--jsonl", type=Path)
+    b.add_argument("--store", type=Path, help="doc store dir (instead of --jsonl)")
+    b.add_argument("--embeddings", type=Path, help="reuse/save embeddings (.npy)")
+    b.add_argument("--out", type=Path, required=True)
+    b.add_argument("--type", choices=INDEX_TYPES, default="flat")
+    b.add_argument("--model", default=EMBED_MODEL)
+    b.add_argument("--batch-size", type=int, default=64)
+    b.add_argument("--nlist", type=int, default=256)
+    b.add_argument("--pq-m", type=int, default=32)
+    b.add_argument("--pq-nbits", type=int, default=8)
+    b.add_argument("--hnsw-m", type=int, default=32)
+    b.add_argument("--ef-construction", type=int, default=200)
+    b.add_argument("--nprobe", type=int, default=16)
+    b.add_argument("--ef-search", type=int, default=64)
+    b.add_argument("--bm25", type=Path, help="also build the BM25 index here")
+    args = parser.parse_args(argv)
+
+    docs: Optional[List[Dict]] = None
+    if args.embeddings is not None and args.embeddings.exists():
+        emb = np.load(args.embeddings).astype("float32")
+        print(f"✓ Loaded {len(emb)} embeddings from {args.embeddings}")
+    else:
+        docs = load_corpus(args.jsonl, args.store)
+        print(f"🔄 Embedding {len(docs)} docs with {args.model}...")
+        emb = embed_corpus(docs, args.model, batch_size=args.batch_size)
+        if args.embeddings is not None:
+            np.save(args.embeddings, emb)
+
+    t0 = time.perf_counter()
+    index, params = build_index(
+        emb,
+        args.type,
+        nlist=args.nlist,
+        pq_m=args.pq_m,
+        pq_nbits=args.pq_nbits,
+        hnsw_m=args.hnsw_m,
+        ef_construction=args.ef_construction,
+    )
+    params["build_seconds"] = round(time.perf_counter() - t0, 3)
+
+    args.out.parent.mkdir(parents=True, exist_ok=True)
+    source = str(args.store or args.jsonl or args.embeddings)
+    manifest = build_manifest(
+        index, args.type, params, args.model, source, args.nprobe, args.ef_search
+    )
+    # servers may have the old index mmap'd; replace it instead of overwriting
+    tmp = args.out.with_name(args.out.name + ".tmp")
+    faiss.write_index(index, str(tmp))
+    write_manifest(args.out, manifest)
+    os.replace(tmp, args.out)
+    print(f"✓ Wrote {args.type} index ({index.ntotal} vectors) to {args.out}")
+
+    if args.bm25 is not None:
+        from .bm25 import build_bm25
+
+        if docs is None:
+            docs = load_corpus(args.jsonl, args.store)
+        bm25 = build_bm25(docs, args.bm25)
+        print(f"✓ Wrote BM25 index ({len(bm25.vocab)} terms) to {args.bm25}")
+
+
+if __name__ == "__main__":
+    main()
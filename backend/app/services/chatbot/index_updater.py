@@ -0,0 +1,249 @@
+"""Apply new, amended and removed law sections to an existing index.
+
+FAISS ids are doc-store row numbers, so ids stay stable across updates:
+
+* new sections are appended to the doc store and only their embeddings are
+  computed and added to the index (add_with_ids);
+* an amended section is appended as a new row and its previous row is
+  tombstoned;
+* removed sections are tombstoned. Tombstoned ids are physically removed from
+  indexes that support it and always recorded in the manifest so retrieval
+  skips them (HNSW cannot delete vectors).
+
+Every run bumps the manifest version and appends to its update history.
+Run from the backend directory:
+
+    python -m app.services.chatbot.index_updater \\
+        --index app/services/chatbot/data/faiss_index.index \\
+        --store app/services/chatbot/data/doc_store \\
+        --upsert amended_sections.jsonl --delete removed_keys.txt \\
+        --bm25 app/services/chatbot/data/bm25
+
+With hybrid retrieval pass --bm25: the BM25 index is rebuilt from the store
+after the update, since its postings cannot be extended in place.
+"""
+
+import argparse
+import json
+import os
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+import numpy as np
+import faiss
+
+from .bm25 import BM25Index, build_bm25
+from .doc_store import DocStore, append_docs, extract_meta, iter_jsonl
+from .index_builder import (
+    doc_embed_text,
+    embed_texts,
+    read_manifest,
+    write_manifest,
+)
+
+
+def section_key(law_title: str, section_id: str) -> str:
+    """Stable identity of a law section across corpus versions."""
+    return f"{law_title.strip().lower()}::{section_id.strip().lower()}"
+
+
+def doc_key(doc: Dict) -> str:
+    """Identity used to match upserts and deletes: doc_id, else title + section."""
+    if doc.get("doc_id"):
+        return str(doc["doc_id"]).strip().lower()
+    meta = extract_meta(doc)
+    return section_key(meta["law_title"], meta["section_id"])
+
+
+def live_keys(store: DocStore, tombstones: Set[int]) -> Dict[str, int]:
+    """Map doc_key -> latest live row in the store."""
+    titles = store.column("law_title")
+    sids = store.column("section_id")
+    keys: Dict[str, int] = {}
+    for row in range(len(store)):
+        if row in tombstones:
+            continue
+        raw = store.raw(row)
+        # only records that carry a doc_id need parsing; the rest key by columns
+        if b'"doc_id"' in raw:
+            keys[doc_key(json.loads(raw))] = row
+        else:
+            keys[section_key(str(titles[row]), str(sids[row]))] = row
+    return keys
+
+
+def ensure_id_index(index: faiss.Index) -> faiss.Index:
+    """Return an index that accepts explicit ids (converting a plain flat index)."""
+    if isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2, faiss.IndexIVF)):
+        return index
+    if isinstance(index, faiss.IndexFlat):
+        # rows were added in doc order, so their implicit ids are the row numbers
+        wrapped = faiss.IndexIDMap2(faiss.IndexFlat(index.d, index.metric_type))
+        if index.ntotal:
+            wrapped.add_with_ids(
+                index.reconstruct_n(0, index.ntotal),
+                np.arange(index.ntotal, dtype="int64"),
+            )
+        return wrapped
+    # e.g. HNSW: only sequential adds are possible, ids must equal store rows
+    return index
+
+
+def add_vectors(index: faiss.Index, emb: np.ndarray, ids: np.ndarray) -> None:
+    if isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2, faiss.IndexIVF)):
+        index.add_with_ids(emb, ids)
+        return
+    if len(ids) and int(ids[0]) != index.ntotal:
+        raise RuntimeError(
+            f"Index has {index.ntotal} vectors but new rows start at {int(ids[0])}; "
+            "rebuild the index with index_builder"
+        )
+    index.add(emb)
+
+
+def remove_vectors(index: faiss.Index, ids: List[int]) -> int:
+    if not ids:
+        return 0
+    try:
+        return int(index.remove_ids(np.asarray(ids, dtype="int64")))
+    except RuntimeError:
+        # not supported by this index type; tombstones in the manifest cover it
+        return 0
+
+
+def apply_update(
+    index_path: Path,
+    store_path: Path,
+    upserts: List[Dict],
+    deletes: List[str],
+    model,
+    batch_size: int = 64,
+    bm25_path: Optional[Path] = None,
+) -> Dict:
+    """Apply upserts and deletes; also rebuild the BM25 index at bm25_path.
+
+    BM25 postings cannot be extended in place, so with hybrid retrieval pass
+    bm25_path: a BM25 index that covers fewer rows than the store is ignored
+    by the server (dense-only retrieval) until it is rebuilt.
+    """
+    index = ensure_id_index(faiss.read_index(str(index_path)))
+    manifest = read_manifest(index_path)
+    tombstones: Set[int] = set(manifest.get("tombstones", []))
+
+    store = DocStore(store_path)
+    keys = live_keys(store, tombstones)
+    first_row = len(store)
+    store.close()
+
+    # the same section twice in one batch: the last version wins
+    upserts = list({doc_key(d): d for d in upserts}.values())
+    # rows superseded by an upsert or explicitly deleted
+    retired = [keys[doc_key(d)] for d in upserts if doc_key(d) in keys]
+    retired += [keys[k.strip().lower()] for k in deletes if k.strip().lower() in keys]
+    retired = sorted(set(retired))
+
+    t0 = time.perf_counter()
+    new_rows = range(first_row, first_row + len(upserts))
+    if upserts:
+        # embed and add to the in-memory index before touching the store, so a
+        # failure leaves store and index files as they were
+        emb = embed_texts(
+            model,
+            [doc_embed_text(d) for d in upserts],
+            batch_size=batch_size,
+            show_progress=False,
+        )
+        add_vectors(index, emb, np.asarray(new_rows, dtype="int64"))
+        appended = append_docs(store_path, upserts)
+        if appended != new_rows:
+            raise RuntimeError(
+                f"Doc store changed during the update (rows {appended}, "
+                f"expected {new_rows})"
+            )
+    removed = remove_vectors(index, retired)
+    tombstones.update(retired)
+
+    bm25_rebuilt = False
+    if bm25_path is not None and upserts:
+        params = {}
+        if BM25Index.exists(bm25_path):
+            old = BM25Index(bm25_path)
+            params = {"k1": old.k1, "b": old.b}
+        store = DocStore(store_path)
+        build_bm25(store, bm25_path, **params)
+        store.close()
+        bm25_rebuilt = True
+
+    tmp = Path(str(index_path) + ".tmp")
+    faiss.write_index(index, str(tmp))
+
+    entry = {
+        "version": int(manifest.get("version", 0)) + 1,
+        "updated_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "added": len(new_rows),
+        "tombstoned": len(retired),
+        "physically_removed": removed,
+        "bm25_rebuilt": bm25_rebuilt,
+        "seconds": round(time.perf_counter() - t0, 3),
+    }
+    manifest.update(
+        version=entry["version"],
+        count=int(index.ntotal),
+        tombstones=sorted(tombstones),
+        id_mapped=True,
+    )
+    manifest.setdefault("history", []).append(entry)
+    # manifest first: until the index is replaced too, its count does not
+    # match and a reload rejects the pair instead of serving old tombstones
+    write_manifest(index_path, manifest)
+    os.replace(tmp, index_path)
+    return entry
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    from sentence_transformers import SentenceTransformer
+    from .chatbot_service import EMBED_MODEL
+
+    parser = argparse.ArgumentParser(description="Incrementally update the index")
+    parser.add_argument("--index", type=Path, required=True)
+    parser.add_argument("--store", type=Path, required=True)
+    parser.add_argument("--upsert", type=Path, help="JSONL of new/amended sections")
+    parser.add_argument(
+        "--delete", type=Path, help="file with one section key per line"
+    )
+    parser.add_argument(
+        "--bm25", type=Path, help="BM25 index to rebuild (required for hybrid)"
+    )
+    parser.add_argument("--model", default=EMBED_MODEL)
+    parser.add_argument("--batch-size", type=int, default=64)
+    args = parser.parse_args(argv)
+
+    if not DocStore.exists(args.store):
+        raise SystemExit(
+            f"No doc store at {args.store}; build one with "
+            "`python -m app.services.chatbot.doc_store build`"
+        )
+    upserts = list(iter_jsonl(args.upsert)) if args.upsert else []
+    deletes = (
+        [l for l in args.delete.read_text(encoding="utf-8").splitlines() if l.strip()]
+        if args.delete
+        else []
+    )
+    entry = apply_update(
+        args.index,
+        args.store,
+        upserts,
+        deletes,
+        SentenceTransformer(args.model),
+        batch_size=args.batch_size,
+        bm25_path=args.bm25,
+    )
+    print(
+        f"✓ Index v{entry['version']}: +{entry['added']} sections, "
+        f"{entry['tombstoned']} tombstoned in {entry['seconds']}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+import os
+import asyncio
+import threading
+from concurrent.futures import (
+    Executor,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+)
+from typing import Any, Callable, Optional
+
+# Chatbot inference (embedding, FAISS search, Groq call) is blocking, so it runs
+# on a dedicated pool instead of the event loop. The pool is separate from the
+# default asyncio executor so chat traffic cannot starve the DB helpers that use
+# asyncio.to_thread (auth, appointments, wallet, ...).
+EXECUTOR_KIND = os.environ.get("CHATBOT_EXECUTOR", "thread").lower()
+MAX_WORKERS = int(os.environ.get("CHATBOT_WORKERS", "4"))
+# how many requests may wait for a free worker before we start rejecting
+MAX_QUEUE = int(os.environ.get("CHATBOT_MAX_QUEUE", "16"))
+
+
+class InferenceQueueFull(Exception):
+    """Raised when the inference pool and its wait queue are both full."""
+
+
+def _init_process_worker() -> None:
+    # each worker process loads its own copy of the model and index up front
+    from .chatbot_service import initialize
+
+    initialize()
+
+
+class InferenceExecutor:
+    def __init__(
+        self,
+        kind: str = EXECUTOR_KIND,
+        max_workers: int = MAX_WORKERS,
+        max_queue: int = MAX_QUEUE,
+    ):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unknown executor kind: {kind}")
+        self.kind = kind
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max(0, max_queue)
+        self._pool: Optional[Executor] = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self.rejected = 0
+
+    def _get_pool(self) -> Executor:
+        if self._pool is None:
+            if self.kind == "process":
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.max_workers, initializer=_init_process_worker
+                )
+            else:
+                self._pool = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="chatbot"
+                )
+        return self._pool
+
+    @property
+    def capacity(self) -> int:
+        return self.max_workers + self.max_queue
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    async def run(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Run fn(*args, **kwargs) on the pool, or raise InferenceQueueFull."""
+        with self._lock:
+            if self._in_flight >= self.capacity:
+                self.rejected += 1
+                raise InferenceQueueFull(
+                    f"Chatbot is busy ({self._in_flight} requests in flight)"
+                )
+            self._in_flight += 1
+        try:
+            future = self._get_pool().submit(fn, *args, **kwargs)
+        except BaseException:
+            self._release()
+            raise
+        # the slot is held until the pool is done with the work, not until the
+        # caller stops waiting: a cancelled request (client went away) leaves
+        # its call running, and only a still-queued call is cancelled with it
+        future.add_done_callback(self._release)
+        return await asyncio.wrap_future(future)
+
+    def _release(self, _future: Optional[Future] = None) -> None:
+        with self._lock:
+            self._in_flight -= 1
+
+    async def broadcast(self, fn: Callable[..., Any], *args: Any) -> list:
+        """Run fn once per worker slot at the same time, e.g. to warm a process pool.
+
+        Concurrent calls make the pool start all its processes, but which
+        process runs each call is up to the pool, so this is best-effort.
+        """
+        return await asyncio.gather(
+            *(self.run(fn, *args) for _ in range(self.max_workers))
+        )
+
+    def worker_pids(self) -> set:
+        """Pids of the pool's live worker processes (empty for a thread pool)."""
+        pool = self._pool
+        if self.kind != "process" or pool is None:
+            return set()
+        return set(getattr(pool, "_processes", None) or ())
+
+    def recycle(self) -> None:
+        """Replace the process pool so new workers load the resources from disk.
+
+        Queued and running calls finish on the old workers. A thread pool shares
+        the parent's resources and is left alone.
+        """
+        if self.kind != "process":
+            return
+        from .telemetry import process_exited
+
+        with self._lock:
+            old, self._pool = self._pool, None
+        if old is not None:
+            pids = list(getattr(old, "_processes", None) or ())
+            old.shutdown(wait=False)
+            # their breaker gauges would otherwise be reported forever
+            for pid in pids:
+                process_exited(pid)
+
+    def stats(self) -> dict:
+        return {
+            "kind": self.kind,
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "in_flight": self._in_flight,
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self, wait: bool = True) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=wait)
+            self._pool = None
+
+
+inference_executor = InferenceExecutor()
@@ -0,0 +1,250 @@
+"""Route a question to "greeting", "capability" or "legal" before retrieval.
+
+Two stages:
+
+* phrase patterns (greetings, "who are you", ...) compiled into one
+  Aho-Corasick automaton, so a question is scanned once whatever the number
+  of patterns; matches must sit on word boundaries
+* questions no pattern settles are compared with per-intent centroids of a
+  few embedded example questions, using the query embedding that retrieval
+  needs anyway; anything not clearly a greeting or capability question is
+  legal, so a doubtful question still gets the RAG pipeline
+
+Greetings are answered from canned replies without an LLM call.
+"""
+
+import re
+import threading
+from collections import deque
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+GREETING, CAPABILITY, LEGAL = "greeting", "capability", "legal"
+
+GREETING_PHRASES = {
+    "hi": "hello",
+    "hello": "hello",
+    "hey": "hello",
+    "good morning": "good morning",
+    "good afternoon": "good afternoon",
+    "good evening": "good evening",
+    "assalamualaikum": "salam",
+    "assalamu alaikum": "salam",
+    "salam": "salam",
+    "thanks": "thanks",
+    "thank you": "thanks",
+}
+CAPABILITY_PHRASES = [
+    "who are you",
+    "what are you",
+    "what is your name",
+    "introduce yourself",
+    "what can you do",
+    "what do you do",
+    "how can you help",
+    "can you help",
+    "what is this",
+    "what is legalbot",
+    "tell me about yourself",
+]
+
+_INTRO = (
+    "I'm LegalBot, your AI legal assistant for Bangladesh law. Ask me about "
+    "a law, a section or your situation and I'll point you to the relevant "
+    "provisions."
+)
+CANNED_REPLIES = {
+    "hello": f"Hello! {_INTRO} How can I help you today?",
+    "good morning": f"Good morning! {_INTRO} How can I help you today?",
+    "good afternoon": f"Good afternoon! {_INTRO} How can I help you today?",
+    "good evening": f"Good evening! {_INTRO} How can I help you today?",
+    "salam": f"Wa alaikum assalam! {_INTRO} How can I help you today?",
+    "thanks": (
+        "You're welcome! If you have another legal question, just ask. For "
+        "advice on your specific case, please consult a qualified lawyer."
+    ),
+}
+
+# greeting examples by the canned reply that answers them
+GREETING_EXAMPLES = {
+    "hello": ["hello there", "hey, how are you", "nice to meet you"],
+    "good morning": ["hi, good morning"],
+    "thanks": ["thanks a lot", "thank you so much for the help"],
+}
+
+# example questions whose embedding centroids stand for each intent
+INTENT_EXAMPLES = {
+    GREETING: [text for texts in GREETING_EXAMPLES.values() for text in texts],
+    CAPABILITY: [
+        "what kind of questions can you answer",
+        "are you a lawyer or a bot",
+        "which laws do you know about",
+        "how does this legal assistant work",
+        "what services do you provide",
+    ],
+    LEGAL: [
+        "what is the punishment for theft",
+        "how do I file a case for a land dispute",
+        "can my landlord evict me without notice",
+        "what are my rights if I am arrested",
+        "how is property divided under inheritance law",
+        "section 302 of the penal code",
+    ],
+}
+
+# a question mentioning any of these is legal, whatever else it contains
+# ("hi, section 302?", "what is this section about", "can you explain bail?")
+LEGAL_HINTS = frozenset(
+    "act acts article bail case code contract court crime divorce dowry evidence "
+    "law laws lawyer land landlord legal ordinance penal penalty property "
+    "punishment right rights rule section sections sue tenant theft".split()
+)
+
+# after a leading greeting, this many more words still make it a greeting
+_GREETING_TAIL_WORDS = 2
+# a capability phrase settles the question only if little else is asked
+_CAPABILITY_EXTRA_WORDS = 4
+
+_WORD_RE = re.compile(r"\w+")
+
+
+class PhraseAutomaton:
+    """Aho-Corasick matcher for a fixed set of phrases."""
+
+    def __init__(self, phrases: Dict[str, str]):
+        # phrase -> label; states are trie nodes
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[Tuple[str, int]]] = [[]]  # (label, phrase length)
+        for phrase, label in phrases.items():
+            state = 0
+            for ch in phrase:
+                nxt = self._goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[state][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                state = nxt
+            self._out[state].append((label, len(phrase)))
+
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                f = self._fail[state]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                fail = self._goto[f].get(ch, 0)
+                self._fail[nxt] = fail if fail != nxt else 0
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def find(self, text: str) -> List[Tuple[int, int, str]]:
+        """(start, end, label) of every whole-word phrase occurrence in text."""
+        matches = []
+        state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(ch, 0)
+            for label, length in self._out[state]:
+                start, end = i + 1 - length, i + 1
+                if (start == 0 or not text[start - 1].isalnum()) and (
+                    end == len(text) or not text[end].isalnum()
+                ):
+                    matches.append((start, end, label))
+        return matches
+
+
+class IntentRouter:
+    def __init__(self, min_similarity: float = 0.5, margin: float = 0.05):
+        self.min_similarity = min_similarity
+        self.margin = margin
+        phrases = {p: f"{GREETING}:{key}" for p, key in GREETING_PHRASES.items()}
+        phrases.update({p: CAPABILITY for p in CAPABILITY_PHRASES})
+        self._automaton = PhraseAutomaton(phrases)
+        self._labels: List[str] = []
+        self._centroids: Optional[np.ndarray] = None
+        # unit greeting example embeddings, to pick the canned reply
+        self._greetings: Optional[np.ndarray] = None
+        self._greeting_keys: List[str] = []
+        self._lock = threading.Lock()
+
+    @property
+    def fitted(self) -> bool:
+        return self._centroids is not None
+
+    def fit(self, encode_fn: Callable[[List[str]], np.ndarray]) -> None:
+        """Embed INTENT_EXAMPLES once and keep one unit centroid per intent."""
+        with self._lock:
+            if self._centroids is not None:
+                return
+            labels = list(INTENT_EXAMPLES)
+            rows = []
+            for label in labels:
+                emb = np.asarray(encode_fn(INTENT_EXAMPLES[label]), dtype="float32")
+                emb /= np.linalg.norm(emb, axis=1, keepdims=True) + 1e-12
+                centroid = emb.mean(axis=0)
+                rows.append(centroid / (np.linalg.norm(centroid) + 1e-12))
+                if label == GREETING:
+                    self._greetings = emb
+            self._greeting_keys = [
+                key for key, texts in GREETING_EXAMPLES.items() for _ in texts
+            ]
+            self._labels = labels
+            self._centroids = np.vstack(rows)
+
+    def match(self, question: str) -> Tuple[Optional[str], Optional[str]]:
+        """Phrase stage: (intent, canned reply key), or (None, None) if unsettled.
+
+        A question with a legal hint word is settled as legal here, so the
+        embedding stage never routes it away from retrieval.
+        """
+        text = question.strip().lower()
+        words = _WORD_RE.findall(text)
+        if not words:
+            return None, None
+        if any(w in LEGAL_HINTS for w in words):
+            return LEGAL, None
+        for start, end, label in self._automaton.find(text):
+            if label.startswith(GREETING) and start == 0:
+                if len(_WORD_RE.findall(text[end:])) <= _GREETING_TAIL_WORDS:
+                    return GREETING, label.split(":", 1)[1]
+            elif label == CAPABILITY:
+                phrase_words = len(_WORD_RE.findall(text[start:end]))
+                greeting_words = self._leading_greeting_words(text)
+                extra = len(words) - phrase_words - greeting_words
+                if extra <= _CAPABILITY_EXTRA_WORDS:
+                    return CAPABILITY, None
+        return None, None
+
+    def _leading_greeting_words(self, text: str) -> int:
+        for start, end, label in self._automaton.find(text):
+            if start == 0 and label.startswith(GREETING):
+                return len(_WORD_RE.findall(text[:end]))
+        return 0
+
+    def nearest(self, emb: np.ndarray) -> Tuple[str, Optional[str]]:
+        """Embedding stage: (intent, canned reply key) of the centroid that
+        clearly wins, else (legal, None)."""
+        if self._centroids is None:
+            return LEGAL, None
+        q = np.asarray(emb, dtype="float32").reshape(-1)
+        q = q / (np.linalg.norm(q) + 1e-12)
+        sims = self._centroids @ q
+        order = np.argsort(-sims)
+        best, runner_up = order[0], order[1]
+        label = self._labels[best]
+        if (
+            label == LEGAL
+            or sims[best] < self.min_similarity
+            or sims[best] - sims[runner_up] < self.margin
+        ):
+            return LEGAL, None
+        if label == GREETING and self._greetings is not None:
+            # the reply of the closest greeting example ("thanks" -> thanks)
+            return label, self._greeting_keys[int(np.argmax(self._greetings @ q))]
+        return label, None
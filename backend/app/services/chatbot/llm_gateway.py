@@ -0,0 +1,338 @@
+"""Single entry point for every Groq chat completion the chatbot makes.
+
+* caps concurrent upstream calls (sync and async share the same limit)
+* per-call timeout, retries with jittered exponential backoff on 429 / 5xx /
+  connection errors, honouring Retry-After
+* circuit breaker: after `failure_threshold` consecutive failed calls the
+  gateway fails fast for `reset_timeout` seconds, then lets one trial call
+  through (half-open) and closes again if it succeeds
+
+Failures surface as LLMUnavailable so callers can serve a degraded answer
+instead of retrying the upstream themselves. base_url points the clients at
+another OpenAI-compatible server, e.g. benchmarks/stub_llm_server.py.
+"""
+
+import asyncio
+import logging
+import random
+import threading
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import groq
+from groq import AsyncGroq, Groq
+
+logger = logging.getLogger(__name__)
+
+
+class LLMUnavailable(Exception):
+    """The completion could not be produced (upstream errors or open circuit)."""
+
+
+class CircuitOpen(LLMUnavailable):
+    pass
+
+
+class CircuitBreaker:
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self.times_opened = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if (
+                self._state == self.OPEN
+                and time.monotonic() - self._opened_at >= self.reset_timeout
+            ):
+                return self.HALF_OPEN
+            return self._state
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if time.monotonic() - self._opened_at < self.reset_timeout:
+                return False
+            # half-open: a single trial call decides whether to close again
+            if self._trial_in_flight:
+                return False
+            self._state = self.HALF_OPEN
+            self._trial_in_flight = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def record_neutral(self) -> None:
+        """The call ended without telling us anything about upstream health."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._state == self.HALF_OPEN or (
+                self._state == self.CLOSED and self._failures >= self.failure_threshold
+            ):
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self.times_opened += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self._failures,
+            "times_opened": self.times_opened,
+        }
+
+
+def _is_retriable(exc: Exception) -> bool:
+    if isinstance(exc, (groq.APIConnectionError, groq.APITimeoutError)):
+        return True
+    if isinstance(exc, groq.APIStatusError):
+        return exc.status_code == 429 or exc.status_code >= 500
+    return False
+
+
+def _retry_after(exc: Exception) -> Optional[float]:
+    response = getattr(exc, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class LLMGateway:
+    def __init__(
+        self,
+        api_key: str,
+        base_url: Optional[str] = None,
+        max_concurrency: int = 8,
+        timeout: float = 30.0,
+        max_retries: int = 2,
+        backoff_base: float = 0.5,
+        backoff_max: float = 8.0,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+    ):
+        # retries are ours, so the SDK's own are disabled
+        self.client = Groq(
+            api_key=api_key, base_url=base_url, timeout=timeout, max_retries=0
+        )
+        self.async_client = AsyncGroq(
+            api_key=api_key, base_url=base_url, timeout=timeout, max_retries=0
+        )
+        self.max_concurrency = max(1, max_concurrency)
+        self.timeout = timeout
+        self.max_retries = max(0, max_retries)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+        # async callers queue here instead of parking executor threads on _slots
+        self._async_slots: Optional[asyncio.Semaphore] = None
+        self._async_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self.calls = 0
+        self.successes = 0
+        self.failures = 0
+        self.retries = 0
+        self.rejected = 0
+        self._latency_total = 0.0
+
+    def _backoff(self, attempt: int, exc: Exception) -> float:
+        hinted = _retry_after(exc)
+        if hinted is not None:
+            return min(hinted, self.backoff_max)
+        # "full jitter": spreads retries of concurrent callers apart
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2**attempt))
+
+    def _admit(self) -> None:
+        with self._lock:
+            self.calls += 1
+        if not self.breaker.allow():
+            with self._lock:
+                self.rejected += 1
+            raise CircuitOpen("LLM circuit breaker is open")
+
+    def _finish(self, ok: bool, t0: float, counts_for_breaker: bool = True) -> None:
+        with self._lock:
+            self._latency_total += time.perf_counter() - t0
+            if ok:
+                self.successes += 1
+            else:
+                self.failures += 1
+        if ok:
+            self.breaker.record_success()
+        elif counts_for_breaker:
+            self.breaker.record_failure()
+        else:
+            # e.g. a 400 for this prompt says nothing about upstream health
+            self.breaker.record_neutral()
+
+    def _acquire(self) -> None:
+        if not self._slots.acquire(timeout=self.timeout):
+            raise LLMUnavailable("Timed out waiting for a free LLM slot")
+        with self._lock:
+            self._in_flight += 1
+
+    def _release(self) -> None:
+        with self._lock:
+            self._in_flight -= 1
+        self._slots.release()
+
+    def _loop_slots(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._async_loop is not loop:
+            # an asyncio.Semaphore belongs to one event loop
+            self._async_slots = asyncio.Semaphore(self.max_concurrency)
+            self._async_loop = loop
+        return self._async_slots
+
+    async def _aacquire(self) -> asyncio.Semaphore:
+        """Async _acquire: wait on the loop's semaphore, then take a shared slot.
+
+        Callers on the loop wait without holding a thread. The thread slot is
+        still taken so sync and async calls share one limit; it is only busy
+        here when sync callers hold slots, and is then polled, not waited on.
+        """
+        deadline = time.monotonic() + self.timeout
+        slots = self._loop_slots()
+        try:
+            await asyncio.wait_for(slots.acquire(), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            raise LLMUnavailable("Timed out waiting for a free LLM slot") from None
+        try:
+            while not self._slots.acquire(blocking=False):
+                if time.monotonic() >= deadline:
+                    raise LLMUnavailable("Timed out waiting for a free LLM slot")
+                await asyncio.sleep(0.01)
+        except BaseException:
+            slots.release()
+            raise
+        with self._lock:
+            self._in_flight += 1
+        return slots
+
+    def complete(
+        self, messages: List[Dict], model: str, temperature: Optional[float] = None
+    ) -> str:
+        """Blocking chat completion; returns the message content (may be "")."""
+        self._admit()
+        kwargs: Dict[str, Any] = {"messages": messages, "model": model}
+        if temperature is not None:
+            kwargs["temperature"] = temperature
+        t0 = time.perf_counter()
+        attempt = 0
+        while True:
+            self._acquire_or_fail(t0)
+            try:
+                resp = self.client.chat.completions.create(**kwargs)
+            except Exception as e:
+                delay = self._retry_or_raise(e, attempt, t0)
+            else:
+                self._finish(True, t0)
+                return getattr(resp.choices[0].message, "content", None) or ""
+            finally:
+                self._release()
+            time.sleep(delay)
+            attempt += 1
+
+    async def astream(
+        self, messages: List[Dict], model: str, temperature: Optional[float] = None
+    ) -> AsyncIterator[str]:
+        """Stream completion tokens. Retries only until the first token arrived."""
+        self._admit()
+        kwargs: Dict[str, Any] = {"messages": messages, "model": model, "stream": True}
+        if temperature is not None:
+            kwargs["temperature"] = temperature
+        t0 = time.perf_counter()
+        attempt = 0
+        while True:
+            try:
+                slots = await self._aacquire()
+            except LLMUnavailable:
+                self._finish(False, t0, counts_for_breaker=False)
+                raise
+            produced = False
+            outcome = None
+            try:
+                stream = await self.async_client.chat.completions.create(**kwargs)
+                async for chunk in stream:
+                    if not chunk.choices:
+                        continue
+                    delta = getattr(chunk.choices[0].delta, "content", None)
+                    if delta:
+                        produced = True
+                        yield delta
+                outcome = "ok"
+            except Exception as e:
+                outcome = "error"
+                if produced:
+                    # half an answer has been sent, a retry would repeat it
+                    self._finish(False, t0, counts_for_breaker=_is_retriable(e))
+                    raise LLMUnavailable(str(e)) from e
+                delay = self._retry_or_raise(e, attempt, t0)
+            finally:
+                self._release()
+                slots.release()
+                if outcome is None:
+                    # consumer went away (client disconnect / cancellation)
+                    self._finish(produced, t0, counts_for_breaker=False)
+            if outcome == "ok":
+                self._finish(True, t0)
+                return
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def _acquire_or_fail(self, t0: float) -> None:
+        try:
+            self._acquire()
+        except LLMUnavailable:
+            # we are saturated, upstream may be fine
+            self._finish(False, t0, counts_for_breaker=False)
+            raise
+
+    def _retry_or_raise(self, exc: Exception, attempt: int, t0: float) -> float:
+        """Backoff delay before the next attempt, or raise LLMUnavailable."""
+        retriable = _is_retriable(exc)
+        if not retriable or attempt >= self.max_retries:
+            self._finish(False, t0, counts_for_breaker=retriable)
+            raise LLMUnavailable(str(exc)) from exc
+        with self._lock:
+            self.retries += 1
+        delay = self._backoff(attempt, exc)
+        logger.warning("⚠️  LLM call failed (%s), retrying in %.2fs", exc, delay)
+        return delay
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            done = self.successes + self.failures
+            return {
+                "max_concurrency": self.max_concurrency,
+                "in_flight": self._in_flight,
+                "calls": self.calls,
+                "successes": self.successes,
+                "failures": self.failures,
+                "retries": self.retries,
+                "rejected_open_circuit": self.rejected,
+                "avg_latency_ms": (
+                    round(self._latency_total / done * 1000, 1) if done else None
+                ),
+                "breaker": self.breaker.stats(),
+            }
@@ -0,0 +1,154 @@
+"""Metadata columns and FAISS ID selectors for filtered retrieval.
+
+`MetadataColumns` is built once per retrieval snapshot from the doc store's
+pre-extracted columns (or from the JSONL docs), so requests never re-parse a
+document to read its title or date. A `RetrievalFilter` is turned into a
+boolean row mask over those columns and then into a faiss IDSelector that the
+index applies during the search, so top_k is filled from matching sections
+only instead of being trimmed after the fact.
+"""
+
+import logging
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import faiss
+import numpy as np
+
+from .doc_store import (
+    FILTER_COLUMNS,
+    META_COLUMNS,
+    DocStore,
+    extract_meta,
+    filter_columns,
+    law_year,
+)
+from .token_count import encoding_label
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class RetrievalFilter:
+    """Restrict retrieval to matching sections. Hashable, so usable in cache keys."""
+
+    law_title: Optional[str] = None  # case-insensitive substring of the title
+    section_id: Optional[str] = None  # exact section id, e.g. "302"
+    year_from: Optional[int] = None  # inclusive, by the year the law was passed
+    year_to: Optional[int] = None
+
+    @property
+    def active(self) -> bool:
+        return bool(
+            (self.law_title and self.law_title.strip())
+            or (self.section_id and str(self.section_id).strip())
+            or self.year_from
+            or self.year_to
+        )
+
+
+class MetadataColumns:
+    """Column-oriented metadata for every doc row, aligned with the index ids."""
+
+    def __init__(
+        self,
+        columns: Dict[str, np.ndarray],
+        years: np.ndarray,
+        n_tokens: Optional[np.ndarray] = None,
+        normalized: Optional[Dict[str, np.ndarray]] = None,
+    ):
+        self.columns = columns
+        self.years = years
+        # source text token counts from the doc store build, if it has them
+        self.n_tokens = n_tokens
+        if normalized is None:
+            normalized = filter_columns(columns["law_title"], columns["section_id"])
+        # a corpus has a few hundred acts but many sections each; match titles once
+        self._titles = normalized["title_vocab"]
+        self._title_codes = normalized["title_code"]
+        self._section_ids = normalized["section_id_norm"]
+
+    @classmethod
+    def from_docs(cls, docs: Union[List[Dict], DocStore]) -> "MetadataColumns":
+        if isinstance(docs, DocStore):
+            columns = {name: np.asarray(docs.column(name)) for name in META_COLUMNS}
+            try:
+                years = np.asarray(docs.column("law_year"), dtype="int16")
+            except FileNotFoundError:
+                # store built before the numeric columns existed
+                years = _years_from_columns(columns)
+            try:
+                n_tokens = np.asarray(docs.column("n_tokens"))
+            except FileNotFoundError:
+                n_tokens = None
+            stored = docs.manifest.get("token_encoding")
+            if n_tokens is not None and stored != encoding_label():
+                # counted with another tokenizer; the packer counts per hit instead
+                logger.warning(
+                    "⚠️  Doc store token counts use %s, not %s; ignoring them",
+                    stored,
+                    encoding_label(),
+                )
+                n_tokens = None
+            normalized = None
+            if "filter_columns" in docs.manifest:
+                # mapped, not recomputed: shared by every worker through the page cache
+                normalized = {name: docs.column(name) for name in FILTER_COLUMNS}
+            return cls(columns, years, n_tokens, normalized)
+
+        metas = [extract_meta(d) for d in docs]
+        columns = {
+            name: np.asarray([m[name] for m in metas], dtype=str)
+            for name in META_COLUMNS
+        }
+        years = np.asarray([law_year(m) for m in metas], dtype="int16")
+        return cls(columns, years)
+
+    def __len__(self) -> int:
+        return len(self.years)
+
+    def meta(self, i: int) -> Dict[str, str]:
+        return {name: str(col[i]) for name, col in self.columns.items()}
+
+    def tokens(self, i: int) -> Optional[int]:
+        return int(self.n_tokens[i]) if self.n_tokens is not None else None
+
+    def mask(self, flt: RetrievalFilter) -> np.ndarray:
+        """Boolean array, True for rows that pass the filter."""
+        keep = np.ones(len(self), dtype=bool)
+        if flt.law_title and flt.law_title.strip():
+            needle = flt.law_title.strip().lower()
+            matching = np.flatnonzero(np.char.find(self._titles, needle) >= 0)
+            keep &= np.isin(self._title_codes, matching)
+        if flt.section_id and str(flt.section_id).strip():
+            keep &= self._section_ids == str(flt.section_id).strip().lower()
+        if flt.year_from:
+            keep &= self.years >= int(flt.year_from)
+        if flt.year_to:
+            # unknown years (0) never satisfy a year range
+            keep &= (self.years > 0) & (self.years <= int(flt.year_to))
+        return keep
+
+
+def _years_from_columns(columns: Dict[str, np.ndarray]) -> np.ndarray:
+    return np.asarray(
+        [
+            law_year({"law_pass_date": str(d), "law_title": str(t)})
+            for d, t in zip(columns["law_pass_date"], columns["law_title"])
+        ],
+        dtype="int16",
+    )
+
+
+def id_selector(mask: np.ndarray) -> Tuple[faiss.IDSelector, Any]:
+    """IDSelector over the True rows of mask.
+
+    Returns the selector and the buffer it reads from; the caller must keep the
+    buffer referenced until the search has finished.
+    """
+    ids = np.flatnonzero(mask).astype("int64")
+    if len(ids) * 64 < len(mask):
+        # sparse subset: a hash set of ids is smaller than a bitmap
+        return faiss.IDSelectorBatch(len(ids), faiss.swig_ptr(ids)), ids
+    bitmap = np.packbits(mask, bitorder="little")
+    return faiss.IDSelectorBitmap(len(mask), faiss.swig_ptr(bitmap)), bitmap
@@ -0,0 +1,79 @@
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+
+class CrossEncoderReranker:
+    """Score (query, passage) pairs with a small cross-encoder in one batched call.
+
+    Keeps a running estimate of the cost per pair so callers can decide, before
+    calling, whether a rerank still fits into their latency budget.
+    """
+
+    def __init__(self, model_name: str, max_length: int = 512, batch_size: int = 32):
+        from sentence_transformers import CrossEncoder
+
+        self.model_name = model_name
+        self.model = CrossEncoder(model_name, max_length=max_length)
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._ms_per_pair: Optional[float] = None
+        self.calls = 0
+        self.skipped = 0
+
+    def estimate_ms(self, n_pairs: int) -> float:
+        """Expected latency of scoring n_pairs, 0 until the first call."""
+        return (self._ms_per_pair or 0.0) * n_pairs
+
+    def score(self, query: str, passages: Sequence[str]) -> np.ndarray:
+        if not passages:
+            return np.zeros(0, dtype="float32")
+        t0 = time.perf_counter()
+        scores = self.model.predict(
+            [(query, p) for p in passages],
+            batch_size=self.batch_size,
+            show_progress_bar=False,
+        )
+        per_pair = (time.perf_counter() - t0) * 1000 / len(passages)
+        with self._lock:
+            self.calls += 1
+            # exponentially weighted, so a one-off slow call does not stick
+            self._ms_per_pair = (
+                per_pair
+                if self._ms_per_pair is None
+                else 0.8 * self._ms_per_pair + 0.2 * per_pair
+            )
+        return np.asarray(scores, dtype="float32").reshape(-1)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "model": self.model_name,
+            "calls": self.calls,
+            "skipped_over_budget": self.skipped,
+            "ms_per_pair": (
+                round(self._ms_per_pair, 3) if self._ms_per_pair is not None else None
+            ),
+        }
+
+
+def rerank(
+    reranker: CrossEncoderReranker,
+    query: str,
+    hits: List[Dict],
+    passages: Sequence[str],
+    top_n: int,
+    budget_ms: Optional[float] = None,
+) -> Optional[List[Dict]]:
+    """Reorder hits by cross-encoder score and keep the best top_n.
+
+    Returns None (leaving the caller's order untouched) when scoring all
+    passages is expected to take longer than budget_ms.
+    """
+    if budget_ms is not None and reranker.estimate_ms(len(passages)) > budget_ms:
+        reranker.skipped += 1
+        return None
+    scores = reranker.score(query, passages)
+    order = np.argsort(-scores, kind="stable")[:top_n]
+    return [{**hits[i], "rerank_score": float(scores[i])} for i in order]
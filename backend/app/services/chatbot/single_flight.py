@@ -0,0 +1,54 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+from .telemetry import count
+
+
+class SingleFlight:
+    """Share one in-flight computation between concurrent callers with the same key.
+
+    The first caller (the leader) starts the computation as its own task;
+    callers arriving while it runs await the same task instead of starting
+    another one. The task is shielded, so a leader whose client goes away does
+    not cancel it for the others. Once it finishes the key is released and the
+    next caller starts afresh (repeats after that are the caches' job).
+    Event-loop bound: coalesces within one worker process.
+    """
+
+    def __init__(self, name: str = "inference"):
+        self.name = name
+        self._calls: Dict[Hashable, "asyncio.Future[Any]"] = {}
+        self.leaders = 0
+        self.collapsed = 0
+
+    async def do(
+        self, key: Hashable, fn: Callable[[], Awaitable[Any]]
+    ) -> Tuple[Any, bool]:
+        """Return (result of fn(), whether it was shared with an earlier caller)."""
+        task = self._calls.get(key)
+        shared = task is not None
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda t: self._done(key, t))
+            self.leaders += 1
+            count(f"{self.name}_leader")
+        else:
+            self.collapsed += 1
+            count(f"{self.name}_collapsed")
+        return await asyncio.shield(task), shared
+
+    def _done(self, key: Hashable, task: "asyncio.Future[Any]") -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            task.exception()  # retrieved, so an unawaited failure is not logged
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.leaders + self.collapsed
+        return {
+            "in_flight": len(self._calls),
+            "leaders": self.leaders,
+            "collapsed": self.collapsed,
+            "collapse_rate": round(self.collapsed / total, 4) if total else 0.0,
+        }
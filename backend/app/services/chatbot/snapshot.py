@@ -0,0 +1,134 @@
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Union
+
+import faiss
+
+from .bm25 import BM25Index
+from .doc_store import DocStore
+from .metadata_filter import MetadataColumns
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class RetrievalSnapshot:
+    """Everything retrieval reads, swapped as one reference on reload.
+
+    Request code grabs the current snapshot once and uses it to the end, so a
+    reload never mixes an old index with new docs (or the reverse) mid-request.
+    """
+
+    index: Optional[faiss.Index]
+    docs: Union[List[Dict], DocStore]
+    manifest: Dict[str, Any] = field(default_factory=dict)
+    tombstones: frozenset = frozenset()
+    version: int = 0
+    bm25: Optional[BM25Index] = None
+    columns: Optional[MetadataColumns] = None
+    loaded_at: float = field(default_factory=time.time)
+
+    @property
+    def ready(self) -> bool:
+        return self.index is not None and len(self.docs) > 0
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "version": self.version,
+            "index_type": self.manifest.get("index_type", "unknown"),
+            "index_version": self.manifest.get("version", 0),
+            "vectors": int(self.index.ntotal) if self.index is not None else 0,
+            "docs": len(self.docs),
+            "tombstones": len(self.tombstones),
+            "bm25": self.bm25 is not None,
+            "metadata_columns": self.columns is not None,
+            "loaded_at": self.loaded_at,
+        }
+
+
+def validate_snapshot(snap: RetrievalSnapshot, embed_dim: Optional[int]) -> None:
+    """Raise ValueError if the index and docs cannot be served together."""
+    if snap.index is None:
+        raise ValueError("FAISS index missing")
+    if not len(snap.docs):
+        raise ValueError("No documents loaded")
+    if embed_dim is not None and snap.index.d != embed_dim:
+        raise ValueError(
+            f"Index dimension {snap.index.d} != embedding dimension {embed_dim}"
+        )
+    n_docs, n_vec = len(snap.docs), int(snap.index.ntotal)
+    expected = snap.manifest.get("count")
+    if expected is not None and int(expected) != n_vec:
+        # the manifest (tombstones, search defaults) belongs to another index,
+        # e.g. read while index_updater was replacing the two files
+        raise ValueError(
+            f"Index has {n_vec} vectors but its manifest describes {expected}"
+        )
+    if snap.manifest.get("id_mapped"):
+        # ids are doc-store rows; retired rows have no vector
+        if n_vec > n_docs:
+            raise ValueError(f"Index has {n_vec} vectors but only {n_docs} docs")
+    elif n_vec != n_docs:
+        raise ValueError(f"Index has {n_vec} vectors but there are {n_docs} docs")
+    if snap.bm25 is not None and snap.bm25.n_docs > n_docs:
+        raise ValueError(
+            f"BM25 index covers {snap.bm25.n_docs} docs but only {n_docs} are loaded"
+        )
+    if snap.columns is not None and len(snap.columns) != n_docs:
+        raise ValueError(
+            f"Metadata columns cover {len(snap.columns)} docs but {n_docs} are loaded"
+        )
+
+
+class FileWatcher:
+    """Poll a set of files and call on_change when any mtime/size changes."""
+
+    def __init__(
+        self,
+        paths: Sequence[Path],
+        on_change: Callable[[], Any],
+        interval: float = 10.0,
+    ):
+        self.paths = [Path(p) for p in paths]
+        self.on_change = on_change
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._last = self._fingerprint()
+
+    def _fingerprint(self):
+        out = []
+        for p in self.paths:
+            try:
+                st = p.stat()
+                out.append((st.st_mtime_ns, st.st_size))
+            except FileNotFoundError:
+                out.append(None)
+        return out
+
+    def _loop(self) -> None:
+        while not self._stop.wait(self.interval):
+            current = self._fingerprint()
+            if current == self._last:
+                continue
+            # wait one more tick so a writer has finished replacing all files
+            if self._stop.wait(self.interval) or self._fingerprint() != current:
+                continue
+            self._last = current
+            try:
+                self.on_change()
+            except Exception as e:
+                logger.error("❌ Reload triggered by file change failed: %s", e)
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._loop, name="chatbot-index-watcher", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
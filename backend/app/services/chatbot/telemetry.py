@@ -0,0 +1,238 @@
+"""Per-stage latency spans and event counters for the chatbot pipeline.
+
+Every `span(stage)` is observed into the `chatbot_stage_seconds` Prometheus
+histogram (when prometheus_client is installed) and, inside a `trace()`, added
+to that request's timings dict as `<stage>_ms`. A stage entered several times
+in one request (e.g. two LLM calls) accumulates.
+
+    with trace() as timings:
+        with span("embed"):
+            ...
+
+With CHATBOT_EXECUTOR=process the spans are recorded in the pool workers, so
+the app calls setup_multiprocess() at startup, before any metric is recorded
+or a worker is started: every process then writes its samples under one
+directory and render_metrics() merges them. prometheus_client picks its
+storage when it is first imported, so it is only imported on first use.
+"""
+
+import importlib.util
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from types import SimpleNamespace
+from typing import Any, Dict, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE_LATEST = "text/plain; version=0.0.4; charset=utf-8"
+_MULTIPROC_ENV = "PROMETHEUS_MULTIPROC_DIR"
+
+# pipeline stages, from ~1ms (filter) to several seconds (llm)
+_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+)
+
+_BREAKER_STATES = {"closed": 0, "half_open": 1, "open": 2}
+_breaker: Optional[Any] = None
+_metrics: Optional[SimpleNamespace] = None
+_metrics_lock = threading.Lock()
+_available = importlib.util.find_spec("prometheus_client") is not None
+# directory created by setup_multiprocess(), removed by cleanup_multiprocess()
+_owned_dir: Optional[str] = None
+
+_timings: ContextVar[Optional[Dict[str, Any]]] = ContextVar(
+    "chatbot_timings", default=None
+)
+
+
+def _multiproc_dir() -> Optional[str]:
+    return os.environ.get(_MULTIPROC_ENV) or None
+
+
+def _get_metrics() -> Optional[SimpleNamespace]:
+    """The metric objects, created (and prometheus_client imported) on first use."""
+    global _metrics
+    if _metrics is not None or not _available:
+        return _metrics
+    with _metrics_lock:
+        if _metrics is None:
+            from prometheus_client import Counter, Gauge, Histogram
+
+            # 0 closed, 1 half-open, 2 open; read from the breaker at scrape
+            # time, or in multiprocess mode (each worker has its own breaker)
+            # stored at the end of every traced request and exported as the
+            # worst state of the live workers
+            breaker_state = Gauge(
+                "chatbot_llm_breaker_state",
+                "LLM circuit breaker state",
+                multiprocess_mode="livemax",
+            )
+            if _breaker is not None and not _multiproc_dir():
+                breaker = _breaker
+                breaker_state.set_function(lambda: _BREAKER_STATES[breaker.state])
+            _metrics = SimpleNamespace(
+                stage_seconds=Histogram(
+                    "chatbot_stage_seconds",
+                    "Latency of chatbot pipeline stages",
+                    ["stage"],
+                    buckets=_BUCKETS,
+                ),
+                events=Counter("chatbot_events", "Chatbot pipeline events", ["event"]),
+                breaker_state=breaker_state,
+            )
+    return _metrics
+
+
+def setup_multiprocess() -> Optional[str]:
+    """Make this process and the workers it starts share metrics.
+
+    Uses PROMETHEUS_MULTIPROC_DIR if it is set (e.g. by a gunicorn config,
+    which then owns and cleans the directory); otherwise creates a fresh
+    directory that cleanup_multiprocess() removes. Must run before the
+    first metric is recorded. Returns the directory, or None when metrics
+    stay per process.
+    """
+    global _owned_dir
+    if not _available:
+        return None
+    if _metrics is not None and not _multiproc_dir():
+        logger.warning(
+            "⚠️  Metrics were recorded before setup_multiprocess(); "
+            "/metrics will only show this process"
+        )
+        return None
+    path = _multiproc_dir()
+    if path is None:
+        path = _owned_dir = tempfile.mkdtemp(prefix="chatbot-prom-")
+        # worker processes inherit it
+        os.environ[_MULTIPROC_ENV] = path
+    logger.info("✓ Collecting chatbot metrics from all processes in %s", path)
+    return path
+
+
+def cleanup_multiprocess() -> None:
+    """Remove the directory created by setup_multiprocess(), if any."""
+    global _owned_dir
+    if _owned_dir is None:
+        return
+    shutil.rmtree(_owned_dir, ignore_errors=True)
+    if os.environ.get(_MULTIPROC_ENV) == _owned_dir:
+        del os.environ[_MULTIPROC_ENV]
+    _owned_dir = None
+
+
+def metrics_enabled() -> bool:
+    return _available
+
+
+@contextmanager
+def trace() -> Iterator[Dict[str, Any]]:
+    """Collect the spans of one request into the yielded dict."""
+    timings: Dict[str, Any] = {}
+    token = _timings.set(timings)
+    t0 = time.perf_counter()
+    try:
+        yield timings
+    finally:
+        timings["total_ms"] = round((time.perf_counter() - t0) * 1000, 2)
+        _timings.reset(token)
+        if _breaker is not None and _multiproc_dir():
+            metrics = _get_metrics()
+            if metrics is not None:
+                metrics.breaker_state.set(_BREAKER_STATES[_breaker.state])
+
+
+def observe(stage: str, seconds: float) -> None:
+    metrics = _get_metrics()
+    if metrics is not None:
+        metrics.stage_seconds.labels(stage).observe(seconds)
+    timings = _timings.get()
+    if timings is not None:
+        key = f"{stage}_ms"
+        timings[key] = round(timings.get(key, 0.0) + seconds * 1000, 2)
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - t0)
+
+
+def count(event: str) -> None:
+    """Bump the chatbot_events_total counter for event (no-op without prometheus)."""
+    metrics = _get_metrics()
+    if metrics is not None:
+        metrics.events.labels(event).inc()
+
+
+def watch_breaker(breaker: Any) -> None:
+    """Export breaker.state as chatbot_llm_breaker_state (no-op without prometheus).
+
+    Creates no metric itself, so it is safe to call at import time.
+    """
+    global _breaker
+    _breaker = breaker
+    metrics = _metrics
+    if metrics is not None and not _multiproc_dir():
+        metrics.breaker_state.set_function(lambda: _BREAKER_STATES[breaker.state])
+
+
+def annotate(key: str, value: Any) -> None:
+    """Attach a non-timing fact (e.g. whether rerank ran) to the current trace."""
+    timings = _timings.get()
+    if timings is not None:
+        timings[key] = value
+
+
+def current_timings() -> Optional[Dict[str, Any]]:
+    return _timings.get()
+
+
+def render_metrics() -> Optional[bytes]:
+    """Prometheus text exposition, or None without prometheus_client.
+
+    In multiprocess mode this merges the samples of every process that wrote
+    to the shared directory, including pool workers that have since been
+    replaced.
+    """
+    if _get_metrics() is None:
+        return None
+    from prometheus_client import CollectorRegistry, generate_latest, multiprocess
+
+    path = _multiproc_dir()
+    if path:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry, path=path)
+        return generate_latest(registry)
+    return generate_latest()
+
+
+def process_exited(pid: int) -> None:
+    """Drop the live gauges of a pool worker that is gone (multiprocess mode)."""
+    path = _multiproc_dir()
+    if path and _available:
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(pid, path)
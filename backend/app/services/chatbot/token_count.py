@@ -0,0 +1,68 @@
+"""Token counting for prompt budgeting.
+
+Uses tiktoken when its encoding can be loaded and falls back to a
+characters-per-token estimate otherwise (e.g. no network on first use to
+fetch the encoding file). Counts only steer how much of each source goes into
+the prompt, so the estimate is good enough when tiktoken is unavailable.
+
+tiktoken downloads the encoding file on first use. The service loads it in
+initialize(), not on the first request; for offline hosts, fetch it once and
+point TIKTOKEN_CACHE_DIR at the cache directory.
+"""
+
+import os
+import logging
+import threading
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+ENCODING_NAME = os.environ.get("CHATBOT_TOKEN_ENCODING", "cl100k_base")
+APPROX_CHARS_PER_TOKEN = 4
+
+_encoding: Optional[Any] = None
+_encoding_failed = False
+_lock = threading.Lock()
+
+
+def get_encoding() -> Optional[Any]:
+    global _encoding, _encoding_failed
+    if _encoding is None and not _encoding_failed:
+        with _lock:
+            if _encoding is None and not _encoding_failed:
+                try:
+                    import tiktoken
+
+                    _encoding = tiktoken.get_encoding(ENCODING_NAME)
+                except Exception as e:
+                    logger.warning(
+                        "⚠️  tiktoken unavailable (%s), estimating token counts", e
+                    )
+                    _encoding_failed = True
+    return _encoding
+
+
+def encoding_label() -> str:
+    """Name recorded next to precomputed counts, so mismatches are visible."""
+    return ENCODING_NAME if get_encoding() is not None else "approx"
+
+
+def count_tokens(text: str) -> int:
+    enc = get_encoding()
+    if enc is None:
+        return (len(text) + APPROX_CHARS_PER_TOKEN - 1) // APPROX_CHARS_PER_TOKEN
+    return len(enc.encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """Cut text to at most max_tokens tokens (appending "..." when cut)."""
+    if max_tokens <= 0:
+        return ""
+    enc = get_encoding()
+    if enc is None:
+        limit = max_tokens * APPROX_CHARS_PER_TOKEN
+        return text if len(text) <= limit else text[:limit] + "..."
+    tokens = enc.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return enc.decode(tokens[:max_tokens]) + "..."
@@ -0,0 +1,125 @@
+"""p50/p95 answer latency of the two_call vs single_call strategies.
+
+Runs the answer step (prompt build + LLM round-trips) against the local stub
+LLM server, so numbers depend only on the number of round-trips. A fraction
+of the questions (--hard-fraction) is not covered by the sources: with
+two_call the stub answers "I do not know" and a fallback call follows, with
+single_call it answers once with `BASIS: GENERAL`. Every other covered
+question gets its single_call reply on one line (`**BASIS: SOURCES** ...`);
+the run fails if any of those answers comes back empty or as "I do not know",
+whole or streamed.
+
+    python -m benchmarks.bench_answer_strategy --latency-ms 400 --queries 60
+"""
+
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.stub_llm_server import StubConfig, start_stub_server
+
+HARD_MARKER = "inheritance"
+ONE_LINE_MARKER = "stolen"
+ONE_LINE_REPLY = (
+    "**BASIS: SOURCES** The punishment for theft under section 379 is "
+    "imprisonment of up to three years, or a fine, or both [SOURCE 0]."
+)
+SOURCE_DOC = {
+    "text": "Penal Code 1860 section 379: Whoever commits theft shall be punished "
+    "with imprisonment of either description for a term which may extend to "
+    "three years, or with fine, or with both.",
+    "meta": {"law_title": "Penal Code 1860", "section_id": "379"},
+}
+
+
+def stub_answer(messages):
+    system, user = messages[0]["content"], messages[-1]["content"]
+    hard = HARD_MARKER in user
+    if "BASIS:" in system:
+        if hard:
+            return "BASIS: GENERAL\nUnder Muslim law the estate is divided ..."
+        if ONE_LINE_MARKER in user:
+            return ONE_LINE_REPLY
+        return "BASIS: SOURCES\nTheft is punishable by up to three years [SOURCE 0]."
+    if "ONLY the provided SOURCES" in system:
+        return "I do not know." if hard else "Up to three years [SOURCE 0]."
+    return "From general knowledge of Bangladesh law ..."
+
+
+def check_one_line_reply(cs):
+    """The answer on the BASIS line must survive parsing, whole and streamed."""
+    expected = ONE_LINE_REPLY.split("** ", 1)[1]
+    assert cs.parse_basis(ONE_LINE_REPLY) == ("sourced", expected)
+    for size in (1, 5, 64):
+        parser = cs.BasisStreamParser()
+        text = ONE_LINE_REPLY
+        chunks = [text[i : i + size] for i in range(0, len(text), size)]
+        streamed = "".join(parser.feed(c) for c in chunks) + parser.flush()
+        assert (parser.answer_type, streamed) == ("sourced", expected), streamed
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--latency-ms", type=float, default=300.0)
+    parser.add_argument("--queries", type=int, default=40)
+    parser.add_argument("--hard-fraction", type=float, default=0.3)
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+
+    server, url = start_stub_server(
+        StubConfig(latency_ms=args.latency_ms, answer_fn=stub_answer)
+    )
+    # the gateway is created at import time from these
+    os.environ["groq_api_key"] = "stub"
+    os.environ["CHATBOT_LLM_BASE_URL"] = url
+    from app.services.chatbot import chatbot_service as cs
+
+    hits = [{"score": 0.5, "doc_index": 0, "doc": SOURCE_DOC}]
+    n_hard = int(args.queries * args.hard_fraction)
+    questions = [
+        (
+            f"how is {HARD_MARKER} divided #{i}"
+            if i < n_hard
+            else (
+                f"punishment for {ONE_LINE_MARKER} goods #{i}"
+                if i % 2
+                else f"punishment for theft #{i}"
+            )
+        )
+        for i in range(args.queries)
+    ]
+
+    check_one_line_reply(cs)
+    for strategy in cs.ANSWER_STRATEGIES:
+
+        def answer(q):
+            t = time.perf_counter()
+            result = cs._answer_from_hits(q, hits, None, strategy)
+            return (time.perf_counter() - t) * 1000, result
+
+        with ThreadPoolExecutor(args.concurrency) as pool:
+            results = list(pool.map(answer, questions))
+        latencies = [ms for ms, _ in results]
+        fallbacks = sum(1 for _, r in results if r["type"] == "fallback")
+        lost = [
+            q
+            for q, (_, r) in zip(questions, results)
+            if HARD_MARKER not in q
+            and (r["type"] != "sourced" or not r["answer"].strip())
+        ]
+        assert not lost, f"{strategy}: answers lost for {lost[:3]}"
+        print(
+            f"{strategy:<12} p50={percentile(latencies, 50):7.1f}ms  "
+            f"p95={percentile(latencies, 95):7.1f}ms  fallback={fallbacks}/{len(results)}"
+        )
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""Latency, throughput, RSS and numerical parity of the embedding backends.
+
+Each backend runs in its own subprocess so peak RSS is measured in isolation.
+Parity is reported as the minimum cosine similarity / maximum absolute
+difference against the torch embeddings of the same texts; the run fails
+(exit code 1) when a backend falls below --min-cosine.
+
+    python -m benchmarks.bench_embedding_backends --onnx-dir app/services/chatbot/data/onnx
+"""
+
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from app.services.chatbot.embedding_backends import BACKENDS, load_backend
+
+TEXTS = [
+    "what is the punishment for theft",
+    "how do I file a case for land dispute",
+    "what are the rights of a tenant in Bangladesh",
+    "can my employer fire me without notice",
+    "what is the legal age of marriage",
+    "how to get bail in a criminal case",
+    "what does section 302 of the penal code say",
+    "how is inheritance divided under muslim law",
+    "Whoever intending to take dishonestly any moveable property out of the "
+    "possession of any person without that person's consent, moves that property "
+    "in order to such taking, is said to commit theft.",
+]
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def run_one(kind, model, onnx_dir, n, batch_size, out_npy):
+    t0 = time.perf_counter()
+    backend = load_backend(kind, model, onnx_dir)
+    load_s = time.perf_counter() - t0
+
+    backend.encode(TEXTS[:1])  # warm up
+    single = []
+    for i in range(n):
+        t = time.perf_counter()
+        backend.encode([TEXTS[i % len(TEXTS)]])
+        single.append((time.perf_counter() - t) * 1000)
+
+    batch = [TEXTS[i % len(TEXTS)] for i in range(batch_size)]
+    t = time.perf_counter()
+    rounds = max(1, n // batch_size)
+    for _ in range(rounds):
+        backend.encode(batch)
+    throughput = rounds * batch_size / (time.perf_counter() - t)
+
+    np.save(out_npy, backend.encode(TEXTS))
+    return {
+        "backend": kind,
+        "load_s": round(load_s, 2),
+        "p50_ms": round(percentile(single, 50), 2),
+        "p99_ms": round(percentile(single, 99), 2),
+        "throughput_qps": round(throughput, 1),
+        # ru_maxrss is KiB on Linux
+        "max_rss_mb": round(
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1
+        ),
+    }
+
+
+def main():
+    from app.services.chatbot.chatbot_service import EMBED_MODEL
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backends", default=",".join(BACKENDS))
+    parser.add_argument("--model", default=EMBED_MODEL)
+    parser.add_argument("--onnx-dir", type=Path)
+    parser.add_argument("--n", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--min-cosine", type=float, default=0.99)
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--out-npy", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        result = run_one(
+            args.child, args.model, args.onnx_dir, args.n, args.batch_size, args.out_npy
+        )
+        print(json.dumps(result))
+        return
+
+    kinds = [k for k in args.backends.split(",") if k]
+    if "torch" not in kinds:
+        kinds.insert(0, "torch")  # reference for the parity check
+    tmp = Path(tempfile.mkdtemp(prefix="embed_bench_"))
+    results = {}
+    for kind in kinds:
+        cmd = [
+            sys.executable, "-m", "benchmarks.bench_embedding_backends",
+            "--child", kind, "--model", args.model, "--n", str(args.n),
+            "--batch-size", str(args.batch_size), "--out-npy", str(tmp / f"{kind}.npy"),
+        ]  # fmt: skip
+        if args.onnx_dir:
+            cmd += ["--onnx-dir", str(args.onnx_dir)]
+        out = subprocess.run(cmd, capture_output=True, text=True)
+        if out.returncode != 0:
+            print(f"{kind:<10} FAILED\n{out.stderr.strip()[-500:]}")
+            continue
+        results[kind] = json.loads(out.stdout.strip().splitlines()[-1])
+
+    ok = True
+    ref = np.load(tmp / "torch.npy") if "torch" in results else None
+    for kind, r in results.items():
+        line = (
+            f"{kind:<10} load={r['load_s']:>5}s  p50={r['p50_ms']:>7}ms  "
+            f"p99={r['p99_ms']:>7}ms  batch{args.batch_size}={r['throughput_qps']:>8}/s  "
+            f"rss={r['max_rss_mb']:>7}MB"
+        )
+        if ref is not None and kind != "torch":
+            emb = np.load(tmp / f"{kind}.npy")
+            a = ref / np.linalg.norm(ref, axis=1, keepdims=True)
+            b = emb / np.linalg.norm(emb, axis=1, keepdims=True)
+            cos = float((a * b).sum(axis=1).min())
+            line += f"  min_cos={cos:.5f}  max_abs={float(np.abs(a - b).max()):.5f}"
+            if cos < args.min_cosine:
+                ok = False
+                line += "  PARITY FAIL"
+        print(line)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
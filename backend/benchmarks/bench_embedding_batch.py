@@ -0,0 +1,76 @@
+"""Compare query-embedding throughput for different micro-batch sizes.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_embedding_batch --concurrency 32 --queries 512
+"""
+
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sentence_transformers import SentenceTransformer
+
+from app.services.chatbot.chatbot_service import EMBED_MODEL
+from app.services.chatbot.embedding_batcher import EmbeddingBatcher
+
+SAMPLE_QUERIES = [
+    "what is the punishment for theft",
+    "how do I file a case for land dispute",
+    "what are the rights of a tenant in Bangladesh",
+    "can my employer fire me without notice",
+    "what is the legal age of marriage",
+    "how to get bail in a criminal case",
+    "what does section 302 of the penal code say",
+    "how is inheritance divided under muslim law",
+]
+
+
+def run(model, batch_size: int, wait_ms: float, concurrency: int, n_queries: int):
+    def encode(texts):
+        return model.encode(texts, convert_to_numpy=True).astype("float32")
+
+    batcher = EmbeddingBatcher(encode, max_batch_size=batch_size, max_wait_ms=wait_ms)
+    queries = [
+        f"{SAMPLE_QUERIES[i % len(SAMPLE_QUERIES)]} ({i})" for i in range(n_queries)
+    ]
+    batcher.encode(queries[0])  # warm up
+
+    latencies = []
+
+    def one(q):
+        t0 = time.perf_counter()
+        batcher.encode(q)
+        latencies.append(time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, queries))
+    elapsed = time.perf_counter() - t0
+    batcher.stop()
+
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] * 1000
+    p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000
+    stats = batcher.stats()
+    print(
+        f"batch_size={batch_size:>3}  qps={n_queries / elapsed:8.1f}  "
+        f"p50={p50:7.2f}ms  p99={p99:7.2f}ms  avg_batch={stats['avg_batch_size']:.1f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-sizes", default="1,4,8,16,32")
+    parser.add_argument("--wait-ms", type=float, default=2.0)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--queries", type=int, default=512)
+    args = parser.parse_args()
+
+    model = SentenceTransformer(EMBED_MODEL)
+    for bs in (int(x) for x in args.batch_sizes.split(",")):
+        run(model, bs, args.wait_ms, args.concurrency, args.queries)
+
+
+if __name__ == "__main__":
+    main()
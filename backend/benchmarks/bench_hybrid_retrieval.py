@@ -0,0 +1,79 @@
+"""Latency budget of hybrid (BM25 + dense) retrieval versus dense-only.
+
+Uses the configured index, doc store and BM25 index (see chatbot_service
+paths). Exits non-zero when hybrid p99 exceeds dense p99 by more than
+--budget-ms. Run from the backend directory:
+
+    python -m benchmarks.bench_hybrid_retrieval --budget-ms 5
+"""
+
+import argparse
+import sys
+import time
+
+from app.services.chatbot import chatbot_service as cs
+
+QUERIES = [
+    "what is the punishment for theft",
+    "Section 302 Penal Code 1860",
+    "how do I file a case for land dispute",
+    "rights of a tenant under the Premises Rent Control Act",
+    "what is the legal age of marriage",
+    "how to get bail in a non-bailable offence",
+    "Evidence Act 1872 section 25 confession to police officer",
+    "inheritance under muslim family laws ordinance 1961",
+]
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def timed(fn, rounds):
+    latencies = []
+    for r in range(rounds):
+        for q in QUERIES:
+            cs.retrieval_cache.clear()  # measure the search, not the cache
+            t0 = time.perf_counter()
+            fn(q)
+            latencies.append((time.perf_counter() - t0) * 1000)
+    return percentile(latencies, 50), percentile(latencies, 99)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--top-k", type=int, default=6)
+    parser.add_argument("--rounds", type=int, default=25)
+    parser.add_argument("--budget-ms", type=float, default=5.0)
+    args = parser.parse_args()
+
+    cs.initialize()
+    snap = cs.snapshot
+    if snap is None or not snap.ready or snap.bm25 is None:
+        sys.exit("index, docs and BM25 index are required for this benchmark")
+    for q in QUERIES:
+        cs.encode_query(q)  # embeddings are cached; this times retrieval only
+
+    bm25 = snap.bm25
+    rows = [
+        ("bm25 only", timed(lambda q: bm25.search(q, args.top_k * 2), args.rounds)),
+        (
+            "dense",
+            timed(lambda q: cs.retrieve_hits(q, args.top_k, hybrid=False), args.rounds),
+        ),
+        (
+            "hybrid",
+            timed(lambda q: cs.retrieve_hits(q, args.top_k, hybrid=True), args.rounds),
+        ),
+    ]
+    for name, (p50, p99) in rows:
+        print(f"{name:<10} p50={p50:7.3f}ms  p99={p99:7.3f}ms")
+
+    overhead = rows[2][1][1] - rows[1][1][1]
+    print(f"hybrid p99 overhead: {overhead:.3f}ms (budget {args.budget_ms}ms)")
+    sys.exit(0 if overhead <= args.budget_ms else 1)
+
+
+if __name__ == "__main__":
+    main()
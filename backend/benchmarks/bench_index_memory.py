@@ -0,0 +1,137 @@
+"""Memory of N worker processes serving one FAISS index: heap vs mmap, spawn vs fork.
+
+* heap  - faiss.read_index copies the index into each process's heap
+* mmap  - the index file is mapped read-only and shared via the page cache
+* spawn - every worker loads the index itself (uvicorn --workers)
+* fork  - the master loads it and forks the workers (gunicorn --preload)
+
+Each worker runs --queries searches so the pages it touches are resident,
+then the summed RSS and PSS (shared pages split between the processes that
+map them) of the master plus workers, and the average private memory per
+worker, are read from /proc/<pid>/smaps_rollup (Linux only). PSS is the
+number that shows what the machine actually pays. Run from the backend
+directory:
+
+    python -m benchmarks.bench_index_memory --workers 1,4,8
+    python -m benchmarks.bench_index_memory --index ivf.index --max-pss-ratio 0.6
+"""
+
+import argparse
+import multiprocessing as mp
+import sys
+from pathlib import Path
+
+import faiss
+import numpy as np
+
+from app.services.chatbot import chatbot_service as cs
+
+LOADS = ("heap", "mmap")
+STARTS = ("spawn", "fork")
+
+# set in the master before fork mode forks, inherited by the workers
+_index = None
+
+
+def memory_mb(pid):
+    """Rss, Pss and private (clean + dirty) MB of a process."""
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as fh:
+        for line in fh:
+            key, _, rest = line.partition(":")
+            if key in ("Rss", "Pss", "Private_Clean", "Private_Dirty"):
+                values[key] = int(rest.split()[0]) / 1024
+    private = values.get("Private_Clean", 0.0) + values.get("Private_Dirty", 0.0)
+    return values.get("Rss", 0.0), values.get("Pss", 0.0), private
+
+
+def worker(path, use_mmap, queries, ready, done):
+    index = _index if _index is not None else cs.load_faiss_index(path, use_mmap)
+    cs._enable_reconstruct(index)
+    faiss.omp_set_num_threads(1)
+    rng = np.random.default_rng(0)
+    q = rng.standard_normal((queries, index.d)).astype("float32")
+    faiss.normalize_L2(q)
+    index.search(q, 10)
+    ready.put(mp.current_process().pid)
+    done.wait()
+
+
+def run(path, load, start, n_workers, queries):
+    global _index
+    ctx = mp.get_context(start)
+    use_mmap = load == "mmap"
+    # fork: load in the master only, never search there (OpenMP and fork do not mix)
+    _index = cs.load_faiss_index(path, use_mmap) if start == "fork" else None
+    ready, done = ctx.Queue(), ctx.Event()
+    procs = [
+        ctx.Process(target=worker, args=(path, use_mmap, queries, ready, done))
+        for _ in range(n_workers)
+    ]
+    for p in procs:
+        p.start()
+    try:
+        pids = [ready.get(timeout=600) for _ in procs]
+        workers = [memory_mb(pid) for pid in pids]
+        master = memory_mb("self")
+    finally:
+        done.set()
+        for p in procs:
+            p.join()
+        _index = None
+    rss = master[0] + sum(m[0] for m in workers)
+    pss = master[1] + sum(m[1] for m in workers)
+    private = sum(m[2] for m in workers) / n_workers
+    return {"rss_mb": rss, "pss_mb": pss, "private_mb": private}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--index", type=Path, default=cs.INDEX_PATH)
+    parser.add_argument("--workers", default="1,4,8")
+    parser.add_argument("--loads", default=",".join(LOADS))
+    parser.add_argument("--starts", default=",".join(STARTS))
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument(
+        "--max-pss-ratio",
+        type=float,
+        help="fail unless mmap PSS <= ratio * heap PSS at the largest worker count",
+    )
+    args = parser.parse_args()
+    if not args.index.exists():
+        sys.exit(f"index not found: {args.index}")
+
+    size_mb = args.index.stat().st_size / 2**20
+    print(f"{args.index} ({size_mb:.1f}MB on disk)")
+    counts = [int(x) for x in args.workers.split(",")]
+    results = {}
+    for start in args.starts.split(","):
+        for n in counts:
+            for load in args.loads.split(","):
+                r = results[start, load, n] = run(
+                    args.index, load, start, n, args.queries
+                )
+                print(
+                    f"{start:<6} {load:<5} workers={n:>2}  rss={r['rss_mb']:8.1f}MB  "
+                    f"pss={r['pss_mb']:8.1f}MB  private/worker={r['private_mb']:7.1f}MB"
+                )
+
+    if args.max_pss_ratio is not None:
+        n = max(counts)
+        failures = []
+        for start in args.starts.split(","):
+            heap = results.get((start, "heap", n))
+            mapped = results.get((start, "mmap", n))
+            if heap and mapped:
+                ratio = mapped["pss_mb"] / heap["pss_mb"]
+                if ratio > args.max_pss_ratio:
+                    failures.append(
+                        f"{start}: mmap/heap PSS {ratio:.2f} > {args.max_pss_ratio}"
+                    )
+        for message in failures:
+            print(f"REGRESSION {message}")
+        sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Recall@k against the exact flat index and per-query latency for each ANN type.
+
+Embeddings can be produced once with
+`python -m app.services.chatbot.index_builder build --embeddings emb.npy ...`
+and reused here. Run from the backend directory:
+
+    python -m benchmarks.bench_index_types --embeddings emb.npy --k 8
+"""
+
+import argparse
+import time
+from pathlib import Path
+
+import numpy as np
+import faiss
+
+from app.services.chatbot.index_builder import build_index, search_params
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def make_queries(emb: np.ndarray, n: int, noise: float, seed: int = 0) -> np.ndarray:
+    # perturbed corpus vectors stand in for real questions when none are given
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(len(emb), size=min(n, len(emb)), replace=False)
+    q = emb[rows] + rng.normal(scale=noise, size=(len(rows), emb.shape[1]))
+    q = q.astype("float32")
+    faiss.normalize_L2(q)
+    return q
+
+
+def evaluate(index, queries, truth, k, params=None):
+    latencies = []
+    found = 0
+    for i in range(len(queries)):
+        t0 = time.perf_counter()
+        if params is not None:
+            _, I = index.search(queries[i : i + 1], k, params=params)
+        else:
+            _, I = index.search(queries[i : i + 1], k)
+        latencies.append((time.perf_counter() - t0) * 1000)
+        found += len(set(I[0].tolist()) & set(truth[i].tolist()))
+    recall = found / float(truth.size)
+    return recall, percentile(latencies, 50), percentile(latencies, 99)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--embeddings", type=Path, required=True)
+    parser.add_argument("--queries", type=Path, help="query embeddings (.npy)")
+    parser.add_argument("--n-queries", type=int, default=500)
+    parser.add_argument("--noise", type=float, default=0.05)
+    parser.add_argument("--k", type=int, default=8)
+    parser.add_argument("--nlist", type=int, default=256)
+    parser.add_argument("--nprobe", default="1,4,16,64")
+    parser.add_argument("--ef-search", default="16,64,128,256")
+    args = parser.parse_args()
+
+    emb = np.load(args.embeddings).astype("float32")
+    if args.queries is not None:
+        queries = np.load(args.queries).astype("float32")
+        faiss.normalize_L2(queries)
+    else:
+        queries = make_queries(emb, args.n_queries, args.noise)
+
+    flat, _ = build_index(emb, "flat")
+    _, truth = flat.search(queries, args.k)
+    recall, p50, p99 = evaluate(flat, queries, truth, args.k)
+    print(
+        f"{'flat':<10} {'':<14} recall@{args.k}={recall:.3f}  p50={p50:.3f}ms  p99={p99:.3f}ms"
+    )
+
+    for index_type, knob, values in (
+        ("ivf_flat", "nprobe", args.nprobe),
+        ("ivf_pq", "nprobe", args.nprobe),
+        ("hnsw", "ef_search", args.ef_search),
+    ):
+        index, _ = build_index(emb, index_type, nlist=args.nlist)
+        for v in (int(x) for x in values.split(",")):
+            params = search_params(index, **{knob: v})
+            recall, p50, p99 = evaluate(index, queries, truth, args.k, params)
+            print(
+                f"{index_type:<10} {knob + '=' + str(v):<14} recall@{args.k}={recall:.3f}  "
+                f"p50={p50:.3f}ms  p99={p99:.3f}ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
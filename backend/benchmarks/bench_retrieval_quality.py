@@ -0,0 +1,197 @@
+"""Recall@k, MRR and queries/sec of retrieval on a labeled question set.
+
+Each line of the labels file is a question and the law sections that answer
+it; a hit matches an expected section when its section id is equal and its
+title contains the expected title (case and punctuation ignored):
+
+    {"question": "...", "expected": [{"law_title": "Penal Code 1860", "section_id": "379"}]}
+
+Runs select_hits (retrieval, threshold filter, optional rerank) against the
+local index and doc store, with Hugging Face downloads disabled and the Groq
+client pointed at the local stub server, so it needs no network. Exits
+non-zero when a metric misses an absolute limit or regresses beyond the
+allowed margin against a saved baseline. Run from the backend directory:
+
+    python -m benchmarks.bench_retrieval_quality --k 1,3,6 --save-baseline base.json
+    python -m benchmarks.bench_retrieval_quality --index ivf.index hnsw.index \\
+        --baseline base.json --max-recall-drop 0.02 --max-latency-increase 0.25
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from pathlib import Path
+
+from benchmarks.stub_llm_server import StubConfig, start_stub_server
+
+DEFAULT_LABELS = Path(__file__).with_name("retrieval_labels.jsonl")
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def _norm(text):
+    return " ".join(re.sub(r"[^0-9a-z]+", " ", str(text).lower()).split())
+
+
+def load_labels(path):
+    labels = []
+    with path.open("r", encoding="utf-8") as fh:
+        for line in fh:
+            if line.strip():
+                item = json.loads(line)
+                expected = [
+                    (_norm(e.get("law_title", "")), _norm(e["section_id"]))
+                    for e in item["expected"]
+                ]
+                labels.append((item["question"], expected))
+    return labels
+
+
+def relevant(hit, expected):
+    """Index into expected of the section this hit is, or None."""
+    meta = hit["meta"]
+    title, section = _norm(meta["law_title"]), _norm(meta["section_id"])
+    for i, (want_title, want_section) in enumerate(expected):
+        if section == want_section and want_title in title:
+            return i
+    return None
+
+
+def evaluate(cs, labels, ks, threshold, rerank, rounds, warm):
+    top_k = max(ks)
+    recall = {k: 0.0 for k in ks}
+    mrr = 0.0
+    latencies = []
+    t_start = time.perf_counter()
+    for r in range(rounds):
+        for question, expected in labels:
+            cs.retrieval_cache.clear()
+            if not warm:
+                cs.embedding_cache.clear()
+            t0 = time.perf_counter()
+            hits = cs.select_hits(question, top_k, threshold, use_rerank=rerank)
+            latencies.append((time.perf_counter() - t0) * 1000)
+            if r:
+                continue  # later rounds only time the queries
+            matches = [relevant(h, expected) for h in hits]
+            for k in ks:
+                found = {m for m in matches[:k] if m is not None}
+                recall[k] += len(found) / len(expected)
+            first = next((i for i, m in enumerate(matches) if m is not None), None)
+            mrr += 1.0 / (first + 1) if first is not None else 0.0
+    elapsed = time.perf_counter() - t_start
+    n = len(labels)
+    return {
+        **{f"recall@{k}": round(recall[k] / n, 4) for k in ks},
+        "mrr": round(mrr / n, 4),
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "qps": round(len(latencies) / elapsed, 1),
+    }
+
+
+def check(name, result, args, baseline):
+    """Messages for every limit result misses."""
+    failures = []
+    recall_key = f"recall@{max(args.k)}"
+    limits = [
+        (recall_key, args.min_recall, lambda v, lim: v >= lim),
+        ("mrr", args.min_mrr, lambda v, lim: v >= lim),
+        ("p95_ms", args.max_p95_ms, lambda v, lim: v <= lim),
+        ("qps", args.min_qps, lambda v, lim: v >= lim),
+    ]
+    for key, limit, ok in limits:
+        if limit is not None and not ok(result[key], limit):
+            failures.append(f"{name}: {key}={result[key]} misses limit {limit}")
+
+    base = (baseline or {}).get(name)
+    if base:
+        for key in (recall_key, "mrr"):
+            if key in base and result[key] < base[key] - args.max_recall_drop:
+                failures.append(
+                    f"{name}: {key} dropped {base[key]} -> {result[key]} "
+                    f"(allowed {args.max_recall_drop})"
+                )
+        allowed = base["p95_ms"] * (1 + args.max_latency_increase)
+        if result["p95_ms"] > allowed:
+            failures.append(
+                f"{name}: p95 rose {base['p95_ms']} -> {result['p95_ms']}ms "
+                f"(allowed {allowed:.3f}ms)"
+            )
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--labels", type=Path, default=DEFAULT_LABELS)
+    parser.add_argument(
+        "--index",
+        type=Path,
+        nargs="*",
+        help="FAISS index files to compare (default: the configured index)",
+    )
+    parser.add_argument(
+        "--k", type=lambda s: sorted(int(k) for k in s.split(",")), default=[1, 3, 6]
+    )
+    parser.add_argument("--threshold", type=float, default=0.18)
+    parser.add_argument("--rerank", action="store_true")
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument(
+        "--warm", action="store_true", help="keep query embeddings cached"
+    )
+    parser.add_argument("--min-recall", type=float)
+    parser.add_argument("--min-mrr", type=float)
+    parser.add_argument("--max-p95-ms", type=float)
+    parser.add_argument("--min-qps", type=float)
+    parser.add_argument("--baseline", type=Path)
+    parser.add_argument("--max-recall-drop", type=float, default=0.02)
+    parser.add_argument("--max-latency-increase", type=float, default=0.25)
+    parser.add_argument("--save-baseline", type=Path)
+    args = parser.parse_args()
+
+    # offline: cached models only, and no Groq traffic even by accident
+    os.environ.setdefault("HF_HUB_OFFLINE", "1")
+    os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
+    server, url = start_stub_server(StubConfig(latency_ms=0))
+    os.environ["groq_api_key"] = "stub"
+    os.environ["CHATBOT_LLM_BASE_URL"] = url
+    from app.services.chatbot import chatbot_service as cs
+
+    labels = load_labels(args.labels)
+    cs.initialize()
+    if cs.snapshot is None or not cs.snapshot.ready or cs.embed_model is None:
+        sys.exit("index, docs and a cached embedding model are required")
+
+    baseline = json.loads(args.baseline.read_text()) if args.baseline else None
+    results = {}
+    failures = []
+    for path in args.index or [cs.INDEX_PATH]:
+        if path != cs.INDEX_PATH:
+            cs.INDEX_PATH = path
+            cs.reload_resources()
+        name = f"{path.name} ({cs.snapshot.manifest.get('index_type', 'unknown')})"
+        results[name] = evaluate(
+            cs, labels, args.k, args.threshold, args.rerank, args.rounds, args.warm
+        )
+        print(
+            f"{name:<32} "
+            + "  ".join(f"{key}={value}" for key, value in results[name].items())
+        )
+        failures += check(name, results[name], args, baseline)
+    server.shutdown()
+
+    if args.save_baseline:
+        args.save_baseline.write_text(json.dumps(results, indent=2))
+    for message in failures:
+        print(f"REGRESSION {message}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
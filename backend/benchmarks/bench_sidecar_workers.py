@@ -0,0 +1,191 @@
+"""Memory and embedding throughput of N API workers, in-process vs sidecar.
+
+For each worker count, starts N worker processes that each embed single
+queries from --threads threads for --seconds, the way per-request query
+embedding runs in the API, and reports queries/sec plus the summed RSS and
+PSS of all processes involved. In "inprocess" mode every worker loads its
+own model; in "sidecar" mode one embedding_sidecar process holds the model
+and the workers only hold a SidecarBackend client. PSS splits shared pages
+between the processes sharing them, so it is the fairer total; both are read
+from /proc (Linux only). Run from the backend directory:
+
+    python -m benchmarks.bench_sidecar_workers --workers 1,4,8 --backend torch
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+SAMPLE_QUERIES = [
+    "what is the punishment for theft",
+    "how do I file a case for land dispute",
+    "what are the rights of a tenant in Bangladesh",
+    "can my employer fire me without notice",
+    "what is the legal age of marriage",
+    "how to get bail in a criminal case",
+    "what does section 302 of the penal code say",
+    "how is inheritance divided under muslim law",
+]
+MODES = ("inprocess", "sidecar")
+
+
+def memory_mb(pid):
+    """(rss, pss) of a process in MB, from /proc/<pid>/smaps_rollup."""
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as fh:
+        for line in fh:
+            key, _, rest = line.partition(":")
+            if key in ("Rss", "Pss"):
+                values[key] = int(rest.split()[0]) / 1024
+    return values.get("Rss", 0.0), values.get("Pss", 0.0)
+
+
+def run_worker(args):
+    """One API-worker stand-in: load, report ready, encode until time is up."""
+    from app.services.chatbot.chatbot_service import EMBED_MODEL, ONNX_DIR
+    from app.services.chatbot.embedding_backends import load_backend
+    from app.services.chatbot.embedding_sidecar import SidecarBackend
+
+    if args.mode == "sidecar":
+        model = SidecarBackend(args.socket)
+    else:
+        model = load_backend(args.backend, EMBED_MODEL, ONNX_DIR)
+    model.encode([SAMPLE_QUERIES[0]])
+    print("ready", flush=True)
+    sys.stdin.readline()  # wait for "go", so all workers start together
+
+    done = [0] * args.threads
+    deadline = time.perf_counter() + args.seconds
+
+    def loop(t):
+        i = t
+        while time.perf_counter() < deadline:
+            model.encode(
+                [f"{SAMPLE_QUERIES[i % len(SAMPLE_QUERIES)]} ({os.getpid()} {i})"]
+            )
+            done[t] += 1
+            i += args.threads
+
+    threads = [threading.Thread(target=loop, args=(t,)) for t in range(args.threads)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    print(json.dumps({"queries": sum(done)}), flush=True)
+    sys.stdin.readline()  # stay alive until the parent has read our memory
+
+
+def wait_for_sidecar(socket_path, proc, timeout=300.0):
+    from app.services.chatbot.embedding_sidecar import (
+        SidecarBackend,
+        SidecarUnavailable,
+    )
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            sys.exit("embedding sidecar exited during startup")
+        try:
+            SidecarBackend(socket_path)
+            return
+        except (SidecarUnavailable, FileNotFoundError):
+            time.sleep(0.2)
+    sys.exit("embedding sidecar did not start")
+
+
+def run(mode, n_workers, args, socket_path):
+    sidecar = None
+    if mode == "sidecar":
+        sidecar = subprocess.Popen(
+            [
+                sys.executable,
+                "-m",
+                "app.services.chatbot.embedding_sidecar",
+                "serve",
+                "--socket",
+                str(socket_path),
+                "--backend",
+                args.backend,
+            ],
+            stderr=subprocess.DEVNULL,
+        )
+        wait_for_sidecar(socket_path, sidecar)
+
+    cmd = [
+        sys.executable,
+        "-m",
+        "benchmarks.bench_sidecar_workers",
+        "--worker",
+        "--mode",
+        mode,
+        "--backend",
+        args.backend,
+        "--socket",
+        str(socket_path),
+        "--seconds",
+        str(args.seconds),
+        "--threads",
+        str(args.threads),
+    ]
+    workers = [
+        subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+        for _ in range(n_workers)
+    ]
+    try:
+        for w in workers:
+            if w.stdout.readline().strip() != "ready":
+                sys.exit(f"{mode} worker failed to start")
+        for w in workers:
+            w.stdin.write("go\n")
+            w.stdin.flush()
+        queries = sum(json.loads(w.stdout.readline())["queries"] for w in workers)
+        pids = [w.pid for w in workers] + ([sidecar.pid] if sidecar else [])
+        rss, pss = map(sum, zip(*(memory_mb(pid) for pid in pids)))
+        for w in workers:
+            w.stdin.write("exit\n")
+            w.stdin.flush()
+    finally:
+        for w in workers:
+            w.wait(timeout=30)
+        if sidecar is not None:
+            sidecar.terminate()
+            sidecar.wait(timeout=30)
+
+    print(
+        f"{mode:<10} workers={n_workers:>2}  qps={queries / args.seconds:8.1f}  "
+        f"rss={rss:8.1f}MB  pss={pss:8.1f}MB"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", default="1,4,8")
+    parser.add_argument("--modes", default=",".join(MODES))
+    parser.add_argument("--backend", default="torch")
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument(
+        "--threads", type=int, default=4, help="concurrent requests per worker"
+    )
+    parser.add_argument("--socket", type=Path)
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--mode", choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args)
+        return
+
+    socket_path = args.socket or Path(tempfile.mkdtemp()) / "embed.sock"
+    for n in (int(x) for x in args.workers.split(",")):
+        for mode in args.modes.split(","):
+            run(mode, n, args, socket_path)
+
+
+if __name__ == "__main__":
+    main()
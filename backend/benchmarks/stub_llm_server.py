@@ -0,0 +1,161 @@
+"""Minimal OpenAI-compatible chat completions server for local load tests.
+
+Answers POST .../chat/completions (plain and streamed) after a fixed
+latency, failing a configurable fraction of requests with 429/503 so the
+LLM gateway's retries and circuit breaker can be exercised without Groq:
+
+    python -m benchmarks.stub_llm_server --port 8099 --latency-ms 300 --fail-rate 0.2
+    CHATBOT_LLM_BASE_URL=http://127.0.0.1:8099 groq_api_key=stub uvicorn app.main:app
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+
+DEFAULT_ANSWER = "This is a stub answer based on the provided sources [SOURCE 0]."
+
+# answer_fn(messages) -> completion text
+AnswerFn = Callable[[List[Dict]], str]
+
+
+class StubConfig:
+    def __init__(
+        self,
+        latency_ms: float = 200.0,
+        fail_rate: float = 0.0,
+        fail_status: int = 503,
+        answer_fn: Optional[AnswerFn] = None,
+        token_delay_ms: float = 5.0,
+    ):
+        self.latency_ms = latency_ms
+        self.fail_rate = fail_rate
+        self.fail_status = fail_status
+        self.answer_fn = answer_fn or (lambda messages: DEFAULT_ANSWER)
+        self.token_delay_ms = token_delay_ms
+        self.requests = 0
+        self.failed = 0
+        self._lock = threading.Lock()
+
+
+def _make_handler(cfg: StubConfig):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):  # keep benchmark output clean
+            pass
+
+        def _json(
+            self, status: int, body: Dict, headers: Optional[Dict[str, str]] = None
+        ):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            req = json.loads(self.rfile.read(length) or b"{}")
+            if not self.path.endswith("/chat/completions"):
+                self._json(404, {"error": {"message": "not found"}})
+                return
+            with cfg._lock:
+                cfg.requests += 1
+                fail = random.random() < cfg.fail_rate
+                if fail:
+                    cfg.failed += 1
+            time.sleep(cfg.latency_ms / 1000)
+            if fail:
+                self._json(
+                    cfg.fail_status,
+                    {"error": {"message": "stub failure", "type": "stub"}},
+                    {"retry-after": "0"} if cfg.fail_status == 429 else {},
+                )
+                return
+
+            answer = cfg.answer_fn(req.get("messages", []))
+            base = {
+                "id": f"stub-{cfg.requests}",
+                "created": int(time.time()),
+                "model": req.get("model", "stub"),
+            }
+            if not req.get("stream"):
+                self._json(
+                    200,
+                    {
+                        **base,
+                        "object": "chat.completion",
+                        "choices": [
+                            {
+                                "index": 0,
+                                "message": {"role": "assistant", "content": answer},
+                                "finish_reason": "stop",
+                            }
+                        ],
+                        "usage": {
+                            "prompt_tokens": 0,
+                            "completion_tokens": 0,
+                            "total_tokens": 0,
+                        },
+                    },
+                )
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.end_headers()
+            for word in answer.split(" "):
+                chunk = {
+                    **base,
+                    "object": "chat.completion.chunk",
+                    "choices": [
+                        {
+                            "index": 0,
+                            "delta": {"content": word + " "},
+                            "finish_reason": None,
+                        }
+                    ],
+                }
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                self.wfile.flush()
+                time.sleep(cfg.token_delay_ms / 1000)
+            self.wfile.write(b"data: [DONE]\n\n")
+
+    return Handler
+
+
+def start_stub_server(
+    cfg: StubConfig, port: int = 0
+) -> Tuple[ThreadingHTTPServer, str]:
+    """Serve in a background thread; returns the server and its base URL."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), _make_handler(cfg))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency-ms", type=float, default=200.0)
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    parser.add_argument("--fail-status", type=int, default=503)
+    args = parser.parse_args()
+
+    cfg = StubConfig(args.latency_ms, args.fail_rate, args.fail_status)
+    server, url = start_stub_server(cfg, args.port)
+    print(f"Stub LLM listening on {url} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()